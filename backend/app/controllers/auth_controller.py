@@ -1,27 +1,26 @@
 from datetime import datetime, timedelta
+import logging
 from fastapi import HTTPException, status
-from app.utils.database import get_database
-from app.utils.auth import get_password_hash, verify_password, create_access_token, create_refresh_token, verify_refresh_token
+from app.storage.base import DuplicateError, utcnow
+from app.storage.engine import get_storage
+from app.utils.user_directory import user_directory
+from app.utils.auth import get_password_hash_async, verify_and_update_password_async, create_access_token, create_refresh_token, verify_refresh_token
 from app.models.user import UserCreate, UserLogin, User, UserResponse, Token, TokenWithRefresh, RefreshTokenRequest
 from fastapi import HTTPException
 from fastapi.responses import JSONResponse
 
+logger = logging.getLogger(__name__)
+
 class AuthController:
     
     @staticmethod
     async def register_user(user_data: UserCreate) -> TokenWithRefresh:
         """Register a new user and return JWT tokens"""
         try:
-            db = await get_database()
-            
-            if db is None:
-                raise HTTPException(
-                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                    detail="Database connection not available"
-                )
+            storage = get_storage()
             
             # Check if user already exists
-            existing_user = await db.users.find_one({"email": user_data.email})
+            existing_user = await storage.users.find_by_email(user_data.email)
             if existing_user:
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
@@ -29,17 +28,25 @@ class AuthController:
                 )
             
             # Hash password
-            hashed_password = get_password_hash(user_data.password)
+            hashed_password = await get_password_hash_async(user_data.password)
             
             # Create user document
             user_doc = {
                 "email": user_data.email,
                 "password": hashed_password,
-                "created_at": datetime.utcnow()
+                "created_at": utcnow()
             }
             
-            # Insert user into database
-            result = await db.users.insert_one(user_doc)
+            # Insert user into database; the unique email index catches
+            # a concurrent registration that passed the check above
+            try:
+                await storage.users.insert(user_doc)
+            except DuplicateError:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Email already registered"
+                )
+            user_directory.put(user_doc)
             
             # Create access and refresh tokens for the new user
             access_token_expires = timedelta(minutes=30)
@@ -66,16 +73,10 @@ class AuthController:
     async def login_user(user_data: UserLogin) -> TokenWithRefresh:
         """Authenticate user and return JWT tokens"""
         try:
-            db = await get_database()
-            
-            if db is None:
-                raise HTTPException(
-                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                    detail="Database connection not available"
-                )
+            storage = get_storage()
             
             # Find user by email
-            user_doc = await db.users.find_one({"email": user_data.email})
+            user_doc = await storage.users.find_by_email(user_data.email)
             if not user_doc:
                 raise HTTPException(
                     status_code=status.HTTP_401_UNAUTHORIZED,
@@ -83,11 +84,21 @@ class AuthController:
                 )
             
             # Verify password
-            if not verify_password(user_data.password, user_doc["password"]):
+            verified, new_hash = await verify_and_update_password_async(user_data.password, user_doc["password"])
+            if not verified:
                 raise HTTPException(
                     status_code=status.HTTP_401_UNAUTHORIZED,
                     detail="Incorrect email or password"
                 )
+            if new_hash:
+                # The stored hash's cost is outside the current policy. Saving
+                # the new one is best effort: the password is verified, so a
+                # failure here must not fail the login; the next one retries
+                try:
+                    await storage.users.update_password(user_data.email, user_doc["password"], new_hash)
+                except Exception as e:
+                    logger.warning(f"Could not rehash the password of {user_data.email}: {e}")
+            user_directory.put(user_doc)
             
             # Create access and refresh tokens
             access_token_expires = timedelta(minutes=30)
@@ -119,14 +130,7 @@ class AuthController:
             email = token_data["email"]
             
             # Check if user still exists
-            db = await get_database()
-            if db is None:
-                raise HTTPException(
-                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                    detail="Database connection not available"
-                )
-            
-            user_doc = await db.users.find_one({"email": email})
+            user_doc = await user_directory.get(email)
             if not user_doc:
                 raise HTTPException(
                     status_code=status.HTTP_401_UNAUTHORIZED,
@@ -153,15 +157,7 @@ class AuthController:
     async def get_user_profile(email: str) -> UserResponse:
         """Get user profile information"""
         try:
-            db = await get_database()
-            
-            if db is None:
-                raise HTTPException(
-                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                    detail="Database connection not available"
-                )
-            
-            user_doc = await db.users.find_one({"email": email})
+            user_doc = await user_directory.get(email)
             if not user_doc:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
@@ -1,64 +1,383 @@
-from datetime import datetime
-from typing import List
+from dataclasses import replace
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, List, Optional, Tuple
+import csv
+import gzip
+import io
+import json
+import os
+import zlib
 from fastapi import HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from bson import ObjectId
-from app.utils.database import get_database
-from app.models.task import TaskCreate, TaskUpdate, TaskResponse
+from pydantic import ValidationError
+from app.storage.base import BulkOperation, BulkResult, TOMBSTONE_RETENTION, TaskQuery, truncate_millis, utcnow
+from app.storage.engine import get_storage
+from app.utils.cache import get_task_cache
+from app.utils.events import task_events
+from app.models.task import (
+    TaskCreate, TaskUpdate,
+    TaskBulkRequest, TaskBulkResponse, TaskBulkResult,
+    TaskImportError, TaskImportResponse
+)
+from app.utils.pagination import (
+    DEFAULT_PAGE_SIZE, decode_cursor, decode_search_cursor, encode_cursor, encode_search_cursor
+)
+from app.utils.search import SEARCH_MAX_CANDIDATES, query_terms, score, search_terms
+from app.utils.serialization import TASK_FIELD_MAP, task_list_json
+
+# Tasks fetched per cursor batch (and written per chunk) by the export
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", 500))
+EXPORT_FIELDS = ["id", "text", "completed", "created_at", "updated_at"]
+
+# Sync tokens never move closer than this to the present, so writes that
+# commit late (their timestamp is taken before the write lands) are picked
+# up by the next sync; clients may see such a change twice
+SYNC_OVERLAP = timedelta(milliseconds=int(os.getenv("TASK_SYNC_OVERLAP_MS", 5000)))
+# Lowest ObjectId, for positions that sit exactly on a timestamp
+_MIN_OBJECT_ID = ObjectId("0" * 24)
+
+# Rows per insert_many during import, and how many line errors to report
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", 500))
+IMPORT_MAX_REPORTED_ERRORS = 100
+
+def _import_rows(stream: io.TextIOBase, import_format: str):
+    """Yield (line number, row dict or error message) from an uploaded file"""
+    if import_format == "csv":
+        reader = csv.DictReader(stream)
+        for row in reader:
+            # Empty cells mean "not given" so model defaults apply
+            yield reader.line_num, {key: value for key, value in row.items() if key and value not in ("", None)}
+        return
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_number, f"Invalid JSON: {e}"
+            continue
+        yield line_number, row if isinstance(row, dict) else "Expected a JSON object"
+
+def _export_row(task: dict) -> dict:
+    updated_at = task.get("updated_at")
+    return {
+        "id": str(task["_id"]),
+        "text": task["text"],
+        "completed": task["completed"],
+        "created_at": task["created_at"].isoformat(),
+        "updated_at": updated_at.isoformat() if updated_at else None
+    }
+
+def parse_fields(fields: Optional[str]) -> Optional[Tuple[str, ...]]:
+    """Response fields named in a comma-separated fields parameter; id is always included"""
+    if fields is None:
+        return None
+    known = dict(TASK_FIELD_MAP)
+    names = {name.strip() for name in fields.split(",") if name.strip()}
+    unknown = names - known.keys()
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {', '.join(sorted(unknown))}"
+        )
+    return tuple(name for name in known if name in names or name == "id")
+
+def to_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Naive UTC at storage precision, as stored dates are; naive input is taken as UTC"""
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return truncate_millis(value)
+
+async def _tasks_changed(user_email: str, event_type: str = "invalidate", document: Optional[dict] = None):
+    """Record a write to the user's tasks: bump the list version behind the
+    ETags, drop cached lists and notify open streams. Writes touching many
+    tasks publish "invalidate" without a document."""
+    # Invalidate first: a read between the two then caches under the old
+    # version, which no request asks for once the bump lands
+    await get_task_cache().invalidate(user_email)
+    version = await get_storage().tasks.bump_version(user_email)
+    task_events.publish(user_email, event_type, version, document)
 
 class TaskController:
     
     @staticmethod
-    async def create_task(task_data: TaskCreate, user_email: str) -> TaskResponse:
+    async def create_task(task_data: TaskCreate, user_email: str) -> dict:
         """Create a new task for the user"""
-        db = await get_database()
+        storage = get_storage()
         
         # Create task document
         task_doc = {
             "text": task_data.text,
             "completed": task_data.completed,
             "user_email": user_email,
-            "created_at": datetime.utcnow(),
+            "created_at": utcnow(),
             "updated_at": None
         }
         
-        # Insert task into database
-        result = await db.tasks.insert_one(task_doc)
+        # Insert task into database; sets _id on the document
+        await storage.tasks.insert(task_doc)
+        
+        await _tasks_changed(user_email, "created", task_doc)
+        
+        return task_doc
+    
+    @staticmethod
+    async def get_user_tasks(user_email: str, limit: Optional[int] = None, cursor: Optional[str] = None,
+                             query: Optional[TaskQuery] = None) -> Tuple[List[dict], Optional[str]]:
+        """Get a page of the user's task documents matching query (default:
+        all, newest first) and the next cursor"""
+        storage = get_storage()
+        
+        if query == TaskQuery():
+            query = None
+        sort_field = query.sort_field if query else "created_at"
+        if cursor and limit is None:
+            limit = DEFAULT_PAGE_SIZE
+        after = decode_cursor(cursor, value_type=str if sort_field == "text" else datetime) if cursor else None
+        
+        # Fetch one extra task to know whether another page exists
+        tasks = await storage.tasks.list_page(user_email, limit + 1 if limit is not None else None, after, query)
+        
+        next_cursor = None
+        if limit is not None and len(tasks) > limit:
+            tasks = tasks[:limit]
+            next_cursor = encode_cursor(tasks[-1][sort_field], tasks[-1]["_id"])
+        
+        return tasks, next_cursor
+    
+    @staticmethod
+    async def get_user_tasks_json(user_email: str, limit: Optional[int] = None, cursor: Optional[str] = None,
+                                  query: Optional[TaskQuery] = None,
+                                  fields: Optional[Tuple[str, ...]] = None,
+                                  version: Optional[int] = None) -> Tuple[bytes, Optional[str]]:
+        """Serialized task list page and next cursor, served from the read cache when possible.
+        
+        fields (from parse_fields) limits each task to those response fields
+        and is pushed down to storage as a projection. Cache entries are keyed
+        by the task list version (pass the one behind the response's ETag), so
+        a cached body is only served while storage is still at that version,
+        even when the write was handled by another worker.
+        """
+        cache = get_task_cache()
+        if version is None:
+            version = await TaskController.get_task_version(user_email)
+        key = f"list:{version}:{limit}:{cursor or ''}"
+        if query is not None or fields is not None:
+            key += f":{query!r}:{fields}"
+        cached = await cache.get(user_email, key)
+        if cached is not None:
+            next_cursor, body = cached.split(b"\n", 1)
+            return body, next_cursor.decode() or None
+        
+        if fields is not None:
+            document_fields = dict(TASK_FIELD_MAP)
+            query = replace(query or TaskQuery(), fields=tuple(document_fields[name] for name in fields if name != "id"))
+        
+        # Read the generation first so a write during the query discards this result
+        generation = await cache.generation(user_email)
+        tasks, next_cursor = await TaskController.get_user_tasks(user_email, limit, cursor, query)
+        body = task_list_json(tasks, fields)
+        await cache.set(user_email, key, (next_cursor or "").encode() + b"\n" + body, generation)
+        return body, next_cursor
+    
+    @staticmethod
+    async def search_tasks(user_email: str, q: str, limit: int, cursor: Optional[str] = None) -> Tuple[List[dict], Optional[str], bool]:
+        """A page of the user's tasks matching q, best first, the next cursor,
+        and whether more than SEARCH_MAX_CANDIDATES tasks matched (then only
+        that many were ranked)"""
+        terms = query_terms(q)
+        if not terms:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Search query has no words"
+            )
+        after = decode_search_cursor(cursor) if cursor else None
         
-        # Return task response
-        return TaskResponse(
-            id=str(result.inserted_id),
-            text=task_data.text,
-            completed=task_data.completed,
-            created_at=task_doc["created_at"],
-            updated_at=task_doc["updated_at"]
+        candidates = await get_storage().tasks.search(user_email, terms, SEARCH_MAX_CANDIDATES + 1)
+        truncated = len(candidates) > SEARCH_MAX_CANDIDATES
+        ranked = sorted(
+            ((score(search_terms(task["text"]), terms), task["created_at"], task["_id"], task)
+             for task in candidates[:SEARCH_MAX_CANDIDATES]),
+            key=lambda entry: entry[:3],
+            reverse=True
         )
+        if after is not None:
+            ranked = [entry for entry in ranked if entry[:3] < after]
+        
+        next_cursor = None
+        if len(ranked) > limit:
+            ranked = ranked[:limit]
+            next_cursor = encode_search_cursor(*ranked[-1][:3])
+        return [task for _, _, _, task in ranked], next_cursor, truncated
     
     @staticmethod
-    async def get_user_tasks(user_email: str) -> List[TaskResponse]:
-        """Get all tasks for the user"""
-        db = await get_database()
-        
-        # Find all tasks for the user
-        cursor = db.tasks.find({"user_email": user_email}).sort("created_at", -1)
-        tasks = await cursor.to_list(length=None)
-        
-        # Convert to response format
-        return [
-            TaskResponse(
-                id=str(task["_id"]),
-                text=task["text"],
-                completed=task["completed"],
-                created_at=task["created_at"],
-                updated_at=task.get("updated_at")
+    async def get_task_version(user_email: str) -> int:
+        """Version of the user's tasks, bumped by every write"""
+        return await get_storage().tasks.get_version(user_email)
+    
+    @staticmethod
+    async def get_stats(user_email: str) -> dict:
+        """Counts of the user's tasks, read from the counters kept by every write"""
+        counters = await get_storage().tasks.stats(user_email)
+        return {**counters, "pending": counters["total"] - counters["completed"]}
+    
+    @staticmethod
+    async def get_changes(user_email: str, since: Optional[str], limit: int) -> dict:
+        """Tasks written and tasks deleted since a sync token, oldest first.
+        
+        Without a token every current task is returned (a full sync). The
+        result holds at most `limit` entries; has_more asks for another call.
+        """
+        storage = get_storage()
+        now = utcnow()
+        after = decode_cursor(since, "sync token") if since else None
+        if after is not None and after[0] < now - TOMBSTONE_RETENTION:
+            # Deletions this old may have been compacted away
+            raise HTTPException(
+                status_code=status.HTTP_410_GONE,
+                detail="Sync token expired, fetch the full task list"
             )
-            for task in tasks
-        ]
+        
+        tasks = await storage.tasks.changes(user_email, after, limit + 1)
+        tombstones = await storage.tasks.tombstones(user_email, after, limit + 1) if after else []
+        # Merge both streams on one timeline so the token can cut through it
+        entries = sorted(
+            [(task["modified_at"], task["_id"], task, None) for task in tasks]
+            + [(tombstone["deleted_at"], tombstone["_id"], None, tombstone) for tombstone in tombstones],
+            key=lambda entry: (entry[0], entry[1])
+        )
+        has_more = len(entries) > limit
+        entries = entries[:limit]
+        
+        if has_more:
+            position = (entries[-1][0], entries[-1][1])
+        else:
+            position = (now - SYNC_OVERLAP, _MIN_OBJECT_ID)
+            if after is not None and after > position:
+                position = after
+        
+        return {
+            "changes": [task for _, _, task, _ in entries if task is not None],
+            "deleted": [tombstone for _, _, _, tombstone in entries if tombstone is not None],
+            "sync_token": encode_cursor(*position),
+            "has_more": has_more
+        }
     
     @staticmethod
-    async def get_task_by_id(task_id: str, user_email: str) -> TaskResponse:
-        """Get a specific task by ID"""
-        db = await get_database()
+    async def export_tasks(user_email: str, export_format: str = "ndjson", compress: bool = False) -> AsyncIterator[bytes]:
+        """Stream all of the user's tasks as NDJSON or CSV, one chunk per cursor batch"""
+        storage = get_storage()
+        
+        compressor = zlib.compressobj(wbits=31) if compress else None  # gzip container
+        buffer = io.StringIO()
+        writer = None
+        if export_format == "csv":
+            writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+            writer.writeheader()
+        
+        def drain() -> bytes:
+            chunk = buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+            return compressor.compress(chunk) if compressor else chunk
+        
+        rows = 0
+        async for task in storage.tasks.iterate(user_email, EXPORT_BATCH_SIZE):
+            row = _export_row(task)
+            if writer:
+                writer.writerow({**row, "completed": "true" if row["completed"] else "false"})
+            else:
+                buffer.write(json.dumps(row))
+                buffer.write("\n")
+            rows += 1
+            if rows % EXPORT_BATCH_SIZE == 0:
+                chunk = drain()
+                if chunk:
+                    yield chunk
+        
+        chunk = drain()
+        if compressor:
+            chunk += compressor.flush()
+        if chunk:
+            yield chunk
+    
+    @staticmethod
+    async def import_tasks(upload, import_format: str, user_email: str, batch_size: int = IMPORT_BATCH_SIZE) -> TaskImportResponse:
+        """Validate and insert tasks from an NDJSON or CSV upload in insert_many batches"""
+        storage = get_storage()
+        
+        # The upload is spooled to a temporary file; read it line by line
+        raw = upload.file
+        raw.seek(0)
+        if (upload.filename or "").endswith(".gz"):
+            raw = gzip.GzipFile(fileobj=raw, mode="rb")
+        stream = io.TextIOWrapper(raw, encoding="utf-8-sig", newline="")
+        rows = _import_rows(stream, import_format)
+        
+        imported = 0
+        failed = 0
+        errors = []
+        batch = []
         
+        def record_error(line: int, detail: str):
+            nonlocal failed
+            failed += 1
+            if len(errors) < IMPORT_MAX_REPORTED_ERRORS:
+                errors.append(TaskImportError(line=line, detail=detail))
+        
+        def fill_batch() -> bool:
+            """Parse rows into batch until it is full; False once the file is
+            read. Runs in a worker thread: a file spooled to disk is read with
+            blocking calls"""
+            for line_number, row in rows:
+                if isinstance(row, str):
+                    record_error(line_number, row)
+                    continue
+                try:
+                    task_data = TaskCreate(**row)
+                except ValidationError as e:
+                    error = e.errors()[0]
+                    location = ".".join(str(part) for part in error["loc"])
+                    record_error(line_number, f"{location}: {error['msg']}")
+                    continue
+                batch.append({
+                    "text": task_data.text,
+                    "completed": task_data.completed,
+                    "user_email": user_email,
+                    "created_at": utcnow(),
+                    "updated_at": None
+                })
+                if len(batch) >= batch_size:
+                    return True
+            return False
+        
+        try:
+            while await run_in_threadpool(fill_batch):
+                imported += await storage.tasks.insert_many(batch)
+                batch = []
+        except (UnicodeDecodeError, csv.Error, OSError, EOFError) as e:
+            # Unreadable file (bad encoding or broken gzip); keep what was imported
+            record_error(0, f"Could not read file: {e}")
+        finally:
+            stream.detach()
+        
+        if batch:
+            imported += await storage.tasks.insert_many(batch)
+        
+        if imported:
+            await _tasks_changed(user_email)
+        
+        return TaskImportResponse(
+            imported=imported,
+            failed=failed,
+            errors=errors,
+            errors_truncated=failed > len(errors)
+        )
+    
+    @staticmethod
+    async def get_task_by_id(task_id: str, user_email: str) -> dict:
+        """Get a specific task by ID"""
         # Validate ObjectId
         if not ObjectId.is_valid(task_id):
             raise HTTPException(
@@ -67,10 +386,7 @@ class TaskController:
             )
         
         # Find task by ID and user
-        task_doc = await db.tasks.find_one({
-            "_id": ObjectId(task_id),
-            "user_email": user_email
-        })
+        task_doc = await get_storage().tasks.get(user_email, ObjectId(task_id))
         
         if not task_doc:
             raise HTTPException(
@@ -78,19 +394,11 @@ class TaskController:
                 detail="Task not found"
             )
         
-        return TaskResponse(
-            id=str(task_doc["_id"]),
-            text=task_doc["text"],
-            completed=task_doc["completed"],
-            created_at=task_doc["created_at"],
-            updated_at=task_doc.get("updated_at")
-        )
+        return task_doc
     
     @staticmethod
-    async def update_task(task_id: str, task_data: TaskUpdate, user_email: str) -> TaskResponse:
+    async def update_task(task_id: str, task_data: TaskUpdate, user_email: str) -> dict:
         """Update a task"""
-        db = await get_database()
-        
         # Validate ObjectId
         if not ObjectId.is_valid(task_id):
             raise HTTPException(
@@ -99,43 +407,28 @@ class TaskController:
             )
         
         # Prepare update data
-        update_data = {"updated_at": datetime.utcnow()}
+        update_data = {"updated_at": utcnow()}
         if task_data.text is not None:
             update_data["text"] = task_data.text
         if task_data.completed is not None:
             update_data["completed"] = task_data.completed
         
-        # Update task
-        result = await db.tasks.update_one(
-            {"_id": ObjectId(task_id), "user_email": user_email},
-            {"$set": update_data}
-        )
+        # Update and return the new document in one round trip
+        updated_task = await get_storage().tasks.update(user_email, ObjectId(task_id), update_data)
         
-        if result.matched_count == 0:
+        if not updated_task:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Task not found"
             )
         
-        # Get updated task
-        updated_task = await db.tasks.find_one({
-            "_id": ObjectId(task_id),
-            "user_email": user_email
-        })
-        
-        return TaskResponse(
-            id=str(updated_task["_id"]),
-            text=updated_task["text"],
-            completed=updated_task["completed"],
-            created_at=updated_task["created_at"],
-            updated_at=updated_task.get("updated_at")
-        )
+        await _tasks_changed(user_email, "updated", updated_task)
+        
+        return updated_task
     
     @staticmethod
     async def delete_task(task_id: str, user_email: str) -> bool:
         """Delete a task"""
-        db = await get_database()
-        
         # Validate ObjectId
         if not ObjectId.is_valid(task_id):
             raise HTTPException(
@@ -144,24 +437,21 @@ class TaskController:
             )
         
         # Delete task
-        result = await db.tasks.delete_one({
-            "_id": ObjectId(task_id),
-            "user_email": user_email
-        })
+        deleted = await get_storage().tasks.delete(user_email, ObjectId(task_id))
         
-        if result.deleted_count == 0:
+        if not deleted:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Task not found"
             )
         
+        await _tasks_changed(user_email, "deleted", {"_id": ObjectId(task_id)})
+        
         return True
     
     @staticmethod
-    async def toggle_task(task_id: str, user_email: str) -> TaskResponse:
+    async def toggle_task(task_id: str, user_email: str) -> dict:
         """Toggle task completion status"""
-        db = await get_database()
-        
         # Validate ObjectId
         if not ObjectId.is_valid(task_id):
             raise HTTPException(
@@ -169,37 +459,113 @@ class TaskController:
                 detail="Invalid task ID"
             )
         
-        # Get current task
-        task_doc = await db.tasks.find_one({
-            "_id": ObjectId(task_id),
-            "user_email": user_email
-        })
+        # Negate completed atomically in storage, so concurrent toggles never
+        # overwrite each other, and get the new document back in one round trip
+        updated_task = await get_storage().tasks.toggle(user_email, ObjectId(task_id), utcnow())
         
-        if not task_doc:
+        if not updated_task:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Task not found"
             )
         
-        # Toggle completion status
-        new_status = not task_doc["completed"]
+        await _tasks_changed(user_email, "toggled", updated_task)
         
-        # Update task
-        await db.tasks.update_one(
-            {"_id": ObjectId(task_id), "user_email": user_email},
-            {"$set": {"completed": new_status, "updated_at": datetime.utcnow()}}
-        )
+        return updated_task
+    
+    @staticmethod
+    async def bulk_tasks(bulk_data: TaskBulkRequest, user_email: str) -> TaskBulkResponse:
+        """Apply a batch of create/update/toggle/delete operations in one bulk write"""
+        storage = get_storage()
+        operations = bulk_data.operations
+        results = [None] * len(operations)
+        now = utcnow()
+        
+        # One round trip to learn which referenced tasks belong to the user,
+        # so each operation gets its own found/not-found result
+        referenced = {
+            ObjectId(op.id) for op in operations
+            if op.op != "create" and op.id and ObjectId.is_valid(op.id)
+        }
+        existing = await storage.tasks.existing_ids(user_email, referenced) if referenced else set()
         
-        # Get updated task
-        updated_task = await db.tasks.find_one({
-            "_id": ObjectId(task_id),
-            "user_email": user_email
-        })
-        
-        return TaskResponse(
-            id=str(updated_task["_id"]),
-            text=updated_task["text"],
-            completed=updated_task["completed"],
-            created_at=updated_task["created_at"],
-            updated_at=updated_task.get("updated_at")
+        requests = []
+        request_positions = []  # operation index for each bulk request
+        for index, op in enumerate(operations):
+            if op.op == "create":
+                if op.text is None:
+                    results[index] = TaskBulkResult(index=index, op=op.op, status="invalid", detail="text is required")
+                else:
+                    task_id = ObjectId()
+                    requests.append(BulkOperation("insert", document={
+                        "_id": task_id,
+                        "text": op.text,
+                        "completed": bool(op.completed),
+                        "user_email": user_email,
+                        "created_at": now,
+                        "updated_at": None
+                    }))
+                    request_positions.append(index)
+                    results[index] = TaskBulkResult(index=index, op=op.op, status="ok", id=str(task_id))
+            elif not op.id or not ObjectId.is_valid(op.id):
+                results[index] = TaskBulkResult(index=index, op=op.op, status="invalid", id=op.id, detail="Invalid task ID")
+            elif ObjectId(op.id) not in existing:
+                results[index] = TaskBulkResult(index=index, op=op.op, status="not_found", id=op.id, detail="Task not found")
+            else:
+                task_id = ObjectId(op.id)
+                request = None
+                if op.op == "delete":
+                    request = BulkOperation("delete", task_id)
+                    # Later operations on the same task will not find it
+                    existing.discard(task_id)
+                elif op.op == "toggle":
+                    request = BulkOperation("toggle", task_id, updated_at=now)
+                else:
+                    update_data = {"updated_at": now}
+                    if op.text is not None:
+                        update_data["text"] = op.text
+                    if op.completed is not None:
+                        update_data["completed"] = op.completed
+                    if len(update_data) > 1:
+                        request = BulkOperation("update", task_id, fields=update_data)
+                
+                if request is None:
+                    results[index] = TaskBulkResult(index=index, op=op.op, status="invalid", id=op.id, detail="Nothing to update")
+                else:
+                    requests.append(request)
+                    request_positions.append(index)
+                    results[index] = TaskBulkResult(index=index, op=op.op, status="ok", id=op.id)
+            
+            # Ordered batches stop at the first invalid operation
+            if bulk_data.ordered and results[index].status == "invalid":
+                for skipped in range(index + 1, len(operations)):
+                    results[skipped] = TaskBulkResult(index=skipped, op=operations[skipped].op, status="skipped", id=operations[skipped].id)
+                break
+        
+        result = BulkResult()
+        if requests:
+            result = await storage.tasks.bulk_write(user_email, requests, bulk_data.ordered)
+            failed = result.errors
+            for position, index in enumerate(request_positions):
+                if position in failed:
+                    results[index].status = "error"
+                    results[index].detail = failed[position]
+                elif bulk_data.ordered and failed and position > min(failed):
+                    results[index].status = "skipped"
+            # Only batches that reached storage change the version and notify
+            await _tasks_changed(user_email)
+        
+        return TaskBulkResponse(
+            results=results,
+            created=result.inserted,
+            updated=result.matched,
+            deleted=result.deleted
         )
+    
+    @staticmethod
+    async def clear_completed(user_email: str) -> int:
+        """Delete all of the user's completed tasks"""
+        deleted_count = await get_storage().tasks.delete_completed(user_email)
+        if deleted_count:
+            await _tasks_changed(user_email)
+        return deleted_count
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, ConfigDict
-from typing import Optional, Annotated
+from typing import List, Literal, Optional, Annotated
 from datetime import datetime
 from bson import ObjectId
 
@@ -35,3 +35,51 @@ class TaskResponse(BaseModel):
     completed: bool
     created_at: datetime
     updated_at: Optional[datetime] = None
+
+class TaskStats(BaseModel):
+    total: int
+    completed: int
+    pending: int
+
+class TaskBulkOperation(BaseModel):
+    op: Literal["create", "update", "toggle", "delete"]
+    id: Optional[str] = None  # required for update, toggle and delete
+    text: Optional[str] = Field(None, min_length=1, max_length=500)
+    completed: Optional[bool] = None
+
+class TaskBulkRequest(BaseModel):
+    operations: List[TaskBulkOperation] = Field(..., min_length=1, max_length=1000)
+    ordered: bool = True
+
+class TaskBulkResult(BaseModel):
+    index: int
+    op: str
+    status: Literal["ok", "not_found", "invalid", "error", "skipped"]
+    id: Optional[str] = None
+    detail: Optional[str] = None
+
+class TaskBulkResponse(BaseModel):
+    results: List[TaskBulkResult]
+    created: int = 0
+    updated: int = 0
+    deleted: int = 0
+
+class TaskTombstone(BaseModel):
+    id: str
+    deleted_at: datetime
+
+class TaskChangesResponse(BaseModel):
+    changes: List[TaskResponse]  # created or updated since the token
+    deleted: List[TaskTombstone]
+    sync_token: str  # pass as `since` on the next call
+    has_more: bool = False  # call again right away with sync_token
+
+class TaskImportError(BaseModel):
+    line: int
+    detail: str
+
+class TaskImportResponse(BaseModel):
+    imported: int
+    failed: int
+    errors: List[TaskImportError]
+    errors_truncated: bool = False
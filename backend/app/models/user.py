@@ -39,6 +39,10 @@ class TokenWithRefresh(BaseModel):
     refresh_token: str
     token_type: str
 
+class StreamToken(BaseModel):
+    stream_token: str
+    expires_in: int
+
 class RefreshTokenRequest(BaseModel):
     refresh_token: str
 
@@ -1,19 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from app.controllers.auth_controller import AuthController
 from app.models.user import UserCreate, UserLogin, UserResponse, Token, TokenWithRefresh, RefreshTokenRequest
+from app.utils.admission import auth_admission
 from app.utils.dependencies import get_current_user
 
 router = APIRouter()
 
 @router.post("/register", response_model=TokenWithRefresh, status_code=status.HTTP_201_CREATED)
-async def register(user_data: UserCreate):
+async def register(user_data: UserCreate, request: Request):
     """Register a new user and return JWT tokens"""
-    return await AuthController.register_user(user_data)
+    async with auth_admission.admit(request, user_data.email):
+        return await AuthController.register_user(user_data)
 
 @router.post("/login", response_model=TokenWithRefresh)
-async def login(user_data: UserLogin):
+async def login(user_data: UserLogin, request: Request):
     """Login user and return JWT tokens"""
-    return await AuthController.login_user(user_data)
+    async with auth_admission.admit(request, user_data.email):
+        return await AuthController.login_user(user_data)
 
 @router.post("/refresh", response_model=Token)
 async def refresh_token(refresh_data: RefreshTokenRequest):
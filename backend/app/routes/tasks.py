@@ -1,8 +1,20 @@
-from typing import List
-from fastapi import APIRouter, Depends, status
-from app.controllers.task_controller import TaskController
-from app.models.task import TaskCreate, TaskUpdate, TaskResponse
-from app.utils.dependencies import get_current_user
+from datetime import datetime
+from typing import List, Literal, Optional
+from fastapi import APIRouter, Depends, File, Header, Query, UploadFile, status
+from fastapi.responses import StreamingResponse
+from app.controllers.task_controller import TaskController, IMPORT_BATCH_SIZE, parse_fields, to_utc
+from app.models.task import (
+    TaskCreate, TaskUpdate, TaskResponse, TaskBulkRequest, TaskBulkResponse,
+    TaskChangesResponse, TaskImportResponse, TaskStats
+)
+from app.models.user import StreamToken
+from app.storage.base import TaskQuery
+from app.utils.conditional import CACHE_HEADERS, etag_matches, make_etag, not_modified
+from app.utils import auth
+from app.utils.dependencies import get_current_claims, get_current_user, get_stream_token_claims
+from app.utils.events import task_events
+from app.utils.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from app.utils.serialization import FastJSONResponse, task_document_to_dict, task_list_json, task_response
 
 router = APIRouter()
 
@@ -12,20 +24,218 @@ async def create_task(
     current_user_email: str = Depends(get_current_user)
 ):
     """Create a new task"""
-    return await TaskController.create_task(task_data, current_user_email)
+    task = await TaskController.create_task(task_data, current_user_email)
+    return task_response(task, status_code=status.HTTP_201_CREATED)
 
 @router.get("/", response_model=List[TaskResponse])
-async def get_tasks(current_user_email: str = Depends(get_current_user)):
-    """Get all tasks for the current user"""
-    return await TaskController.get_user_tasks(current_user_email)
+async def get_tasks(
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    completed: Optional[bool] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    updated_after: Optional[datetime] = None,
+    updated_before: Optional[datetime] = None,
+    sort: Literal["created_at", "updated_at", "text"] = "created_at",
+    order: Literal["asc", "desc"] = "desc",
+    fields: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+    current_user_email: str = Depends(get_current_user)
+):
+    """Get tasks for the current user, newest first.
+
+    Filter with `completed` and the exclusive date bounds (`updated_*`
+    only matches tasks that were updated); order with `sort` and `order`,
+    where `updated_at` means the last change, creation for tasks never
+    updated. `fields=id,text` returns only those fields (id is always
+    included).
+
+    Pass `limit` to page through the list; when more tasks remain the
+    opaque cursor for the next page is returned in the X-Next-Cursor header.
+    A cursor is only valid with the filters and order that produced it.
+    Responses carry an ETag; send it back in If-None-Match to get a 304
+    while the list is unchanged.
+    """
+    query = TaskQuery(
+        completed=completed,
+        created_after=to_utc(created_after),
+        created_before=to_utc(created_before),
+        updated_after=to_utc(updated_after),
+        updated_before=to_utc(updated_before),
+        sort=sort,
+        descending=order == "desc"
+    )
+    response_fields = parse_fields(fields)
+    # Read the version before the tasks, so the tag is never newer than the body
+    version = await TaskController.get_task_version(current_user_email)
+    etag = make_etag(current_user_email, version, "list", limit, cursor, repr(query), response_fields)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    body, next_cursor = await TaskController.get_user_tasks_json(
+        current_user_email, limit, cursor, query, response_fields, version
+    )
+    headers = {"ETag": etag, **CACHE_HEADERS}
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+    # Already serialized (and possibly cached); skip response_model re-validation
+    return FastJSONResponse(body, headers=headers)
+
+@router.get("/changes", response_model=TaskChangesResponse)
+async def get_changes(
+    since: Optional[str] = None,
+    limit: int = Query(MAX_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    current_user_email: str = Depends(get_current_user)
+):
+    """Tasks created or updated, and ids of tasks deleted, since a sync token.
+
+    Call without `since` for a full sync, then pass the returned sync_token
+    as `since`. While has_more is true call again straight away. Apply
+    entries as upserts and deletes: an entry can arrive more than once.
+    A 410 means the token is older than the tombstone retention.
+    """
+    result = await TaskController.get_changes(current_user_email, since, limit)
+    return FastJSONResponse({
+        "changes": [task_document_to_dict(task) for task in result["changes"]],
+        "deleted": [
+            {"id": str(tombstone["_id"]), "deleted_at": tombstone["deleted_at"]}
+            for tombstone in result["deleted"]
+        ],
+        "sync_token": result["sync_token"],
+        "has_more": result["has_more"]
+    })
+
+@router.get("/stats", response_model=TaskStats)
+async def get_stats(current_user_email: str = Depends(get_current_user)):
+    """Total, completed and pending task counts for the current user.
+
+    Served from counters updated with every write, so the cost does not
+    grow with the number of tasks.
+    """
+    return FastJSONResponse(await TaskController.get_stats(current_user_email))
+
+@router.get("/search", response_model=List[TaskResponse])
+async def search_tasks(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+    current_user_email: str = Depends(get_current_user)
+):
+    """Search the current user's tasks.
+
+    Every word of `q` must match a word of the task text or the start of
+    one; tasks with more whole-word matches come first, then newer ones.
+    Paging works as for the task list. When more tasks match than are
+    ranked per search, `X-Search-Truncated: true` is set; refine the query.
+    """
+    version = await TaskController.get_task_version(current_user_email)
+    etag = make_etag(current_user_email, version, "search", q, limit, cursor)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    tasks, next_cursor, truncated = await TaskController.search_tasks(current_user_email, q, limit, cursor)
+    headers = {"ETag": etag, **CACHE_HEADERS}
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+    if truncated:
+        headers["X-Search-Truncated"] = "true"
+    return FastJSONResponse(task_list_json(tasks), headers=headers)
+
+@router.post("/stream/token", response_model=StreamToken)
+async def create_stream_token(claims: dict = Depends(get_current_claims)):
+    """A short-lived token for opening /stream from an EventSource URL"""
+    return StreamToken(
+        stream_token=auth.create_stream_token(claims["email"], claims.get("exp")),
+        expires_in=auth.STREAM_TOKEN_EXPIRE_SECONDS
+    )
+
+@router.get("/stream")
+async def stream_tasks(
+    last_event_id: Optional[str] = Header(None),
+    claims: dict = Depends(get_stream_token_claims)
+):
+    """Server-sent events for every write to the current user's tasks.
+    
+    Events are created, updated, toggled and deleted (one task),
+    invalidate (a bulk write, import or clear) and resync (events were
+    dropped because the client fell behind); the event id is the task list
+    version. After invalidate or resync, catch up with /changes. The stream
+    ends with an expired event when the access token expires; reconnect
+    with a fresh one. A client that cannot send an Authorization header
+    passes a token from POST /stream/token as stream_token instead.
+    """
+    user_email = claims["email"]
+    task_events.admit(user_email)
+    # A reconnecting EventSource sends the id of the last event it received
+    resync = False
+    if last_event_id:
+        resync = last_event_id != str(await TaskController.get_task_version(user_email))
+    return StreamingResponse(
+        task_events.stream(user_email, claims.get("exp"), resync),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/export")
+async def export_tasks(
+    export_format: Literal["ndjson", "csv"] = Query("ndjson", alias="format"),
+    gzip: bool = False,
+    current_user_email: str = Depends(get_current_user)
+):
+    """Stream all tasks as NDJSON or CSV, optionally gzip-compressed"""
+    filename = f"tasks.{export_format}" + (".gz" if gzip else "")
+    media_type = "application/gzip" if gzip else ("text/csv" if export_format == "csv" else "application/x-ndjson")
+    return StreamingResponse(
+        TaskController.export_tasks(current_user_email, export_format, gzip),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@router.post("/import", response_model=TaskImportResponse)
+async def import_tasks(
+    file: UploadFile = File(...),
+    import_format: Optional[Literal["ndjson", "csv"]] = Query(None, alias="format"),
+    batch_size: int = Query(IMPORT_BATCH_SIZE, ge=1, le=5000),
+    current_user_email: str = Depends(get_current_user)
+):
+    """Import tasks from an NDJSON or CSV file (optionally .gz)"""
+    if import_format is None:
+        # Fall back to the file extension, e.g. tasks.csv or tasks.csv.gz
+        name = (file.filename or "").lower()
+        if name.endswith(".gz"):
+            name = name[:-3]
+        import_format = "csv" if name.endswith(".csv") else "ndjson"
+    return await TaskController.import_tasks(file, import_format, current_user_email, batch_size)
+
+@router.post("/bulk", response_model=TaskBulkResponse)
+async def bulk_tasks(
+    bulk_data: TaskBulkRequest,
+    current_user_email: str = Depends(get_current_user)
+):
+    """Apply many create/update/toggle/delete operations in one request"""
+    return await TaskController.bulk_tasks(bulk_data, current_user_email)
+
+@router.delete("/completed")
+async def clear_completed(current_user_email: str = Depends(get_current_user)):
+    """Delete all completed tasks"""
+    deleted = await TaskController.clear_completed(current_user_email)
+    return {"message": "Completed tasks deleted", "deleted_count": deleted}
 
 @router.get("/{task_id}", response_model=TaskResponse)
 async def get_task(
     task_id: str,
+    if_none_match: Optional[str] = Header(None),
     current_user_email: str = Depends(get_current_user)
 ):
-    """Get a specific task by ID"""
-    return await TaskController.get_task_by_id(task_id, current_user_email)
+    """Get a specific task by ID; supports If-None-Match like the list"""
+    version = await TaskController.get_task_version(current_user_email)
+    etag = make_etag(current_user_email, version, "task", task_id)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    response = task_response(await TaskController.get_task_by_id(task_id, current_user_email))
+    if not isinstance(response, FastJSONResponse):
+        response = FastJSONResponse(response.model_dump(mode="json"))
+    response.headers.update({"ETag": etag, **CACHE_HEADERS})
+    return response
 
 @router.put("/{task_id}", response_model=TaskResponse)
 async def update_task(
@@ -34,7 +244,7 @@ async def update_task(
     current_user_email: str = Depends(get_current_user)
 ):
     """Update a task"""
-    return await TaskController.update_task(task_id, task_data, current_user_email)
+    return task_response(await TaskController.update_task(task_id, task_data, current_user_email))
 
 @router.delete("/{task_id}")
 async def delete_task(
@@ -51,4 +261,4 @@ async def toggle_task(
     current_user_email: str = Depends(get_current_user)
 ):
     """Toggle task completion status"""
-    return await TaskController.toggle_task(task_id, current_user_email)
+    return task_response(await TaskController.toggle_task(task_id, current_user_email))
@@ -0,0 +1,229 @@
+"""Storage engine interface.
+
+Controllers talk to a StorageEngine instead of Motor collections so the
+API can run on MongoDB, in memory or on SQLite. Documents keep the Mongo
+shape in every engine: ``_id`` is an ObjectId and dates are naive UTC
+datetimes truncated to milliseconds, like BSON dates.
+
+Engines also maintain ``modified_at`` on every task, the time of its last
+write (created_at, then each updated_at), and record a tombstone for every
+deleted task. Both feed the delta sync; neither is part of the API. The
+search terms of each task's text (app.utils.search) are indexed per user
+for search(), and per-user counters of total and completed tasks are kept
+current by every write for stats().
+"""
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Callable, Dict, Iterable, List, Optional, Set, Tuple, Union
+import os
+from bson import ObjectId
+
+# Keyset position: (sort field value, _id) for listing, (modified_at, _id)
+# or (deleted_at, _id) for changes
+TaskPosition = Tuple[Union[datetime, str], ObjectId]
+
+# Sort keys accepted by TaskQuery and the document field each orders by.
+# "updated_at" orders by the last write, so tasks never edited sort by
+# their creation time instead of collecting at one end.
+TASK_SORT_FIELDS = {"created_at": "created_at", "updated_at": "modified_at", "text": "text"}
+
+# Tombstones older than this are compacted; sync tokens older than this
+# can no longer be served and clients must fetch the full list again
+TOMBSTONE_RETENTION = timedelta(days=float(os.getenv("TASK_TOMBSTONE_RETENTION_DAYS", 30)))
+
+
+class DuplicateError(Exception):
+    """A unique constraint (e.g. users.email) was violated"""
+
+
+def truncate_millis(value: Optional[datetime]) -> Optional[datetime]:
+    """Drop sub-millisecond precision, as MongoDB does when storing dates"""
+    if value is None:
+        return None
+    return value.replace(microsecond=value.microsecond // 1000 * 1000)
+
+
+def utcnow() -> datetime:
+    """Current UTC time at the precision every engine stores"""
+    return truncate_millis(datetime.utcnow())
+
+
+def with_modified_at(document: dict) -> dict:
+    """Default modified_at on a new task document to its last write time"""
+    document.setdefault("modified_at", document.get("updated_at") or document["created_at"])
+    return document
+
+
+@dataclass(frozen=True)
+class TaskQuery:
+    """Filters, order and projection for list_page. Date bounds are
+    exclusive; an updated_at bound excludes tasks never updated."""
+    completed: Optional[bool] = None
+    created_after: Optional[datetime] = None
+    created_before: Optional[datetime] = None
+    updated_after: Optional[datetime] = None
+    updated_before: Optional[datetime] = None
+    sort: str = "created_at"
+    descending: bool = True
+    # Document fields to return besides _id and the sort field; None for all.
+    # Engines may return more.
+    fields: Optional[Tuple[str, ...]] = None
+
+    @property
+    def sort_field(self) -> str:
+        return TASK_SORT_FIELDS[self.sort]
+
+    def date_bounds(self) -> List[Tuple[str, Optional[datetime], Optional[datetime]]]:
+        """(field, lower, upper) for each date field with a bound"""
+        bounds = [
+            ("created_at", self.created_after, self.created_before),
+            ("updated_at", self.updated_after, self.updated_before),
+        ]
+        return [bound for bound in bounds if bound[1] is not None or bound[2] is not None]
+
+
+@dataclass
+class BulkOperation:
+    kind: str  # "insert", "update", "toggle" or "delete"
+    task_id: Optional[ObjectId] = None
+    document: Optional[dict] = None  # insert
+    fields: Optional[dict] = None  # update: fields to set
+    updated_at: Optional[datetime] = None  # toggle
+
+
+@dataclass
+class BulkResult:
+    inserted: int = 0
+    matched: int = 0
+    deleted: int = 0
+    # Position in the operation list -> error message
+    errors: Dict[int, str] = field(default_factory=dict)
+
+
+class TaskRepository:
+    """Task storage. Every method is scoped to one user's tasks."""
+
+    async def insert(self, document: dict) -> dict:
+        """Store a new task; sets and returns it with _id"""
+        raise NotImplementedError
+
+    async def insert_many(self, documents: List[dict]) -> int:
+        raise NotImplementedError
+
+    async def list_page(self, user_email: str, limit: Optional[int], after: Optional[TaskPosition] = None,
+                        query: Optional[TaskQuery] = None) -> List[dict]:
+        """Tasks matching query in its order (newest first by default),
+        starting after the given keyset position"""
+        raise NotImplementedError
+
+    async def iterate(self, user_email: str, batch_size: int) -> AsyncIterator[dict]:
+        """All tasks newest first, fetched batch_size at a time"""
+        raise NotImplementedError
+        yield  # pragma: no cover
+
+    async def get(self, user_email: str, task_id: ObjectId) -> Optional[dict]:
+        raise NotImplementedError
+
+    async def existing_ids(self, user_email: str, task_ids: Iterable[ObjectId]) -> Set[ObjectId]:
+        raise NotImplementedError
+
+    async def update(self, user_email: str, task_id: ObjectId, fields: dict) -> Optional[dict]:
+        """Set fields and return the updated task, or None if not found"""
+        raise NotImplementedError
+
+    async def toggle(self, user_email: str, task_id: ObjectId, updated_at: datetime) -> Optional[dict]:
+        """Atomically negate completed and return the updated task"""
+        raise NotImplementedError
+
+    async def delete(self, user_email: str, task_id: ObjectId) -> bool:
+        """Delete a task and record its tombstone"""
+        raise NotImplementedError
+
+    async def delete_completed(self, user_email: str) -> int:
+        """Delete completed tasks and record their tombstones"""
+        raise NotImplementedError
+
+    async def bulk_write(self, user_email: str, operations: List[BulkOperation], ordered: bool) -> BulkResult:
+        """Apply operations in one batch; ordered batches stop at the first error"""
+        raise NotImplementedError
+
+    async def search(self, user_email: str, terms: List[str], limit: int) -> List[dict]:
+        """Up to limit tasks having, for each of terms, a search term equal
+        to it or starting with it. Which ones, when more match, is up to the engine."""
+        raise NotImplementedError
+
+    async def changes(self, user_email: str, after: Optional[TaskPosition], limit: int) -> List[dict]:
+        """Tasks in ascending (modified_at, _id) order after the given position"""
+        raise NotImplementedError
+
+    async def tombstones(self, user_email: str, after: Optional[TaskPosition], limit: int) -> List[dict]:
+        """Tombstones ({_id, user_email, deleted_at}) in ascending (deleted_at, _id) order"""
+        raise NotImplementedError
+
+    async def stats(self, user_email: str) -> dict:
+        """The user's counters: {"total": n, "completed": n}, without scanning tasks"""
+        raise NotImplementedError
+
+    async def reconcile_stats(self) -> int:
+        """Recount every user's tasks and repair counters that drifted;
+        returns the number of users repaired"""
+        raise NotImplementedError
+
+    async def get_version(self, user_email: str) -> int:
+        """The user's task list version; 0 before the first write"""
+        raise NotImplementedError
+
+    async def bump_version(self, user_email: str) -> int:
+        """Increment the user's task list version after a write and return it"""
+        raise NotImplementedError
+
+
+class UserRepository:
+
+    async def find_by_email(self, email: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    async def find_summary(self, email: str) -> Optional[dict]:
+        """{_id, email, created_at} of a user, without the password hash"""
+        raise NotImplementedError
+
+    async def insert(self, document: dict) -> dict:
+        """Store a new user; raises DuplicateError if the email is taken"""
+        raise NotImplementedError
+
+    async def update_password(self, email: str, old_hash: str, new_hash: str) -> bool:
+        """Replace the user's password hash if it is still old_hash, so a
+        concurrent password change is never overwritten"""
+        raise NotImplementedError
+
+
+class StorageEngine:
+    name: str = ""
+    tasks: TaskRepository
+    users: UserRepository
+
+    async def connect(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def migrate(self):
+        """Create indexes/schema (idempotent)"""
+        pass
+
+    async def ping(self) -> bool:
+        return True
+
+    def stats(self) -> dict:
+        return {"engine": self.name}
+
+    def watch_tasks(self, ready: Callable[[], None]) -> AsyncIterator[Tuple[str, str, Optional[dict], int]]:
+        """Follow task writes made by any process, as (user_email, event type,
+        document, version) with the event types TaskEventBus.publish takes:
+        "created", "updated", "toggled", "deleted" (the document is then the
+        tombstone) or "invalidate" (no document), and the user's task list
+        version after the write. ready() is called once the feed is open.
+        Raises NotImplementedError where there is no such feed.
+        """
+        raise NotImplementedError("no change feed")
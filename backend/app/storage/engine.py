@@ -0,0 +1,33 @@
+import os
+from app.storage.base import StorageEngine
+
+# "mongo" (default), "memory" or "sqlite"
+STORAGE_ENGINE = os.getenv("STORAGE_ENGINE", "mongo")
+
+_engine: StorageEngine = None
+
+def create_engine(name: str) -> StorageEngine:
+    """Build the storage engine called name"""
+    # Imported lazily so unused engines (and their drivers) are not loaded
+    if name == "mongo":
+        from app.storage.mongo import MongoStorageEngine
+        return MongoStorageEngine()
+    if name == "memory":
+        from app.storage.memory import MemoryStorageEngine
+        return MemoryStorageEngine()
+    if name == "sqlite":
+        from app.storage.sqlite import SQLiteStorageEngine
+        return SQLiteStorageEngine()
+    raise ValueError(f"Unknown STORAGE_ENGINE '{name}', expected 'mongo', 'memory' or 'sqlite'")
+
+def get_storage() -> StorageEngine:
+    """The configured storage engine"""
+    global _engine
+    if _engine is None:
+        _engine = create_engine(STORAGE_ENGINE)
+    return _engine
+
+def set_storage(engine: StorageEngine):
+    """Replace the storage engine (benchmarks, tests)"""
+    global _engine
+    _engine = engine
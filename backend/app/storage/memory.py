@@ -0,0 +1,350 @@
+from bisect import bisect_left, bisect_right, insort
+from typing import Dict, List, Set, Tuple
+from bson import ObjectId
+from app.storage.base import (
+    BulkOperation, BulkResult, DuplicateError, StorageEngine, TOMBSTONE_RETENTION,
+    TaskQuery, TaskRepository, UserRepository, truncate_millis, utcnow, with_modified_at
+)
+from app.utils.search import PREFIX_END, matches_prefix, search_terms
+
+def _key(task: dict) -> Tuple:
+    return (task["created_at"], task["_id"])
+
+def _modified_key(task: dict) -> Tuple:
+    return (task["modified_at"], task["_id"])
+
+def _text_key(task: dict) -> Tuple:
+    return (task["text"], task["_id"])
+
+def _matches(task: dict, query: TaskQuery) -> bool:
+    if query.completed is not None and task["completed"] != query.completed:
+        return False
+    for name, lower, upper in query.date_bounds():
+        value = task.get(name)
+        if value is None or (lower is not None and value <= lower) or (upper is not None and value >= upper):
+            return False
+    return True
+
+def _copy(task):
+    return dict(task) if task is not None else None
+
+
+class MemoryTaskRepository(TaskRepository):
+    """Tasks indexed by id and, per user, in lists sorted by (created_at, _id),
+    (modified_at, _id) and (text, _id); tombstones per user sorted by
+    (deleted_at, _id). Search uses a per-user inverted index: term -> task
+    ids, with the terms kept sorted for prefix lookups.
+
+    The sorted lists answer keyset pages with a binary search, so a page
+    costs the same however many tasks the user has. Single event loop, so
+    no locking is needed. Callers always get copies of stored documents.
+    """
+
+    def __init__(self):
+        self._by_id: Dict[ObjectId, dict] = {}
+        self._by_user: Dict[str, List[Tuple]] = {}
+        self._modified_by_user: Dict[str, List[Tuple]] = {}
+        self._text_by_user: Dict[str, List[Tuple]] = {}
+        self._postings: Dict[str, Dict[str, Set[ObjectId]]] = {}
+        self._terms_by_user: Dict[str, List[str]] = {}
+        self._task_terms: Dict[ObjectId, List[str]] = {}
+        self._tombstones: Dict[str, List[Tuple]] = {}
+        self._versions: Dict[str, int] = {}
+        # user -> [total, completed]
+        self._stats: Dict[str, List[int]] = {}
+
+    def _owned(self, user_email, task_id):
+        task = self._by_id.get(task_id)
+        if task is None or task["user_email"] != user_email:
+            return None
+        return task
+
+    def _count(self, user_email, total, completed):
+        counters = self._stats.setdefault(user_email, [0, 0])
+        counters[0] += total
+        counters[1] += completed
+
+    def _index_terms(self, task):
+        terms = self._task_terms[task["_id"]] = search_terms(task["text"])
+        postings = self._postings.setdefault(task["user_email"], {})
+        sorted_terms = self._terms_by_user.setdefault(task["user_email"], [])
+        for term in terms:
+            ids = postings.get(term)
+            if ids is None:
+                ids = postings[term] = set()
+                insort(sorted_terms, term)
+            ids.add(task["_id"])
+
+    def _unindex_terms(self, task):
+        postings = self._postings[task["user_email"]]
+        sorted_terms = self._terms_by_user[task["user_email"]]
+        for term in self._task_terms.pop(task["_id"]):
+            ids = postings[term]
+            ids.discard(task["_id"])
+            if not ids:
+                del postings[term]
+                del sorted_terms[bisect_left(sorted_terms, term)]
+
+    def _add(self, document):
+        document.setdefault("_id", ObjectId())
+        if document["_id"] in self._by_id:
+            raise DuplicateError(f"Duplicate task id {document['_id']}")
+        task = dict(with_modified_at(document))
+        for name in ("created_at", "updated_at", "modified_at"):
+            task[name] = truncate_millis(task.get(name))
+        self._by_id[task["_id"]] = task
+        insort(self._by_user.setdefault(task["user_email"], []), _key(task))
+        insort(self._modified_by_user.setdefault(task["user_email"], []), _modified_key(task))
+        insort(self._text_by_user.setdefault(task["user_email"], []), _text_key(task))
+        self._index_terms(task)
+        self._count(task["user_email"], 1, int(task["completed"]))
+        document.update(task)
+        return task
+
+    def _remove(self, task):
+        keys = self._by_user[task["user_email"]]
+        del keys[bisect_left(keys, _key(task))]
+        modified = self._modified_by_user[task["user_email"]]
+        del modified[bisect_left(modified, _modified_key(task))]
+        texts = self._text_by_user[task["user_email"]]
+        del texts[bisect_left(texts, _text_key(task))]
+        self._unindex_terms(task)
+        self._count(task["user_email"], -1, -int(task["completed"]))
+        del self._by_id[task["_id"]]
+
+        now = utcnow()
+        tombstones = self._tombstones.setdefault(task["user_email"], [])
+        insort(tombstones, (now, task["_id"]))
+        # Compact this user's expired tombstones while we are here
+        expired = bisect_left(tombstones, (now - TOMBSTONE_RETENTION,))
+        del tombstones[:expired]
+
+    def _set(self, task, fields):
+        if "updated_at" in fields:
+            fields = {**fields, "modified_at": fields["updated_at"]}
+        modified = self._modified_by_user[task["user_email"]] if "modified_at" in fields else None
+        texts = self._text_by_user[task["user_email"]] if "text" in fields else None
+        if modified is not None:
+            del modified[bisect_left(modified, _modified_key(task))]
+        if texts is not None:
+            del texts[bisect_left(texts, _text_key(task))]
+            self._unindex_terms(task)
+        if "completed" in fields:
+            self._count(task["user_email"], 0, int(fields["completed"]) - int(task["completed"]))
+        for name, value in fields.items():
+            task[name] = truncate_millis(value) if name.endswith("_at") else value
+        if modified is not None:
+            insort(modified, _modified_key(task))
+        if texts is not None:
+            insort(texts, _text_key(task))
+            self._index_terms(task)
+
+    async def insert(self, document):
+        self._add(document)
+        return document
+
+    async def insert_many(self, documents):
+        for document in documents:
+            self._add(document)
+        return len(documents)
+
+    async def list_page(self, user_email, limit, after=None, query=None):
+        if query is None:
+            keys = self._by_user.get(user_email, [])
+            end = bisect_left(keys, after) if after is not None else len(keys)
+            start = 0 if limit is None else max(end - limit, 0)
+            return [_copy(self._by_id[task_id]) for _, task_id in reversed(keys[start:end])]
+
+        index = {"created_at": self._by_user, "modified_at": self._modified_by_user, "text": self._text_by_user}
+        keys = index[query.sort_field].get(user_email, [])
+        if query.descending:
+            end = bisect_left(keys, tuple(after)) if after is not None else len(keys)
+            positions = range(end - 1, -1, -1)
+        else:
+            positions = range(bisect_right(keys, tuple(after)) if after is not None else 0, len(keys))
+        # Filters are checked while walking the sort order, like an index scan
+        page = []
+        for position in positions:
+            task = self._by_id[keys[position][1]]
+            if _matches(task, query):
+                page.append(_copy(task))
+                if limit is not None and len(page) >= limit:
+                    break
+        return page
+
+    async def iterate(self, user_email, batch_size):
+        after = None
+        while True:
+            page = await self.list_page(user_email, batch_size, after)
+            for task in page:
+                yield task
+            if len(page) < batch_size:
+                return
+            after = _key(page[-1])
+
+    async def get(self, user_email, task_id):
+        return _copy(self._owned(user_email, task_id))
+
+    async def existing_ids(self, user_email, task_ids):
+        return {task_id for task_id in task_ids if self._owned(user_email, task_id)}
+
+    async def update(self, user_email, task_id, fields):
+        task = self._owned(user_email, task_id)
+        if task is None:
+            return None
+        self._set(task, fields)
+        return _copy(task)
+
+    async def toggle(self, user_email, task_id, updated_at):
+        task = self._owned(user_email, task_id)
+        if task is None:
+            return None
+        self._set(task, {"completed": not task["completed"], "updated_at": updated_at})
+        return _copy(task)
+
+    async def delete(self, user_email, task_id):
+        task = self._owned(user_email, task_id)
+        if task is None:
+            return False
+        self._remove(task)
+        return True
+
+    async def delete_completed(self, user_email):
+        completed = [
+            self._by_id[task_id] for _, task_id in self._by_user.get(user_email, [])
+            if self._by_id[task_id]["completed"]
+        ]
+        for task in completed:
+            self._remove(task)
+        return len(completed)
+
+    async def bulk_write(self, user_email, operations: List[BulkOperation], ordered):
+        result = BulkResult()
+        for position, op in enumerate(operations):
+            try:
+                if op.kind == "insert":
+                    self._add(op.document)
+                    result.inserted += 1
+                elif op.kind == "delete":
+                    result.deleted += int(await self.delete(user_email, op.task_id))
+                elif op.kind == "toggle":
+                    result.matched += int(await self.toggle(user_email, op.task_id, op.updated_at) is not None)
+                else:
+                    result.matched += int(await self.update(user_email, op.task_id, op.fields) is not None)
+            except DuplicateError as e:
+                result.errors[position] = str(e)
+                if ordered:
+                    break
+        return result
+
+    async def search(self, user_email, terms, limit):
+        postings = self._postings.get(user_email, {})
+        sorted_terms = self._terms_by_user.get(user_email, [])
+        # Task ids for each query term: the union over the terms it prefixes
+        matching = []
+        for term in terms:
+            start = bisect_left(sorted_terms, term)
+            end = bisect_left(sorted_terms, term + PREFIX_END, start)
+            matching.append([postings[indexed] for indexed in sorted_terms[start:end]])
+        # Walk the rarest term's tasks and check the other terms on each
+        rarest = min(matching, key=lambda sets: sum(len(ids) for ids in sets))
+        results = []
+        seen = set()
+        for ids in rarest:
+            for task_id in ids:
+                if task_id in seen:
+                    continue
+                seen.add(task_id)
+                task_terms = self._task_terms[task_id]
+                if all(matches_prefix(task_terms, term) for term in terms):
+                    results.append(_copy(self._by_id[task_id]))
+                    if len(results) >= limit:
+                        return results
+        return results
+
+    async def changes(self, user_email, after, limit):
+        keys = self._modified_by_user.get(user_email, [])
+        start = bisect_right(keys, tuple(after)) if after is not None else 0
+        return [_copy(self._by_id[task_id]) for _, task_id in keys[start:start + limit]]
+
+    async def tombstones(self, user_email, after, limit):
+        keys = self._tombstones.get(user_email, [])
+        start = bisect_right(keys, tuple(after)) if after is not None else 0
+        return [
+            {"_id": task_id, "user_email": user_email, "deleted_at": deleted_at}
+            for deleted_at, task_id in keys[start:start + limit]
+        ]
+
+    async def stats(self, user_email):
+        total, completed = self._stats.get(user_email, (0, 0))
+        return {"total": total, "completed": completed}
+
+    async def reconcile_stats(self):
+        actual: Dict[str, List[int]] = {}
+        for task in self._by_id.values():
+            counters = actual.setdefault(task["user_email"], [0, 0])
+            counters[0] += 1
+            counters[1] += int(task["completed"])
+        repaired = 0
+        for user_email in actual.keys() | self._stats.keys():
+            counters = actual.get(user_email, [0, 0])
+            if self._stats.get(user_email, [0, 0]) != counters:
+                self._stats[user_email] = counters
+                repaired += 1
+        return repaired
+
+    async def get_version(self, user_email):
+        return self._versions.get(user_email, 0)
+
+    async def bump_version(self, user_email):
+        self._versions[user_email] = self._versions.get(user_email, 0) + 1
+        return self._versions[user_email]
+
+
+class MemoryUserRepository(UserRepository):
+
+    def __init__(self):
+        self._by_email: Dict[str, dict] = {}
+
+    async def find_by_email(self, email):
+        return _copy(self._by_email.get(email))
+
+    async def find_summary(self, email):
+        user = self._by_email.get(email)
+        if user is None:
+            return None
+        return {"_id": user["_id"], "email": user["email"], "created_at": user["created_at"]}
+
+    async def insert(self, document):
+        if document["email"] in self._by_email:
+            raise DuplicateError(f"Email already registered: {document['email']}")
+        document.setdefault("_id", ObjectId())
+        user = dict(document)
+        user["created_at"] = truncate_millis(user["created_at"])
+        self._by_email[user["email"]] = user
+        document.update(user)
+        return document
+
+    async def update_password(self, email, old_hash, new_hash):
+        user = self._by_email.get(email)
+        if user is None or user["password"] != old_hash:
+            return False
+        user["password"] = new_hash
+        return True
+
+
+class MemoryStorageEngine(StorageEngine):
+    """Process-local storage for single-node runs, tests and benchmarks.
+    Data is lost on restart."""
+    name = "memory"
+
+    def __init__(self):
+        self.tasks = MemoryTaskRepository()
+        self.users = MemoryUserRepository()
+
+    def stats(self):
+        return {
+            "engine": self.name,
+            "tasks": len(self.tasks._by_id),
+            "users": len(self.users._by_email),
+        }
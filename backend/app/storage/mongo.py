@@ -0,0 +1,491 @@
+from datetime import datetime
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Set, Tuple
+from bson import ObjectId
+from pymongo import DeleteOne, InsertOne, ReplaceOne, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+from app.storage.base import (
+    BulkOperation, BulkResult, DuplicateError, StorageEngine,
+    TaskPosition, TaskQuery, TaskRepository, UserRepository, utcnow, with_modified_at
+)
+from app.utils.database import connect_to_mongo, close_mongo_connection, get_database, get_pool_stats, start_connection_monitor
+from app.utils.migrations import STATS_PIPELINE, run_migrations
+from app.utils.search import PREFIX_END, search_terms
+
+# Newest first; matches the (user_email, created_at desc, _id desc) index
+TASK_SORT = [("created_at", -1), ("_id", -1)]
+# Delta sync order; matches the user_modified and user_deleted indexes
+CHANGES_SORT = [("modified_at", 1), ("_id", 1)]
+TOMBSTONES_SORT = [("deleted_at", 1), ("_id", 1)]
+# search_terms is only for the index; reads leave it out
+TASK_PROJECTION = {"search_terms": 0}
+# Task writes, deletions (through their tombstones) and the version bumps
+# that follow them, for watch_tasks
+WATCH_PIPELINE = [{"$match": {"$or": [
+    {"ns.coll": "tasks", "operationType": {"$in": ["insert", "update", "replace"]}},
+    {"ns.coll": "task_tombstones", "operationType": "insert"},
+    {"ns.coll": "task_versions", "operationType": {"$in": ["insert", "update", "replace"]}},
+]}}]
+# Fields a toggle sets; an update setting only these is reported as "toggled"
+TOGGLE_FIELDS = {"completed", "updated_at", "modified_at"}
+# The counters kept with each user's task list version
+STATS_PROJECTION = {"total": 1, "completed": 1}
+# User fields that are safe to cache: everything but the password hash
+USER_SUMMARY_PROJECTION = {"email": 1, "created_at": 1}
+# Error code for change streams on a standalone server
+CHANGE_STREAM_UNSUPPORTED = 40573
+
+
+def _after_filter(after: Optional[TaskPosition], field: str = "created_at", descending: bool = True) -> dict:
+    if after is None:
+        return {}
+    value, task_id = after
+    operator = "$lt" if descending else "$gt"
+    return {
+        "$or": [
+            {field: {operator: value}},
+            {field: value, "_id": {operator: task_id}},
+        ]
+    }
+
+def _query_filter(query: TaskQuery) -> dict:
+    conditions = {}
+    if query.completed is not None:
+        conditions["completed"] = query.completed
+    for field, lower, upper in query.date_bounds():
+        bounds = {}
+        if lower is not None:
+            bounds["$gt"] = lower
+        if upper is not None:
+            bounds["$lt"] = upper
+        conditions[field] = bounds
+    return conditions
+
+def _since_filter(field: str, after: Optional[TaskPosition]) -> dict:
+    if after is None:
+        return {}
+    at, task_id = after
+    return {"$or": [{field: {"$gt": at}}, {field: at, "_id": {"$gt": task_id}}]}
+
+def _new_task(document: dict) -> dict:
+    with_modified_at(document)
+    document["search_terms"] = search_terms(document["text"])
+    return document
+
+def _set_fields(fields: dict) -> dict:
+    if "updated_at" in fields:
+        fields = {**fields, "modified_at": fields["updated_at"]}
+    if "text" in fields:
+        fields = {**fields, "search_terms": search_terms(fields["text"])}
+    return fields
+
+def _toggle_pipeline(updated_at: datetime) -> list:
+    return [{"$set": {"completed": {"$not": "$completed"}, "updated_at": updated_at, "modified_at": updated_at}}]
+
+def _task_event(change: dict) -> Optional[Tuple[str, str, dict]]:
+    """(user_email, event type, document) for a change to tasks or tombstones"""
+    document = change.get("fullDocument")
+    if document is None:
+        # Deleted before the update lookup; its tombstone follows
+        return None
+    if change["ns"]["coll"] == "task_tombstones":
+        return document["user_email"], "deleted", document
+    if change["operationType"] == "insert":
+        return document["user_email"], "created", document
+    updated = set(change.get("updateDescription", {}).get("updatedFields", {}))
+    if change["operationType"] == "update" and updated and updated <= TOGGLE_FIELDS:
+        return document["user_email"], "toggled", document
+    return document["user_email"], "updated", document
+
+async def _versioned_events(changes: AsyncIterator[dict]) -> AsyncIterator[Tuple[str, str, Optional[dict], int]]:
+    """Pair task changes with the version bump that follows them.
+
+    Every write changes the tasks first and bumps the user's version after,
+    so a user's task events are held until the bump arrives and then carry
+    its version, as events published in-process do. When several changes
+    share one bump (a bulk write, an import, or writes from two workers
+    interleaving) they are sent as a single "invalidate", and so is a bump
+    with no change before it, so the client's last event id still follows
+    the version behind the ETags.
+    """
+    # user_email -> (first held event, number of held events)
+    held: Dict[str, Tuple[Tuple[str, str, dict], int]] = {}
+    async for change in changes:
+        if change["ns"]["coll"] != "task_versions":
+            event = _task_event(change)
+            if event is not None:
+                first, count = held.get(event[0], (event, 0))
+                held[event[0]] = (first, count + 1)
+            continue
+        user_email = change["documentKey"]["_id"]
+        if change["operationType"] == "update":
+            # Counter repairs update the document without bumping the version
+            version = change.get("updateDescription", {}).get("updatedFields", {}).get("version")
+        else:
+            version = (change.get("fullDocument") or {}).get("version")
+        if version is None:
+            continue
+        first, count = held.pop(user_email, (None, 0))
+        if count == 1:
+            yield user_email, first[1], first[2], version
+        else:
+            yield user_email, "invalidate", None, version
+
+def _tombstone(user_email: str, task_id: ObjectId, deleted_at: datetime) -> dict:
+    return {"_id": task_id, "user_email": user_email, "deleted_at": deleted_at}
+
+async def _write_tombstones(db, user_email: str, task_ids: Iterable[ObjectId], deleted_at: datetime):
+    """Record deletions as upserts: a concurrent delete of the same task may
+    have written its tombstone already"""
+    requests = [
+        ReplaceOne({"_id": task_id}, _tombstone(user_email, task_id, deleted_at), upsert=True)
+        for task_id in task_ids
+    ]
+    if requests:
+        await db.task_tombstones.bulk_write(requests, ordered=False)
+
+async def _gone(db, user_email: str, task_ids: List[ObjectId]) -> List[ObjectId]:
+    """The ids among task_ids that no longer exist"""
+    survivors = {
+        doc["_id"] for doc in
+        await db.tasks.find({"_id": {"$in": task_ids}, "user_email": user_email}, {"_id": 1}).to_list(length=None)
+    }
+    return [task_id for task_id in task_ids if task_id not in survivors]
+
+
+class MongoTaskRepository(TaskRepository):
+    """Tasks, plus one task_versions document per user holding the list
+    version and the counters behind /stats.
+
+    Every write is followed by bump_version, so writes only note how they
+    change the counters and the bump applies that with the version in the
+    same command. A process that dies in between loses the change; the
+    reconciliation job repairs it.
+    """
+
+    def __init__(self):
+        # user_email -> [total, completed] changes waiting for the next bump
+        self._pending_stats: Dict[str, List[int]] = {}
+
+    def _count(self, user_email: str, total: int = 0, completed: int = 0):
+        if total or completed:
+            pending = self._pending_stats.setdefault(user_email, [0, 0])
+            pending[0] += total
+            pending[1] += completed
+
+    async def insert(self, document):
+        db = await get_database()
+        await db.tasks.insert_one(_new_task(document))
+        self._count(document["user_email"], 1, int(document["completed"]))
+        return document
+
+    async def insert_many(self, documents):
+        db = await get_database()
+        result = await db.tasks.insert_many([_new_task(document) for document in documents], ordered=False)
+        # Imports insert for one user
+        if documents:
+            self._count(documents[0]["user_email"], len(documents), sum(int(d["completed"]) for d in documents))
+        return len(result.inserted_ids)
+
+    async def list_page(self, user_email, limit, after=None, query=None):
+        db = await get_database()
+        if query is None:
+            cursor = db.tasks.find({"user_email": user_email, **_after_filter(after)}, TASK_PROJECTION).sort(TASK_SORT)
+        else:
+            field = query.sort_field
+            direction = -1 if query.descending else 1
+            projection = TASK_PROJECTION
+            if query.fields is not None:
+                projection = dict.fromkeys((*query.fields, field), 1)
+            cursor = db.tasks.find(
+                {"user_email": user_email, **_query_filter(query), **_after_filter(after, field, query.descending)},
+                projection
+            ).sort([(field, direction), ("_id", direction)])
+        if limit is not None:
+            cursor = cursor.limit(limit)
+        return await cursor.to_list(length=None)
+
+    async def iterate(self, user_email, batch_size) -> AsyncIterator[dict]:
+        db = await get_database()
+        cursor = db.tasks.find(
+            {"user_email": user_email},
+            {"text": 1, "completed": 1, "created_at": 1, "updated_at": 1}
+        ).sort(TASK_SORT).batch_size(batch_size)
+        async for task in cursor:
+            yield task
+
+    async def get(self, user_email, task_id):
+        db = await get_database()
+        return await db.tasks.find_one({"_id": task_id, "user_email": user_email}, TASK_PROJECTION)
+
+    async def existing_ids(self, user_email, task_ids: Iterable[ObjectId]) -> Set[ObjectId]:
+        db = await get_database()
+        docs = await db.tasks.find(
+            {"_id": {"$in": list(task_ids)}, "user_email": user_email},
+            {"_id": 1}
+        ).to_list(length=None)
+        return {doc["_id"] for doc in docs}
+
+    async def update(self, user_email, task_id, fields):
+        db = await get_database()
+        fields = _set_fields(fields)
+        if "completed" not in fields:
+            # Update and return the new document in one round trip
+            return await db.tasks.find_one_and_update(
+                {"_id": task_id, "user_email": user_email},
+                {"$set": fields},
+                projection=TASK_PROJECTION,
+                return_document=ReturnDocument.AFTER
+            )
+        # The counters need the old completed value; the new document is
+        # the old one with the fields set
+        before = await db.tasks.find_one_and_update(
+            {"_id": task_id, "user_email": user_email},
+            {"$set": fields},
+            projection=TASK_PROJECTION,
+            return_document=ReturnDocument.BEFORE
+        )
+        if before is None:
+            return None
+        after = {**before, **fields}
+        after.pop("search_terms", None)
+        self._count(user_email, completed=int(after["completed"]) - int(before["completed"]))
+        return after
+
+    async def toggle(self, user_email, task_id, updated_at):
+        db = await get_database()
+        # Negate completed on the server so concurrent toggles never
+        # overwrite each other, and get the new document back in one round trip
+        task = await db.tasks.find_one_and_update(
+            {"_id": task_id, "user_email": user_email},
+            _toggle_pipeline(updated_at),
+            projection=TASK_PROJECTION,
+            return_document=ReturnDocument.AFTER
+        )
+        if task is not None:
+            self._count(user_email, completed=1 if task["completed"] else -1)
+        return task
+
+    async def delete(self, user_email, task_id):
+        db = await get_database()
+        task = await db.tasks.find_one_and_delete({"_id": task_id, "user_email": user_email}, {"completed": 1})
+        if task is None:
+            return False
+        await _write_tombstones(db, user_email, [task_id], utcnow())
+        self._count(user_email, -1, -int(task["completed"]))
+        return True
+
+    async def delete_completed(self, user_email):
+        db = await get_database()
+        # Collect the ids first: each deleted task needs a tombstone
+        docs = await db.tasks.find({"user_email": user_email, "completed": True}, {"_id": 1}).to_list(length=None)
+        task_ids = [doc["_id"] for doc in docs]
+        if not task_ids:
+            return 0
+        # Still filtered on completed: a task un-completed since the find stays
+        result = await db.tasks.delete_many({"_id": {"$in": task_ids}, "user_email": user_email, "completed": True})
+        if result.deleted_count < len(task_ids):
+            task_ids = await _gone(db, user_email, task_ids)
+        await _write_tombstones(db, user_email, task_ids, utcnow())
+        self._count(user_email, -result.deleted_count, -result.deleted_count)
+        return result.deleted_count
+
+    async def bulk_write(self, user_email, operations: List[BulkOperation], ordered) -> BulkResult:
+        db = await get_database()
+        requests = []
+        for op in operations:
+            task_filter = {"_id": op.task_id, "user_email": user_email}
+            if op.kind == "insert":
+                requests.append(InsertOne(_new_task(op.document)))
+            elif op.kind == "delete":
+                requests.append(DeleteOne(task_filter))
+            elif op.kind == "toggle":
+                requests.append(UpdateOne(task_filter, _toggle_pipeline(op.updated_at)))
+            else:
+                requests.append(UpdateOne(task_filter, {"$set": _set_fields(op.fields)}))
+
+        try:
+            result = (await db.tasks.bulk_write(requests, ordered=ordered)).bulk_api_result
+            errors = {}
+        except BulkWriteError as e:
+            result = e.details
+            errors = {error["index"]: error["errmsg"] for error in e.details.get("writeErrors", [])}
+
+        # Tombstone only the tasks that are gone; a delete skipped by an error
+        # (ordered batches stop at the first one) leaves its task in place
+        delete_ids = [op.task_id for op in operations if op.kind == "delete"]
+        if delete_ids:
+            await _write_tombstones(db, user_email, await _gone(db, user_email, delete_ids), utcnow())
+        if any(op.kind in ("toggle", "delete") or (op.kind == "update" and "completed" in op.fields) for op in operations):
+            # These do not report the completed value they changed, so
+            # recount this user instead
+            await self._recount_stats(db, user_email)
+        else:
+            # Inserts that ran: all but failed ones, and in an ordered batch
+            # none after the first failure
+            stop = min(errors) if ordered and errors else len(operations)
+            inserted = [
+                op.document for index, op in enumerate(operations[:stop])
+                if op.kind == "insert" and index not in errors
+            ]
+            self._count(user_email, len(inserted), sum(int(document["completed"]) for document in inserted))
+        return BulkResult(
+            inserted=result.get("nInserted", 0),
+            matched=result.get("nMatched", 0),
+            deleted=result.get("nRemoved", 0),
+            errors=errors
+        )
+
+    async def search(self, user_email, terms, limit):
+        db = await get_database()
+        # $elemMatch keeps both bounds on one array element; each condition
+        # is a range scan of the user_search_terms multikey index
+        conditions = [{"search_terms": {"$elemMatch": {"$gte": term, "$lt": term + PREFIX_END}}} for term in terms]
+        cursor = db.tasks.find({"user_email": user_email, "$and": conditions}, TASK_PROJECTION).limit(limit)
+        return await cursor.to_list(length=None)
+
+    async def changes(self, user_email, after, limit):
+        db = await get_database()
+        cursor = db.tasks.find(
+            {"user_email": user_email, **_since_filter("modified_at", after)}, TASK_PROJECTION
+        ).sort(CHANGES_SORT)
+        return await cursor.limit(limit).to_list(length=None)
+
+    async def tombstones(self, user_email, after, limit):
+        db = await get_database()
+        cursor = db.task_tombstones.find(
+            {"user_email": user_email, **_since_filter("deleted_at", after)}
+        ).sort(TOMBSTONES_SORT)
+        return await cursor.limit(limit).to_list(length=None)
+
+    async def stats(self, user_email):
+        db = await get_database()
+        doc = await db.task_versions.find_one({"_id": user_email}, STATS_PROJECTION)
+        return {"total": doc.get("total", 0), "completed": doc.get("completed", 0)} if doc else {"total": 0, "completed": 0}
+
+    async def _recount_stats(self, db, user_email) -> bool:
+        """Set the user's counters from a count of their tasks, unless a write
+        changed them meanwhile; returns whether they were changed"""
+        # The count includes writes still waiting for their bump
+        self._pending_stats.pop(user_email, None)
+        stored = await db.task_versions.find_one({"_id": user_email}, STATS_PROJECTION) or {}
+        # Both counts are answered from the user_completed_created_desc index
+        total = await db.tasks.count_documents({"user_email": user_email})
+        completed = await db.tasks.count_documents({"user_email": user_email, "completed": True})
+        if (stored.get("total", 0), stored.get("completed", 0)) == (total, completed):
+            return False
+        try:
+            # None also matches a document without counters yet
+            result = await db.task_versions.update_one(
+                {"_id": user_email, "total": stored.get("total"), "completed": stored.get("completed")},
+                {"$set": {"total": total, "completed": completed}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            # Created by a concurrent bump; next run checks it
+            return False
+        return bool(result.modified_count or result.upserted_id)
+
+    async def reconcile_stats(self):
+        db = await get_database()
+        # One pass over tasks finds the users that drifted; each is then
+        # recounted and repaired on its own, guarded against concurrent writes
+        actual = {
+            doc["_id"]: (doc["total"], doc["completed"])
+            async for doc in db.tasks.aggregate(STATS_PIPELINE, allowDiskUse=True)
+        }
+        stored = {
+            doc["_id"]: (doc.get("total", 0), doc.get("completed", 0))
+            async for doc in db.task_versions.find({}, STATS_PROJECTION)
+        }
+        repaired = 0
+        for user_email in actual.keys() | stored.keys():
+            if actual.get(user_email, (0, 0)) != stored.get(user_email, (0, 0)):
+                repaired += await self._recount_stats(db, user_email)
+        return repaired
+
+    async def get_version(self, user_email):
+        db = await get_database()
+        doc = await db.task_versions.find_one({"_id": user_email}, {"version": 1})
+        return doc.get("version", 0) if doc else 0
+
+    async def bump_version(self, user_email):
+        db = await get_database()
+        total, completed = self._pending_stats.pop(user_email, (0, 0))
+        changes = {"version": 1}
+        if total or completed:
+            changes.update(total=total, completed=completed)
+        try:
+            doc = await db.task_versions.find_one_and_update(
+                {"_id": user_email},
+                {"$inc": changes},
+                projection={"version": 1},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except Exception:
+            # Keep the counter changes for the next bump
+            self._count(user_email, total, completed)
+            raise
+        return doc["version"]
+
+
+class MongoUserRepository(UserRepository):
+
+    async def find_by_email(self, email):
+        db = await get_database()
+        return await db.users.find_one({"email": email})
+
+    async def find_summary(self, email):
+        db = await get_database()
+        return await db.users.find_one({"email": email}, USER_SUMMARY_PROJECTION)
+
+    async def insert(self, document):
+        db = await get_database()
+        try:
+            await db.users.insert_one(document)
+        except DuplicateKeyError as e:
+            raise DuplicateError(str(e))
+        return document
+
+    async def update_password(self, email, old_hash, new_hash):
+        db = await get_database()
+        result = await db.users.update_one({"email": email, "password": old_hash}, {"$set": {"password": new_hash}})
+        return bool(result.modified_count)
+
+
+class MongoStorageEngine(StorageEngine):
+    name = "mongo"
+
+    def __init__(self):
+        self.tasks = MongoTaskRepository()
+        self.users = MongoUserRepository()
+
+    async def connect(self):
+        start_connection_monitor()
+        await connect_to_mongo()
+
+    async def close(self):
+        await close_mongo_connection()
+
+    async def migrate(self):
+        await run_migrations(await get_database())
+
+    async def ping(self):
+        db = await get_database()
+        await db.command('ping')
+        return True
+
+    def stats(self):
+        return {"engine": self.name, "pool": get_pool_stats()}
+
+    async def watch_tasks(self, ready):
+        db = await get_database()
+        try:
+            async with db.watch(WATCH_PIPELINE, full_document="updateLookup") as stream:
+                ready()
+                async for event in _versioned_events(stream):
+                    yield event
+        except OperationFailure as e:
+            if e.code == CHANGE_STREAM_UNSUPPORTED:
+                raise NotImplementedError("change streams need a replica set")
+            raise
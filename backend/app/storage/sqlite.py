@@ -0,0 +1,549 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import lru_cache
+from typing import List, Optional, Tuple
+import asyncio
+import os
+import sqlite3
+from bson import ObjectId
+from app.storage.base import (
+    BulkOperation, BulkResult, DuplicateError, StorageEngine, TOMBSTONE_RETENTION,
+    TaskQuery, TaskRepository, UserRepository, truncate_millis, utcnow, with_modified_at
+)
+from app.utils.profiling import span
+from app.utils.search import PREFIX_END, search_terms
+
+SQLITE_PATH = os.getenv("SQLITE_PATH", "todo.db")
+
+# Fixed-width timestamps sort lexicographically in chronological order
+_DATE_FORMAT = "%Y-%m-%dT%H:%M:%S.%f"
+
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS tasks (
+        id TEXT PRIMARY KEY,
+        user_email TEXT NOT NULL,
+        text TEXT NOT NULL,
+        completed INTEGER NOT NULL,
+        created_at TEXT NOT NULL,
+        updated_at TEXT,
+        modified_at TEXT
+    )""",
+    "CREATE INDEX IF NOT EXISTS tasks_user_created ON tasks (user_email, created_at DESC, id DESC)",
+    "CREATE INDEX IF NOT EXISTS tasks_user_completed_created ON tasks (user_email, completed, created_at DESC, id DESC)",
+    "CREATE INDEX IF NOT EXISTS tasks_user_text ON tasks (user_email, text, id)",
+    """CREATE TABLE IF NOT EXISTS task_tombstones (
+        id TEXT PRIMARY KEY,
+        user_email TEXT NOT NULL,
+        deleted_at TEXT NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS task_tombstones_user_deleted ON task_tombstones (user_email, deleted_at, id)",
+    "CREATE INDEX IF NOT EXISTS task_tombstones_deleted ON task_tombstones (deleted_at)",
+    # Inverted index for search: a row per distinct word of each task
+    """CREATE TABLE IF NOT EXISTS task_terms (
+        user_email TEXT NOT NULL,
+        term TEXT NOT NULL,
+        task_id TEXT NOT NULL,
+        PRIMARY KEY (user_email, term, task_id)
+    ) WITHOUT ROWID""",
+    "CREATE INDEX IF NOT EXISTS task_terms_task ON task_terms (task_id, term)",
+    # Per-user counters, kept exact by triggers in the writing transaction
+    """CREATE TABLE IF NOT EXISTS task_stats (
+        user_email TEXT PRIMARY KEY,
+        total INTEGER NOT NULL,
+        completed INTEGER NOT NULL
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS task_stats_insert AFTER INSERT ON tasks BEGIN
+        INSERT INTO task_stats (user_email, total, completed) VALUES (NEW.user_email, 1, NEW.completed)
+        ON CONFLICT (user_email) DO UPDATE SET total = total + 1, completed = completed + excluded.completed;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS task_stats_delete AFTER DELETE ON tasks BEGIN
+        UPDATE task_stats SET total = total - 1, completed = completed - OLD.completed WHERE user_email = OLD.user_email;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS task_stats_update AFTER UPDATE OF completed ON tasks
+    WHEN NEW.completed != OLD.completed BEGIN
+        UPDATE task_stats SET completed = completed + NEW.completed - OLD.completed WHERE user_email = NEW.user_email;
+    END""",
+    """CREATE TABLE IF NOT EXISTS task_versions (
+        user_email TEXT PRIMARY KEY,
+        version INTEGER NOT NULL
+    )""",
+    """CREATE TABLE IF NOT EXISTS users (
+        id TEXT PRIMARY KEY,
+        email TEXT NOT NULL UNIQUE,
+        password TEXT NOT NULL,
+        created_at TEXT NOT NULL
+    )""",
+]
+
+# Run after SCHEMA; they depend on columns that older databases gain in _upgrade
+SCHEMA_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS tasks_user_modified ON tasks (user_email, modified_at, id)",
+]
+
+# Statements are constants so sqlite3's statement cache reuses the
+# prepared form on every call
+TASK_COLUMNS = "id, user_email, text, completed, created_at, updated_at, modified_at"
+INSERT_TASK = f"INSERT INTO tasks ({TASK_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?)"
+SELECT_TASK = f"SELECT {TASK_COLUMNS} FROM tasks WHERE id = ? AND user_email = ?"
+SELECT_PAGE = f"SELECT {TASK_COLUMNS} FROM tasks WHERE user_email = ? ORDER BY created_at DESC, id DESC LIMIT ?"
+SELECT_PAGE_AFTER = (
+    f"SELECT {TASK_COLUMNS} FROM tasks WHERE user_email = ? AND (created_at < ? OR (created_at = ? AND id < ?)) "
+    "ORDER BY created_at DESC, id DESC LIMIT ?"
+)
+SELECT_CHANGES = f"SELECT {TASK_COLUMNS} FROM tasks WHERE user_email = ? ORDER BY modified_at, id LIMIT ?"
+SELECT_CHANGES_AFTER = (
+    f"SELECT {TASK_COLUMNS} FROM tasks WHERE user_email = ? AND (modified_at > ? OR (modified_at = ? AND id > ?)) "
+    "ORDER BY modified_at, id LIMIT ?"
+)
+TOGGLE_TASK = (
+    "UPDATE tasks SET completed = 1 - completed, updated_at = ?1, modified_at = ?1 "
+    "WHERE id = ?2 AND user_email = ?3"
+)
+DELETE_TASK = "DELETE FROM tasks WHERE id = ? AND user_email = ?"
+DELETE_COMPLETED = "DELETE FROM tasks WHERE user_email = ? AND completed = 1 RETURNING id"
+INSERT_TOMBSTONE = "INSERT OR REPLACE INTO task_tombstones (id, user_email, deleted_at) VALUES (?, ?, ?)"
+PURGE_TOMBSTONES = "DELETE FROM task_tombstones WHERE deleted_at < ?"
+SELECT_TOMBSTONES = "SELECT id, deleted_at FROM task_tombstones WHERE user_email = ? ORDER BY deleted_at, id LIMIT ?"
+SELECT_TOMBSTONES_AFTER = (
+    "SELECT id, deleted_at FROM task_tombstones WHERE user_email = ? "
+    "AND (deleted_at > ? OR (deleted_at = ? AND id > ?)) ORDER BY deleted_at, id LIMIT ?"
+)
+INSERT_TERM = "INSERT OR IGNORE INTO task_terms (user_email, term, task_id) VALUES (?, ?, ?)"
+DELETE_TERMS = "DELETE FROM task_terms WHERE task_id = ?"
+SELECT_STATS = "SELECT total, completed FROM task_stats WHERE user_email = ?"
+SELECT_ALL_STATS = "SELECT user_email, total, completed FROM task_stats"
+COUNT_STATS = "SELECT user_email, COUNT(*), SUM(completed) FROM tasks GROUP BY user_email"
+SET_STATS = "INSERT OR REPLACE INTO task_stats (user_email, total, completed) VALUES (?, ?, ?)"
+SELECT_VERSION = "SELECT version FROM task_versions WHERE user_email = ?"
+BUMP_VERSION = (
+    "INSERT INTO task_versions (user_email, version) VALUES (?, 1) "
+    "ON CONFLICT (user_email) DO UPDATE SET version = version + 1 RETURNING version"
+)
+INSERT_USER = "INSERT INTO users (id, email, password, created_at) VALUES (?, ?, ?, ?)"
+SELECT_USER = "SELECT id, email, password, created_at FROM users WHERE email = ?"
+UPDATE_PASSWORD = "UPDATE users SET password = ? WHERE email = ? AND password = ?"
+SELECT_USER_SUMMARY = "SELECT id, email, created_at FROM users WHERE email = ?"
+# Updatable task columns; update() only builds statements from these
+TASK_UPDATE_COLUMNS = ("text", "completed", "updated_at", "modified_at")
+
+def _to_text(value: Optional[datetime]) -> Optional[str]:
+    return truncate_millis(value).strftime(_DATE_FORMAT) if value is not None else None
+
+def _from_text(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value is not None else None
+
+def _task_row(document: dict) -> tuple:
+    with_modified_at(document)
+    return (
+        str(document["_id"]),
+        document["user_email"],
+        document["text"],
+        int(document["completed"]),
+        _to_text(document["created_at"]),
+        _to_text(document.get("updated_at")),
+        _to_text(document["modified_at"]),
+    )
+
+def _task_document(row: tuple) -> dict:
+    return {
+        "_id": ObjectId(row[0]),
+        "user_email": row[1],
+        "text": row[2],
+        "completed": bool(row[3]),
+        "created_at": _from_text(row[4]),
+        "updated_at": _from_text(row[5]),
+        "modified_at": _from_text(row[6]),
+    }
+
+@lru_cache(maxsize=16)
+def _search_statement(term_count: int) -> str:
+    """Tasks with a term in the first term's prefix range that also have one
+    in each other range; the scan stops at LIMIT"""
+    others = " AND ".join(
+        ["EXISTS (SELECT 1 FROM task_terms o WHERE o.task_id = tasks.id AND o.term >= ? AND o.term < ?)"]
+        * (term_count - 1)
+    )
+    return (
+        f"SELECT DISTINCT {', '.join(f'tasks.{column}' for column in TASK_COLUMNS.split(', '))} "
+        "FROM task_terms m JOIN tasks ON tasks.id = m.task_id "
+        "WHERE m.user_email = ? AND m.term >= ? AND m.term < ?"
+        + (f" AND {others}" if others else "")
+        + " LIMIT ?"
+    )
+
+@lru_cache(maxsize=128)
+def _page_statement(sort_field: str, descending: bool, completed: bool, bounds: Tuple[Tuple[str, bool, bool], ...], after: bool) -> str:
+    """SELECT for list_page with a query; the text only depends on which
+    conditions are present, so each shape is built and prepared once"""
+    conditions = ["user_email = ?"]
+    if completed:
+        conditions.append("completed = ?")
+    for column, lower, upper in bounds:
+        if lower:
+            conditions.append(f"{column} > ?")
+        if upper:
+            conditions.append(f"{column} < ?")
+    operator = "<" if descending else ">"
+    if after:
+        conditions.append(f"({sort_field} {operator} ? OR ({sort_field} = ? AND id {operator} ?))")
+    order = " DESC" if descending else ""
+    return (
+        f"SELECT {TASK_COLUMNS} FROM tasks WHERE {' AND '.join(conditions)} "
+        f"ORDER BY {sort_field}{order}, id{order} LIMIT ?"
+    )
+
+def _page_query(user_email: str, limit: int, after, query: TaskQuery) -> Tuple[str, tuple]:
+    params = [user_email]
+    if query.completed is not None:
+        params.append(int(query.completed))
+    bounds = query.date_bounds()
+    for _, lower, upper in bounds:
+        params.extend(_to_text(value) for value in (lower, upper) if value is not None)
+    if after is not None:
+        value = after[0] if isinstance(after[0], str) else _to_text(after[0])
+        params.extend((value, value, str(after[1])))
+    params.append(limit)
+    statement = _page_statement(
+        query.sort_field, query.descending, query.completed is not None,
+        tuple((column, lower is not None, upper is not None) for column, lower, upper in bounds),
+        after is not None
+    )
+    return statement, tuple(params)
+
+def _index_terms(connection: sqlite3.Connection, user_email: str, task_id: str, text: str):
+    connection.executemany(INSERT_TERM, [(user_email, term, task_id) for term in search_terms(text)])
+
+def _insert_task(connection: sqlite3.Connection, document: dict):
+    row = _task_row(document)
+    connection.execute(INSERT_TASK, row)
+    _index_terms(connection, row[1], row[0], row[2])
+
+def _upgrade(connection: sqlite3.Connection):
+    """Bring databases created by older versions up to the current schema"""
+    columns = {row[1] for row in connection.execute("PRAGMA table_info(tasks)")}
+    if "modified_at" not in columns:
+        connection.execute("ALTER TABLE tasks ADD COLUMN modified_at TEXT")
+        connection.execute("UPDATE tasks SET modified_at = COALESCE(updated_at, created_at)")
+    # user_version counts data upgrades; new files start at 0 with no tasks
+    if connection.execute("PRAGMA user_version").fetchone()[0] < 1:
+        def index_existing():
+            for task_id, user_email, text in connection.execute("SELECT id, user_email, text FROM tasks").fetchall():
+                _index_terms(connection, user_email, task_id, text)
+        _transaction(connection, index_existing)
+        connection.execute("PRAGMA user_version = 1")
+    if connection.execute("PRAGMA user_version").fetchone()[0] < 2:
+        # Counters for tasks written before the triggers existed
+        _transaction(connection, lambda: _reconcile_stats(connection))
+        connection.execute("PRAGMA user_version = 2")
+
+def _reconcile_stats(connection: sqlite3.Connection) -> int:
+    """Recount every user's tasks and fix counters that differ; callers hold
+    a write transaction, so no write can interleave"""
+    actual = {row[0]: (row[1], row[2]) for row in connection.execute(COUNT_STATS)}
+    stored = {row[0]: (row[1], row[2]) for row in connection.execute(SELECT_ALL_STATS)}
+    drifted = [
+        user_email for user_email in actual.keys() | stored.keys()
+        if actual.get(user_email, (0, 0)) != stored.get(user_email, (0, 0))
+    ]
+    connection.executemany(SET_STATS, [(user_email, *actual.get(user_email, (0, 0))) for user_email in drifted])
+    return len(drifted)
+
+def _delete_with_tombstone(connection: sqlite3.Connection, user_email: str, task_id: str, deleted_at: str) -> int:
+    deleted = connection.execute(DELETE_TASK, (task_id, user_email)).rowcount
+    if deleted:
+        connection.execute(DELETE_TERMS, (task_id,))
+        connection.execute(INSERT_TOMBSTONE, (task_id, user_email, deleted_at))
+    return deleted
+
+def _purge_tombstones(connection: sqlite3.Connection):
+    # Indexed range delete; usually finds nothing
+    connection.execute(PURGE_TOMBSTONES, (_to_text(utcnow() - TOMBSTONE_RETENTION),))
+
+
+class SQLiteConnection:
+    """One connection used from a single worker thread, so the event loop
+    never blocks on disk and writes are serialized"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+        self._connection: Optional[sqlite3.Connection] = None
+
+    def _open(self):
+        connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, cached_statements=256)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        for statement in SCHEMA:
+            connection.execute(statement)
+        _upgrade(connection)
+        for statement in SCHEMA_INDEXES:
+            connection.execute(statement)
+        self._connection = connection
+
+    async def run(self, func, *args):
+        def call():
+            if self._connection is None:
+                self._open()
+            return func(self._connection, *args)
+        with span("sqlite"):
+            return await asyncio.get_running_loop().run_in_executor(self._executor, call)
+
+    async def close(self):
+        def close_connection():
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+        # Runs after the queries already queued; awaited so shutdown does
+        # not block the event loop on them
+        await asyncio.wrap_future(self._executor.submit(close_connection))
+        self._executor.shutdown(wait=False)
+
+
+def _transaction(connection: sqlite3.Connection, func):
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        result = func()
+    except BaseException:
+        connection.execute("ROLLBACK")
+        raise
+    connection.execute("COMMIT")
+    return result
+
+
+class SQLiteTaskRepository(TaskRepository):
+
+    def __init__(self, connection: SQLiteConnection):
+        self._db = connection
+
+    async def insert(self, document):
+        document.setdefault("_id", ObjectId())
+        await self._db.run(lambda c: _transaction(c, lambda: _insert_task(c, document)))
+        return document
+
+    async def insert_many(self, documents):
+        for document in documents:
+            document.setdefault("_id", ObjectId())
+        def insert_all(connection):
+            for document in documents:
+                _insert_task(connection, document)
+        await self._db.run(lambda c: _transaction(c, lambda: insert_all(c)))
+        return len(documents)
+
+    async def list_page(self, user_email, limit, after=None, query=None):
+        # SQLite treats a negative LIMIT as "no limit"
+        limit = -1 if limit is None else limit
+        # Every column is read either way; only Mongo applies query.fields
+        if query is not None:
+            statement, params = _page_query(user_email, limit, after, query)
+        elif after is None:
+            statement, params = SELECT_PAGE, (user_email, limit)
+        else:
+            created_at = _to_text(after[0])
+            statement, params = SELECT_PAGE_AFTER, (user_email, created_at, created_at, str(after[1]), limit)
+        rows = await self._db.run(lambda c: c.execute(statement, params).fetchall())
+        return [_task_document(row) for row in rows]
+
+    async def iterate(self, user_email, batch_size):
+        after = None
+        while True:
+            page = await self.list_page(user_email, batch_size, after)
+            for task in page:
+                yield task
+            if len(page) < batch_size:
+                return
+            after = (page[-1]["created_at"], page[-1]["_id"])
+
+    async def get(self, user_email, task_id):
+        row = await self._db.run(lambda c: c.execute(SELECT_TASK, (str(task_id), user_email)).fetchone())
+        return _task_document(row) if row else None
+
+    async def existing_ids(self, user_email, task_ids):
+        ids = [str(task_id) for task_id in task_ids]
+        if not ids:
+            return set()
+        query = f"SELECT id FROM tasks WHERE user_email = ? AND id IN ({', '.join('?' * len(ids))})"
+        rows = await self._db.run(lambda c: c.execute(query, (user_email, *ids)).fetchall())
+        return {ObjectId(row[0]) for row in rows}
+
+    @staticmethod
+    def _update(connection, user_email, task_id, fields):
+        if "updated_at" in fields:
+            fields = {**fields, "modified_at": fields["updated_at"]}
+        columns = [name for name in TASK_UPDATE_COLUMNS if name in fields]
+        values = [
+            _to_text(fields[name]) if name.endswith("_at") else int(fields[name]) if name == "completed" else fields[name]
+            for name in columns
+        ]
+        assignments = ", ".join(f"{name} = ?" for name in columns)
+        cursor = connection.execute(
+            f"UPDATE tasks SET {assignments} WHERE id = ? AND user_email = ?",
+            (*values, str(task_id), user_email)
+        )
+        if cursor.rowcount and "text" in fields:
+            connection.execute(DELETE_TERMS, (str(task_id),))
+            _index_terms(connection, user_email, str(task_id), fields["text"])
+        return cursor.rowcount
+
+    async def update(self, user_email, task_id, fields):
+        def update(connection):
+            return _transaction(connection, lambda: (
+                self._update(connection, user_email, task_id, fields)
+                and connection.execute(SELECT_TASK, (str(task_id), user_email)).fetchone()
+            ))
+        row = await self._db.run(update)
+        return _task_document(row) if row else None
+
+    async def toggle(self, user_email, task_id, updated_at):
+        def toggle(connection):
+            return _transaction(connection, lambda: (
+                connection.execute(TOGGLE_TASK, (_to_text(updated_at), str(task_id), user_email)).rowcount
+                and connection.execute(SELECT_TASK, (str(task_id), user_email)).fetchone()
+            ))
+        row = await self._db.run(toggle)
+        return _task_document(row) if row else None
+
+    async def delete(self, user_email, task_id):
+        def delete(connection):
+            deleted = _delete_with_tombstone(connection, user_email, str(task_id), _to_text(utcnow()))
+            if deleted:
+                _purge_tombstones(connection)
+            return deleted
+        rowcount = await self._db.run(lambda c: _transaction(c, lambda: delete(c)))
+        return rowcount > 0
+
+    async def delete_completed(self, user_email):
+        def delete_completed(connection):
+            task_ids = [row[0] for row in connection.execute(DELETE_COMPLETED, (user_email,)).fetchall()]
+            connection.executemany(DELETE_TERMS, [(task_id,) for task_id in task_ids])
+            deleted_at = _to_text(utcnow())
+            connection.executemany(INSERT_TOMBSTONE, [(task_id, user_email, deleted_at) for task_id in task_ids])
+            _purge_tombstones(connection)
+            return len(task_ids)
+        return await self._db.run(lambda c: _transaction(c, lambda: delete_completed(c)))
+
+    async def bulk_write(self, user_email, operations: List[BulkOperation], ordered):
+        def apply(connection):
+            result = BulkResult()
+            now = _to_text(utcnow())
+            for position, op in enumerate(operations):
+                try:
+                    if op.kind == "insert":
+                        op.document.setdefault("_id", ObjectId())
+                        _insert_task(connection, op.document)
+                        result.inserted += 1
+                    elif op.kind == "delete":
+                        result.deleted += _delete_with_tombstone(connection, user_email, str(op.task_id), now)
+                    elif op.kind == "toggle":
+                        result.matched += connection.execute(
+                            TOGGLE_TASK, (_to_text(op.updated_at), str(op.task_id), user_email)
+                        ).rowcount
+                    else:
+                        result.matched += self._update(connection, user_email, op.task_id, op.fields)
+                except sqlite3.IntegrityError as e:
+                    result.errors[position] = str(e)
+                    if ordered:
+                        break
+            return result
+        return await self._db.run(lambda c: _transaction(c, lambda: apply(c)))
+
+    async def search(self, user_email, terms, limit):
+        # Drive the scan from the longest term, likely the most selective
+        terms = sorted(terms, key=len, reverse=True)
+        params = [user_email, terms[0], terms[0] + PREFIX_END]
+        for term in terms[1:]:
+            params.extend((term, term + PREFIX_END))
+        params.append(limit)
+        statement = _search_statement(len(terms))
+        rows = await self._db.run(lambda c: c.execute(statement, params).fetchall())
+        return [_task_document(row) for row in rows]
+
+    async def changes(self, user_email, after, limit):
+        if after is None:
+            query, params = SELECT_CHANGES, (user_email, limit)
+        else:
+            modified_at = _to_text(after[0])
+            query, params = SELECT_CHANGES_AFTER, (user_email, modified_at, modified_at, str(after[1]), limit)
+        rows = await self._db.run(lambda c: c.execute(query, params).fetchall())
+        return [_task_document(row) for row in rows]
+
+    async def tombstones(self, user_email, after, limit):
+        if after is None:
+            query, params = SELECT_TOMBSTONES, (user_email, limit)
+        else:
+            deleted_at = _to_text(after[0])
+            query, params = SELECT_TOMBSTONES_AFTER, (user_email, deleted_at, deleted_at, str(after[1]), limit)
+        rows = await self._db.run(lambda c: c.execute(query, params).fetchall())
+        return [
+            {"_id": ObjectId(row[0]), "user_email": user_email, "deleted_at": _from_text(row[1])}
+            for row in rows
+        ]
+
+    async def stats(self, user_email):
+        row = await self._db.run(lambda c: c.execute(SELECT_STATS, (user_email,)).fetchone())
+        return {"total": row[0], "completed": row[1]} if row else {"total": 0, "completed": 0}
+
+    async def reconcile_stats(self):
+        return await self._db.run(lambda c: _transaction(c, lambda: _reconcile_stats(c)))
+
+    async def get_version(self, user_email):
+        row = await self._db.run(lambda c: c.execute(SELECT_VERSION, (user_email,)).fetchone())
+        return row[0] if row else 0
+
+    async def bump_version(self, user_email):
+        row = await self._db.run(lambda c: c.execute(BUMP_VERSION, (user_email,)).fetchone())
+        return row[0]
+
+
+class SQLiteUserRepository(UserRepository):
+
+    def __init__(self, connection: SQLiteConnection):
+        self._db = connection
+
+    async def find_by_email(self, email):
+        row = await self._db.run(lambda c: c.execute(SELECT_USER, (email,)).fetchone())
+        if row is None:
+            return None
+        return {"_id": ObjectId(row[0]), "email": row[1], "password": row[2], "created_at": _from_text(row[3])}
+
+    async def find_summary(self, email):
+        row = await self._db.run(lambda c: c.execute(SELECT_USER_SUMMARY, (email,)).fetchone())
+        if row is None:
+            return None
+        return {"_id": ObjectId(row[0]), "email": row[1], "created_at": _from_text(row[2])}
+
+    async def insert(self, document):
+        document.setdefault("_id", ObjectId())
+        params = (str(document["_id"]), document["email"], document["password"], _to_text(document["created_at"]))
+        try:
+            await self._db.run(lambda c: c.execute(INSERT_USER, params))
+        except sqlite3.IntegrityError as e:
+            raise DuplicateError(str(e))
+        return document
+
+    async def update_password(self, email, old_hash, new_hash):
+        params = (new_hash, email, old_hash)
+        return await self._db.run(lambda c: c.execute(UPDATE_PASSWORD, params).rowcount) > 0
+
+
+class SQLiteStorageEngine(StorageEngine):
+    """Single-file storage for single-node deployments and CI benchmarks"""
+    name = "sqlite"
+
+    def __init__(self, path: Optional[str] = None):
+        self.connection = SQLiteConnection(path or SQLITE_PATH)
+        self.tasks = SQLiteTaskRepository(self.connection)
+        self.users = SQLiteUserRepository(self.connection)
+
+    async def connect(self):
+        # Opens the database and creates the schema
+        await self.connection.run(lambda c: None)
+
+    async def close(self):
+        await self.connection.close()
+
+    async def ping(self):
+        await self.connection.run(lambda c: c.execute("SELECT 1").fetchone())
+        return True
+
+    def stats(self):
+        return {"engine": self.name, "path": self.connection.path}
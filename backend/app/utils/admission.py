@@ -0,0 +1,148 @@
+"""Admission control for the bcrypt-bearing auth routes (login, register).
+
+Each attempt must find a token in two buckets, one for the client IP and
+one for the email, and a free slot under a process-wide cap on auth
+requests in flight. Anything else is shed at once with 429 and a
+Retry-After, before the users lookup or any hashing, so a burst of logins
+is confined to auth traffic and cannot take the CPU from the task routes.
+
+Buckets are kept per process in a bounded LRU, so with several workers the
+effective limits are multiplied by the worker count.
+"""
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Dict, Optional, Tuple
+import math
+import os
+import time
+from fastapi import HTTPException, Request, status
+
+# Set to "false" to admit every request (e.g. for load tests from one host)
+AUTH_RATE_LIMIT_ENABLED = os.getenv("AUTH_RATE_LIMIT_ENABLED", "true").lower() == "true"
+# Sustained attempts per minute and burst size, per client IP and per email
+AUTH_IP_RATE_PER_MINUTE = float(os.getenv("AUTH_IP_RATE_PER_MINUTE", 30))
+AUTH_IP_BURST = int(os.getenv("AUTH_IP_BURST", 10))
+AUTH_EMAIL_RATE_PER_MINUTE = float(os.getenv("AUTH_EMAIL_RATE_PER_MINUTE", 10))
+AUTH_EMAIL_BURST = int(os.getenv("AUTH_EMAIL_BURST", 5))
+# Login and register requests served at once by this process
+AUTH_MAX_CONCURRENT = int(os.getenv("AUTH_MAX_CONCURRENT", 8))
+# Buckets remembered per kind; the least recently used are dropped first
+AUTH_BUCKETS_MAX_KEYS = int(os.getenv("AUTH_BUCKETS_MAX_KEYS", 100000))
+# Take the client IP from the first X-Forwarded-For entry (behind a proxy)
+AUTH_TRUST_FORWARDED_FOR = os.getenv("AUTH_TRUST_FORWARDED_FOR", "false").lower() == "true"
+# Seconds a client shed by the concurrency cap is asked to wait
+CONCURRENCY_RETRY_AFTER_SECONDS = 1
+
+
+class TokenBuckets:
+    """Token buckets by key: up to `burst` tokens, refilled at `rate` per second"""
+
+    def __init__(self, rate_per_minute: float, burst: int, max_keys: int):
+        self.rate = rate_per_minute / 60
+        self.burst = burst
+        self.max_keys = max_keys
+        # key -> (tokens, time of last refill)
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    def _tokens(self, key: str, now: float) -> float:
+        entry = self._buckets.get(key)
+        if entry is None:
+            return float(self.burst)
+        tokens, updated = entry
+        return min(self.burst, tokens + (now - updated) * self.rate)
+
+    def wait_seconds(self, key: str, now: float) -> float:
+        """Seconds until the key has a token; 0 when it has one now"""
+        missing = 1 - self._tokens(key, now)
+        if missing <= 0:
+            return 0.0
+        return missing / self.rate if self.rate > 0 else float("inf")
+
+    def take(self, key: str, now: float):
+        self._buckets[key] = (self._tokens(key, now) - 1, now)
+        self._buckets.move_to_end(key)
+        # A dropped key comes back with a full bucket, the state it reaches
+        # anyway after burst / rate seconds of inactivity
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class AuthAdmission:
+
+    def __init__(self, enabled: bool, ip_buckets: TokenBuckets, email_buckets: TokenBuckets, max_concurrent: int):
+        self.enabled = enabled
+        self.ip_buckets = ip_buckets
+        self.email_buckets = email_buckets
+        self.max_concurrent = max_concurrent
+        self.in_flight = 0
+        self.admitted = 0
+        self.rejected: Dict[str, int] = {"ip": 0, "email": 0, "concurrency": 0}
+
+    def _reject(self, reason: str, retry_after: float):
+        self.rejected[reason] += 1
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many authentication attempts, please retry later",
+            headers={"Retry-After": str(max(1, math.ceil(min(retry_after, 3600))))},
+        )
+
+    def check(self, client_ip: str, email: str):
+        """Take a token from both buckets and a slot, or raise 429.
+
+        Tokens are only taken when the request is admitted, so a client
+        shed by one limit is not charged by the others.
+        """
+        email = email.lower()
+        now = time.monotonic()
+        wait = self.ip_buckets.wait_seconds(client_ip, now)
+        if wait:
+            self._reject("ip", wait)
+        wait = self.email_buckets.wait_seconds(email, now)
+        if wait:
+            self._reject("email", wait)
+        if self.in_flight >= self.max_concurrent:
+            self._reject("concurrency", CONCURRENCY_RETRY_AFTER_SECONDS)
+        self.ip_buckets.take(client_ip, now)
+        self.email_buckets.take(email, now)
+        self.in_flight += 1
+        self.admitted += 1
+
+    @asynccontextmanager
+    async def admit(self, request: Request, email: str):
+        """Hold an admission for the duration of one login or register"""
+        if not self.enabled:
+            yield
+            return
+        self.check(client_ip(request), email)
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "in_flight": self.in_flight,
+            "max_concurrent": self.max_concurrent,
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+            "tracked_ips": len(self.ip_buckets),
+            "tracked_emails": len(self.email_buckets),
+        }
+
+def client_ip(request: Request) -> str:
+    if AUTH_TRUST_FORWARDED_FOR:
+        forwarded: Optional[str] = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+auth_admission = AuthAdmission(
+    AUTH_RATE_LIMIT_ENABLED,
+    TokenBuckets(AUTH_IP_RATE_PER_MINUTE, AUTH_IP_BURST, AUTH_BUCKETS_MAX_KEYS),
+    TokenBuckets(AUTH_EMAIL_RATE_PER_MINUTE, AUTH_EMAIL_BURST, AUTH_BUCKETS_MAX_KEYS),
+    AUTH_MAX_CONCURRENT,
+)
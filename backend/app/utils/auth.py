@@ -1,29 +1,263 @@
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from functools import lru_cache
+from typing import Optional, Tuple
+import asyncio
+import hashlib
+import threading
+import time
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import HTTPException, status
+from app.utils import metrics
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# bcrypt cost (log2 rounds). PASSWORD_HASH_ROUNDS pins it, e.g. to the
+# value `python -m app.utils.auth calibrate` prints; with
+# PASSWORD_HASH_CALIBRATE=true the startup calibration instead picks the
+# highest cost whose hash takes at most PASSWORD_HASH_TARGET_MS on this
+# machine, within the bounds below. The floor is a security minimum and
+# wins over the latency target.
+PASSWORD_HASH_ROUNDS = os.getenv("PASSWORD_HASH_ROUNDS")
+PASSWORD_HASH_TARGET_MS = float(os.getenv("PASSWORD_HASH_TARGET_MS", 250))
+PASSWORD_HASH_MIN_ROUNDS = int(os.getenv("PASSWORD_HASH_MIN_ROUNDS", 10))
+PASSWORD_HASH_MAX_ROUNDS = int(os.getenv("PASSWORD_HASH_MAX_ROUNDS", 15))
+# Calibrate at every startup; off by default, since a cold start would pay
+# for it and instances timing differently would disagree on the cost
+PASSWORD_HASH_CALIBRATE = os.getenv("PASSWORD_HASH_CALIBRATE", "false").lower() == "true"
+# Set to "true" to keep stored hashes stronger than the policy instead of
+# rehashing them down to it at login
+PASSWORD_HASH_KEEP_STRONGER = os.getenv("PASSWORD_HASH_KEEP_STRONGER", "false").lower() == "true"
+# passlib's default, used when the cost is neither pinned nor calibrated
+DEFAULT_ROUNDS = 12
+# Stored hashes this many rounds above the policy are rehashed down at
+# login; any below it are rehashed up. The slack keeps instances whose
+# costs differ by one round from rehashing each other's hashes; pin the
+# cost to keep them from differing by more.
+REHASH_ROUNDS_ABOVE = 1
+# Timed hashes per calibration at the floor cost; the fastest one counts
+CALIBRATION_SAMPLES = 3
+
+@lru_cache(maxsize=None)
+def _password_context(rounds: int) -> CryptContext:
+    """Context hashing at `rounds`, whose needs_update flags hashes outside the policy"""
+    bounds = {} if PASSWORD_HASH_KEEP_STRONGER else {"bcrypt__max_rounds": rounds + REHASH_ROUNDS_ABOVE}
+    return CryptContext(
+        schemes=["bcrypt"], deprecated="auto",
+        bcrypt__default_rounds=rounds,
+        bcrypt__min_rounds=rounds,
+        **bounds,
+    )
+
+# A pinned cost is held to the floor as well
+INITIAL_ROUNDS = max(int(PASSWORD_HASH_ROUNDS) if PASSWORD_HASH_ROUNDS else DEFAULT_ROUNDS, PASSWORD_HASH_MIN_ROUNDS)
+
+# Password hashing under the current policy
+pwd_context = _password_context(INITIAL_ROUNDS)
 
 # JWT settings
 SECRET_KEY = os.getenv("SECRET_KEY", "your_super_secret_key_here_change_this_in_production")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
 REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", 7))
+# Seconds a stream token may be used to open /api/tasks/stream
+STREAM_TOKEN_EXPIRE_SECONDS = int(os.getenv("STREAM_TOKEN_EXPIRE_SECONDS", 60))
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a plain password against its hash"""
     return pwd_context.verify(plain_password, hashed_password)
 
-def get_password_hash(password: str) -> str:
-    """Hash a password"""
-    return pwd_context.hash(password)
+def get_password_hash(password: str, rounds: Optional[int] = None) -> str:
+    """Hash a password, at the policy's cost unless rounds is given"""
+    return (_password_context(rounds) if rounds else pwd_context).hash(password)
+
+def verify_and_update_password(plain_password: str, hashed_password: str, rounds: int) -> Tuple[bool, Optional[str]]:
+    """Verify a password; when it matches a hash outside the policy for
+    `rounds`, also return a new hash at that cost"""
+    return _password_context(rounds).verify_and_update(plain_password, hashed_password)
+
+def measure_hash_cost(rounds: int) -> float:
+    """Seconds one bcrypt hash at `rounds` takes on this machine"""
+    started = time.perf_counter()
+    _password_context(rounds).hash("calibration-password")
+    return time.perf_counter() - started
+
+def hash_rounds(hashed_password: str) -> Optional[int]:
+    """Cost of a bcrypt hash ($2b$12$...), None for anything else"""
+    parts = hashed_password.split("$")
+    return int(parts[2]) if len(parts) > 3 and parts[2].isdigit() else None
+
+# Password hashing runs in a bounded pool so bcrypt never blocks the event
+# loop. "thread" works because bcrypt releases the GIL; "process" isolates
+# the CPU cost from the API process entirely.
+PASSWORD_HASH_EXECUTOR = os.getenv("PASSWORD_HASH_EXECUTOR", "thread")
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", 2))
+# Hash jobs allowed to wait for a worker before new ones are rejected
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", 16))
+PASSWORD_HASH_RETRY_AFTER_SECONDS = int(os.getenv("PASSWORD_HASH_RETRY_AFTER_SECONDS", 1))
+
+def _timed_call(func, *args):
+    """Run func in a worker and report when it started and finished"""
+    started = time.time()
+    result = func(*args)
+    return result, started, time.time()
+
+class PasswordHashPool:
+    """Bounded executor for bcrypt work with fast-fail on saturation"""
+
+    def __init__(self, kind: str, workers: int, max_queue: int):
+        self.kind = kind
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor: Optional[Executor] = None
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.queue_wait_seconds = 0.0
+        self.queue_wait_max_seconds = 0.0
+        self.hash_seconds = 0.0
+        self.hash_max_seconds = 0.0
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hash")
+        return self._executor
+
+    async def run(self, func, *args):
+        with self._lock:
+            if self.pending >= self.workers + self.max_queue:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Server is busy, please retry shortly",
+                    headers={"Retry-After": str(PASSWORD_HASH_RETRY_AFTER_SECONDS)},
+                )
+            self.pending += 1
+        submitted = time.time()
+        try:
+            loop = asyncio.get_running_loop()
+            result, started, finished = await loop.run_in_executor(self._get_executor(), _timed_call, func, *args)
+        finally:
+            with self._lock:
+                self.pending -= 1
+        with self._lock:
+            wait, work = max(started - submitted, 0.0), finished - started
+            self.completed += 1
+            self.queue_wait_seconds += wait
+            self.queue_wait_max_seconds = max(self.queue_wait_max_seconds, wait)
+            self.hash_seconds += work
+            self.hash_max_seconds = max(self.hash_max_seconds, work)
+        metrics.password_hash_duration.observe(work, (func.__name__,))
+        metrics.password_hash_queue_wait.observe(wait)
+        return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            completed = self.completed or 1
+            return {
+                "executor": self.kind,
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "pending": self.pending,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "queue_wait_avg_ms": self.queue_wait_seconds / completed * 1000,
+                "queue_wait_max_ms": self.queue_wait_max_seconds * 1000,
+                "hash_avg_ms": self.hash_seconds / completed * 1000,
+                "hash_max_ms": self.hash_max_seconds * 1000,
+            }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+password_hash_pool = PasswordHashPool(PASSWORD_HASH_EXECUTOR, PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_QUEUE)
+
+class PasswordHashPolicy:
+    """The bcrypt cost new hashes get, and how it was chosen"""
+
+    def __init__(self, rounds: int, source: str):
+        self.rounds = rounds
+        self.source = source
+        self.cost_seconds: Optional[float] = None
+        self.calibrated_at: Optional[float] = None
+        self.rehashed = 0
+        # Logins verified, by the cost of the stored hash
+        self.verified_by_rounds: dict = {}
+
+    def set_rounds(self, rounds: int, source: str):
+        global pwd_context
+        self.rounds = rounds
+        self.source = source
+        pwd_context = _password_context(rounds)
+
+    async def calibrate(self, target_seconds: float = PASSWORD_HASH_TARGET_MS / 1000,
+                        min_rounds: int = PASSWORD_HASH_MIN_ROUNDS, max_rounds: int = PASSWORD_HASH_MAX_ROUNDS) -> int:
+        """Pick the highest cost within the bounds whose hash meets the target.
+
+        Timed in the hashing pool, so it measures the workers that will do
+        the hashing. Each round doubles the cost, so one measurement at the
+        floor predicts the rest; the chosen cost is then measured once.
+        """
+        floor_cost = min([await password_hash_pool.run(measure_hash_cost, min_rounds) for _ in range(CALIBRATION_SAMPLES)])
+        rounds, predicted = min_rounds, floor_cost
+        while rounds < max_rounds and predicted * 2 <= target_seconds:
+            rounds += 1
+            predicted *= 2
+        self.cost_seconds = floor_cost if rounds == min_rounds else await password_hash_pool.run(measure_hash_cost, rounds)
+        self.calibrated_at = time.time()
+        self.set_rounds(rounds, "calibrated")
+        return rounds
+
+    def record_login(self, stored_rounds: Optional[int], rehashed: bool):
+        self.verified_by_rounds[stored_rounds] = self.verified_by_rounds.get(stored_rounds, 0) + 1
+        self.rehashed += int(rehashed)
+
+    def stats(self) -> dict:
+        return {
+            "rounds": self.rounds,
+            "source": self.source,
+            "cost_ms": self.cost_seconds * 1000 if self.cost_seconds is not None else None,
+            "calibrated_at": self.calibrated_at,
+            "rehashed": self.rehashed,
+            "verified_by_rounds": {str(rounds): count for rounds, count in self.verified_by_rounds.items()},
+        }
+
+password_policy = PasswordHashPolicy(INITIAL_ROUNDS, "configured" if PASSWORD_HASH_ROUNDS else "default")
+
+async def configure_password_hashing():
+    """Calibrate the bcrypt cost at startup when enabled and not pinned"""
+    if PASSWORD_HASH_ROUNDS or not PASSWORD_HASH_CALIBRATE:
+        return
+    rounds = await password_policy.calibrate()
+    print(f"bcrypt cost calibrated to {rounds} rounds ({password_policy.cost_seconds * 1000:.0f} ms per hash)")
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password in the hashing pool without blocking the event loop"""
+    return await password_hash_pool.run(verify_password, plain_password, hashed_password)
+
+async def verify_and_update_password_async(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Verify a password in the hashing pool; also returns a new hash when
+    the stored one's cost is outside the current policy"""
+    verified, new_hash = await password_hash_pool.run(
+        verify_and_update_password, plain_password, hashed_password, password_policy.rounds
+    )
+    if verified:
+        password_policy.record_login(hash_rounds(hashed_password), new_hash is not None)
+    return verified, new_hash
+
+async def get_password_hash_async(password: str) -> str:
+    """Hash a password in the hashing pool without blocking the event loop"""
+    return await password_hash_pool.run(get_password_hash, password, password_policy.rounds)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create a JWT access token"""
@@ -51,6 +285,37 @@ def create_refresh_token(data: dict):
     except Exception as e:
         raise Exception(f"Refresh token creation failed: {str(e)}")
 
+def create_stream_token(email: str, session_expires_at: Optional[float]) -> str:
+    """Create a short-lived JWT that only opens the task event stream.
+
+    It goes in the EventSource URL, which ends up in logs and history, so
+    it expires within STREAM_TOKEN_EXPIRE_SECONDS and grants nothing else.
+    The stream it opens still ends when the access token it was issued
+    for expires.
+    """
+    expire = datetime.utcnow() + timedelta(seconds=STREAM_TOKEN_EXPIRE_SECONDS)
+    return jwt.encode(
+        {"sub": email, "type": "stream", "exp": expire, "session_exp": session_expires_at},
+        SECRET_KEY, algorithm=ALGORITHM
+    )
+
+def verify_stream_token(token: str) -> dict:
+    """Verify a stream token; returns the email and the session's expiry"""
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        email: str = payload.get("sub")
+        if email is None or payload.get("type") != "stream":
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid stream token",
+            )
+        return {"email": email, "exp": payload.get("session_exp")}
+    except JWTError:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid stream token",
+        )
+
 def verify_refresh_token(token: str) -> dict:
     """Verify and decode a JWT refresh token"""
     try:
@@ -72,21 +337,114 @@ def verify_refresh_token(token: str) -> dict:
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+# Verified access tokens, so repeated requests with the same token skip
+# jwt.decode. 0 disables the cache.
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", 10000))
+
+class TokenCache:
+    """Bounded LRU of verified token claims keyed by a digest of the token.
+
+    Entries expire at the token's exp claim and the whole cache is dropped
+    when the signing key or algorithm changes.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: "OrderedDict[bytes, tuple]" = OrderedDict()
+        self._key_fingerprint = None
+        self.hits = 0
+        self.misses = 0
+
+    def _check_key(self):
+        fingerprint = (SECRET_KEY, ALGORITHM)
+        if fingerprint != self._key_fingerprint:
+            self._entries.clear()
+            self._key_fingerprint = fingerprint
+
+    def get(self, token: str) -> Optional[dict]:
+        if self.max_size <= 0:
+            return None
+        self._check_key()
+        digest = hashlib.sha256(token.encode()).digest()
+        entry = self._entries.get(digest)
+        if entry is None:
+            self.misses += 1
+            return None
+        claims, expires_at = entry
+        if expires_at <= time.time():
+            del self._entries[digest]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(digest)
+        self.hits += 1
+        return claims
+
+    def put(self, token: str, claims: dict, expires_at: Optional[float]):
+        if self.max_size <= 0 or expires_at is None:
+            return
+        self._check_key()
+        digest = hashlib.sha256(token.encode()).digest()
+        self._entries[digest] = (claims, float(expires_at))
+        self._entries.move_to_end(digest)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+token_cache = TokenCache(TOKEN_CACHE_SIZE)
+
 def verify_token(token: str) -> dict:
     """Verify and decode a JWT token"""
+    cached = token_cache.get(token)
+    if cached is not None:
+        return cached
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
-        if email is None:
+        # Stream tokens travel in URLs and must not work as access tokens
+        if email is None or payload.get("type") == "stream":
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Could not validate credentials",
                 headers={"WWW-Authenticate": "Bearer"},
             )
-        return {"email": email}
+        claims = {"email": email, "exp": payload.get("exp")}
+        token_cache.put(token, claims, payload.get("exp"))
+        return claims
     except JWTError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
+
+
+async def _calibrate_main(target_ms: float, min_rounds: int, max_rounds: int):
+    try:
+        rounds = await password_policy.calibrate(target_ms / 1000, min_rounds, max_rounds)
+    finally:
+        password_hash_pool.shutdown()
+    print(f"{password_policy.cost_seconds * 1000:.0f} ms per hash at {rounds} rounds (target {target_ms:.0f} ms)")
+    print(f"PASSWORD_HASH_ROUNDS={rounds}")
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Calibrate the bcrypt cost for this machine")
+    parser.add_argument("command", choices=["calibrate"])
+    parser.add_argument("--target-ms", type=float, default=PASSWORD_HASH_TARGET_MS)
+    parser.add_argument("--min-rounds", type=int, default=PASSWORD_HASH_MIN_ROUNDS)
+    parser.add_argument("--max-rounds", type=int, default=PASSWORD_HASH_MAX_ROUNDS)
+    args = parser.parse_args()
+    asyncio.run(_calibrate_main(args.target_ms, args.min_rounds, args.max_rounds))
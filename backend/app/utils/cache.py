@@ -0,0 +1,169 @@
+from collections import OrderedDict
+from typing import Dict, Optional, Set, Tuple
+import os
+import time
+
+# Task list read cache settings. "memory" keeps entries in this process;
+# "none" disables caching. With several workers each one has its own memory
+# cache; task lists are keyed by the user's version in storage, so a write on
+# another worker makes them unreachable at once and they age out by the TTL.
+TASK_CACHE_BACKEND = os.getenv("TASK_CACHE_BACKEND", "memory")
+TASK_CACHE_MAX_BYTES = int(os.getenv("TASK_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+TASK_CACHE_TTL_SECONDS = float(os.getenv("TASK_CACHE_TTL_SECONDS", 60))
+# Users whose last invalidation the memory backend remembers; a read that
+# started before the oldest one forgotten is not cached
+INVALIDATION_LOG_SIZE = 10000
+
+
+class CacheBackend:
+    """Interface for per-user caches of serialized responses.
+
+    Every write for a user bumps that user's generation. Readers take the
+    generation before querying the database and pass it to set(), which
+    drops the value if a write happened in between, so a slow read can
+    never store a list that predates a write.
+    """
+
+    async def get(self, user_email: str, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    async def set(self, user_email: str, key: str, value: bytes, generation: int):
+        raise NotImplementedError
+
+    async def generation(self, user_email: str) -> int:
+        raise NotImplementedError
+
+    async def invalidate(self, user_email: str):
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        raise NotImplementedError
+
+
+class NullCacheBackend(CacheBackend):
+    """Backend used when caching is disabled"""
+
+    async def get(self, user_email, key):
+        return None
+
+    async def set(self, user_email, key, value, generation):
+        pass
+
+    async def generation(self, user_email):
+        return 0
+
+    async def invalidate(self, user_email):
+        pass
+
+    def stats(self):
+        return {"backend": "none"}
+
+
+class MemoryCacheBackend(CacheBackend):
+    """In-process LRU bounded by total bytes, with a TTL per entry.
+
+    Generations come from one counter for all users. Each user's last
+    invalidation is logged at its counter value in a bounded log, so a
+    value read at generation g is stale if its user was invalidated after
+    g, or if g predates invalidations dropped from the log.
+    """
+
+    def __init__(self, max_bytes: int, ttl_seconds: float, log_size: int = INVALIDATION_LOG_SIZE):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[bytes, float]]" = OrderedDict()
+        self._user_keys: Dict[str, Set[str]] = {}
+        self.log_size = log_size
+        self._generation = 0
+        # user_email -> generation of their last invalidation, oldest first
+        self._invalidated: "OrderedDict[str, int]" = OrderedDict()
+        # Newest generation dropped from the log
+        self._forgotten = 0
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _remove(self, entry_key: Tuple[str, str]):
+        value, _ = self._entries.pop(entry_key)
+        self.bytes -= len(value)
+        user_keys = self._user_keys.get(entry_key[0])
+        if user_keys is not None:
+            user_keys.discard(entry_key[1])
+            if not user_keys:
+                del self._user_keys[entry_key[0]]
+
+    async def get(self, user_email, key):
+        entry_key = (user_email, key)
+        entry = self._entries.get(entry_key)
+        if entry is None:
+            self.misses += 1
+            return None
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            self._remove(entry_key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(entry_key)
+        self.hits += 1
+        return value
+
+    async def set(self, user_email, key, value, generation):
+        if generation < self._forgotten or self._invalidated.get(user_email, 0) > generation or len(value) > self.max_bytes:
+            return
+        entry_key = (user_email, key)
+        if entry_key in self._entries:
+            self._remove(entry_key)
+        self._entries[entry_key] = (value, time.monotonic() + self.ttl_seconds)
+        self._user_keys.setdefault(user_email, set()).add(key)
+        self.bytes += len(value)
+        while self.bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    async def generation(self, user_email):
+        return self._generation
+
+    async def invalidate(self, user_email):
+        self._generation += 1
+        self._invalidated[user_email] = self._generation
+        self._invalidated.move_to_end(user_email)
+        while len(self._invalidated) > self.log_size:
+            self._forgotten = self._invalidated.popitem(last=False)[1]
+        for key in list(self._user_keys.get(user_email, ())):
+            self._remove((user_email, key))
+        self.invalidations += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "backend": "memory",
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "invalidation_log": len(self._invalidated),
+        }
+
+
+def _create_backend(name: str) -> CacheBackend:
+    if name == "memory":
+        return MemoryCacheBackend(TASK_CACHE_MAX_BYTES, TASK_CACHE_TTL_SECONDS)
+    if name == "none":
+        return NullCacheBackend()
+    raise ValueError(f"Unknown TASK_CACHE_BACKEND '{name}', expected 'memory' or 'none'")
+
+task_cache: CacheBackend = _create_backend(TASK_CACHE_BACKEND)
+
+def configure_task_cache(backend: CacheBackend):
+    """Replace the task list cache backend (e.g. with a shared one)"""
+    global task_cache
+    task_cache = backend
+
+def get_task_cache() -> CacheBackend:
+    return task_cache
@@ -0,0 +1,28 @@
+import hashlib
+from typing import Optional
+from fastapi.responses import Response
+
+# Responses differ per user under the same URL, so shared caches must key
+# on the token, and browsers must revalidate before reusing them
+CACHE_HEADERS = {"Cache-Control": "private, no-cache", "Vary": "Authorization"}
+
+def make_etag(user_email: str, version: int, *parts) -> str:
+    """Strong ETag for a response derived from the user's task list version.
+
+    parts identify the resource and query (e.g. limit and cursor); they and
+    the user are hashed so tags from different users or queries never match.
+    """
+    key = "\0".join([user_email, *("" if part is None else str(part) for part in parts)])
+    return f'"{version}-{hashlib.sha256(key.encode()).hexdigest()[:16]}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header matches etag (weak comparison)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (candidate.strip() for candidate in if_none_match.split(","))
+    return etag in (candidate[2:] if candidate.startswith("W/") else candidate for candidate in candidates)
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, **CACHE_HEADERS})
@@ -1,9 +1,13 @@
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
 from pymongo.errors import ConnectionFailure
+import asyncio
 import os
+import threading
 from dotenv import load_dotenv
 import logging
 from urllib.parse import quote_plus
+from app.utils import metrics, profiling
 
 load_dotenv()
 
@@ -11,29 +15,221 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Connection pool profiles. Serverless instances handle one request at a time
+# and are frozen between invocations, so they keep a tiny pool; long-running
+# workers serve many concurrent requests and keep warm connections around.
+POOL_PROFILES = {
+    "serverless": {"maxPoolSize": 4, "minPoolSize": 0, "maxIdleTimeMS": 60000},
+    "server": {"maxPoolSize": 50, "minPoolSize": 2, "maxIdleTimeMS": 300000},
+}
+
+# Seconds between background liveness checks (long-running profile only)
+HEALTH_CHECK_INTERVAL_SECONDS = float(os.getenv("MONGODB_HEALTH_CHECK_INTERVAL", 30))
+
+
+class PoolStats(monitoring.ConnectionPoolListener):
+    """Connection pool counters fed by pymongo's pool monitoring events.
+
+    Events are published from the driver's threads, so counters are guarded
+    by a lock rather than relying on the event loop.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.created = 0
+        self.closed = 0
+        self.in_use = 0
+        self.waiting = 0
+        self.checkout_failures = 0
+        self.pool_clears = 0
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "in_use": self.in_use,
+                "waiting": self.waiting,
+                "created": self.created,
+                "closed": self.closed,
+                "open": self.created - self.closed,
+                "checkout_failures": self.checkout_failures,
+                "pool_clears": self.pool_clears,
+            }
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self.pool_clears += 1
+        # The driver clears a pool after a network error; verify the
+        # connection on the next get_database call instead of every call.
+        database.needs_check = True
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        with self._lock:
+            self.created += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.closed += 1
+
+    def connection_check_out_started(self, event):
+        with self._lock:
+            self.waiting += 1
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.waiting -= 1
+            self.checkout_failures += 1
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            self.waiting -= 1
+            self.in_use += 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.in_use -= 1
+
+
+class CommandStats(monitoring.CommandListener):
+    """Feeds MongoDB command round trips into the metrics registry and the
+    current request's profiling trace.
+
+    Success and failure events do not carry the command document, so the
+    collection seen at start is kept per request until the command ends.
+    Motor runs commands with the caller's context, so the profiling trace
+    is visible here even though events fire on driver threads.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._collections = {}
+
+    def started(self, event):
+        command = event.command
+        collection = command.get("collection") if event.command_name == "getMore" else command.get(event.command_name)
+        collection = collection if isinstance(collection, str) else ""
+        trace = profiling.current_trace()
+        shape = profiling.filter_shape(command.get("filter", command.get("q"))) if trace is not None else None
+        with self._lock:
+            self._collections[(event.connection_id, event.request_id)] = (collection, trace, shape)
+
+    def _finished(self, event, documents=None) -> tuple:
+        with self._lock:
+            collection, trace, shape = self._collections.pop((event.connection_id, event.request_id), ("", None, None))
+        labels = (collection, event.command_name)
+        metrics.db_command_duration.observe(event.duration_micros / 1e6, labels)
+        if trace is not None:
+            trace.add_command(event.command_name, collection, shape, documents, event.duration_micros / 1e6)
+        return labels
+
+    def succeeded(self, event):
+        documents = None
+        if profiling.current_trace() is not None:
+            reply = event.reply
+            cursor = reply.get("cursor")
+            if cursor is not None:
+                documents = len(cursor.get("firstBatch", cursor.get("nextBatch", ())))
+            elif "n" in reply:
+                documents = reply["n"]
+            elif "value" in reply:
+                documents = 0 if reply["value"] is None else 1
+        self._finished(event, documents)
+
+    def failed(self, event):
+        metrics.db_command_failures.inc(labels=self._finished(event))
+
+
 class Database:
     client: AsyncIOMotorClient = None
     database = None
+    # Set when an error suggests the connection may be dead
+    needs_check: bool = False
+    reconnect_lock: asyncio.Lock = None
+    monitor_task: asyncio.Task = None
+    pool_stats: PoolStats = PoolStats()
+    command_stats: CommandStats = CommandStats()
 
 database = Database()
 
+def get_pool_profile() -> str:
+    """Resolve the pool profile from configuration"""
+    profile = os.getenv("MONGODB_POOL_PROFILE")
+    if not profile:
+        # Vercel sets VERCEL=1 in its function runtime
+        profile = "serverless" if os.getenv("VERCEL") else "server"
+    profile = profile.lower()
+    if profile not in POOL_PROFILES:
+        raise ValueError(f"Unknown MONGODB_POOL_PROFILE '{profile}', expected one of {sorted(POOL_PROFILES)}")
+    return profile
+
+def get_pool_options() -> dict:
+    """Pool options for the configured profile, with per-option overrides"""
+    options = dict(POOL_PROFILES[get_pool_profile()])
+    if os.getenv("MONGODB_MAX_POOL_SIZE"):
+        options["maxPoolSize"] = int(os.getenv("MONGODB_MAX_POOL_SIZE"))
+    if os.getenv("MONGODB_MIN_POOL_SIZE"):
+        options["minPoolSize"] = int(os.getenv("MONGODB_MIN_POOL_SIZE"))
+    return options
+
+def get_pool_stats() -> dict:
+    """Current connection pool counters"""
+    stats = database.pool_stats.snapshot()
+    stats["profile"] = get_pool_profile()
+    stats["max_pool_size"] = get_pool_options()["maxPoolSize"]
+    return stats
+
+def _get_reconnect_lock() -> asyncio.Lock:
+    # Created lazily so it binds to the running event loop
+    if database.reconnect_lock is None:
+        database.reconnect_lock = asyncio.Lock()
+    return database.reconnect_lock
+
 async def get_database():
-    """Get database connection, ensuring it's established"""
-    try:
+    """Get database connection, ensuring it's established.
+
+    The connection is not pinged on every call; it is only verified after
+    the driver reported an error or the background monitor flagged it.
+    """
+    with profiling.span("get_database"):
         if database.database is None or database.client is None:
-            await connect_to_mongo()
-        
-        # Test the connection to ensure it's still alive
-        if database.client:
-            await database.client.admin.command('ping')
-        
-        return database.database
+            await reconnect(None)
+        elif database.needs_check:
+            await check_connection()
+    return database.database
+
+async def check_connection():
+    """Ping the current client and reconnect if it is unreachable"""
+    client = database.client
+    try:
+        await client.admin.command('ping')
+        database.needs_check = False
     except Exception as e:
-        logger.error(f"Error in get_database: {e}")
-        # Try to reconnect
+        logger.error(f"MongoDB liveness check failed: {e}")
+        await reconnect(client)
+
+async def reconnect(failed_client):
+    """Replace failed_client with a new connection.
+
+    Callers pass the client they saw fail. The first caller to acquire the
+    lock reconnects; the rest find a different client already installed and
+    return, so a burst of failures opens one new client, not one per request.
+    """
+    async with _get_reconnect_lock():
+        if database.client is not failed_client and database.database is not None:
+            return
         try:
             await connect_to_mongo()
-            return database.database
         except Exception as reconnect_error:
             logger.error(f"Failed to reconnect: {reconnect_error}")
             raise
@@ -44,50 +240,64 @@ async def connect_to_mongo():
         # Close existing connection if any
         if database.client:
             database.client.close()
-            
+            database.client = None
+            database.database = None
+
         # Get MongoDB configuration from environment variables
         mongo_uri = os.getenv("MONGODB_URI")
         username = os.getenv("MONGODB_USERNAME")
         password = os.getenv("MONGODB_PASSWORD")
-        
+
         logger.info(f"Connecting with URI pattern: {mongo_uri[:20] if mongo_uri else 'None'}...")
         logger.info(f"Username: {username}")
         logger.info(f"Password configured: {'Yes' if password else 'No'}")
-        
+
         if not mongo_uri:
             raise ValueError("MONGODB_URI environment variable is not set")
         if not username:
             raise ValueError("MONGODB_USERNAME environment variable is not set")
         if not password or password == "your_mongodb_password_here":
             raise ValueError("MONGODB_PASSWORD environment variable is not set or contains placeholder value. Please set your actual MongoDB password.")
-        
+
         # URL encode the credentials to handle special characters
         encoded_username = quote_plus(username)
         encoded_password = quote_plus(password)
-        
+
         # Replace placeholders with actual encoded credentials
         mongo_uri = mongo_uri.replace("<username>", encoded_username)
         mongo_uri = mongo_uri.replace("<password>", encoded_password)
-        
-        logger.info("Attempting to connect to MongoDB...")
-        database.client = AsyncIOMotorClient(
-            mongo_uri, 
+
+        event_listeners = [database.pool_stats]
+        if metrics.METRICS_ENABLED:
+            event_listeners.append(database.command_stats)
+
+        pool_options = get_pool_options()
+        logger.info(f"Attempting to connect to MongoDB (pool profile: {get_pool_profile()}, {pool_options})...")
+        client = AsyncIOMotorClient(
+            mongo_uri,
             serverSelectionTimeoutMS=5000,
             connectTimeoutMS=5000,
             socketTimeoutMS=5000,
-            maxPoolSize=1,  # Limit pool size for serverless
-            retryWrites=True
+            retryWrites=True,
+            event_listeners=event_listeners,
+            **pool_options
         )
-        
+
         # Test the connection
-        await database.client.admin.command('ping')
-        
+        try:
+            await client.admin.command('ping')
+        except Exception:
+            client.close()
+            raise
+
         # Get database name from environment or use default
         db_name = os.getenv("DATABASE_NAME", "todo_app")
-        database.database = database.client[db_name]
-        
+        database.client = client
+        database.database = client[db_name]
+        database.needs_check = False
+
         logger.info("Connected to MongoDB successfully")
-        
+
     except ConnectionFailure as e:
         logger.error(f"Failed to connect to MongoDB: {e}")
         raise
@@ -98,8 +308,32 @@ async def connect_to_mongo():
         logger.error(f"Unexpected error connecting to MongoDB: {e}")
         raise
 
+async def _monitor_connection():
+    """Background liveness check for long-running workers"""
+    while True:
+        await asyncio.sleep(HEALTH_CHECK_INTERVAL_SECONDS)
+        if database.client is None:
+            continue
+        try:
+            await check_connection()
+        except Exception as e:
+            # Keep monitoring; requests will retry the reconnect themselves
+            logger.error(f"Background MongoDB check failed: {e}")
+
+def start_connection_monitor():
+    """Start the background liveness check if the pool profile wants one"""
+    if get_pool_profile() != "server" or HEALTH_CHECK_INTERVAL_SECONDS <= 0:
+        return
+    if database.monitor_task is None or database.monitor_task.done():
+        database.monitor_task = asyncio.create_task(_monitor_connection())
+
 async def close_mongo_connection():
     """Close database connection"""
+    if database.monitor_task is not None:
+        database.monitor_task.cancel()
+        database.monitor_task = None
     if database.client:
         database.client.close()
+        database.client = None
+        database.database = None
         logger.info("Disconnected from MongoDB")
@@ -1,24 +1,50 @@
-from fastapi import Depends, HTTPException, status
+from typing import Optional
+from fastapi import Depends, HTTPException, Query, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from app.utils.auth import verify_token
-from app.utils.database import get_database
+from app.utils.auth import verify_stream_token, verify_token
+from app.utils.profiling import span
+from app.storage.engine import get_storage
 from app.models.user import User
 
 # Security scheme
 security = HTTPBearer()
+# Same scheme without its automatic 403, for routes with another fallback
+optional_security = HTTPBearer(auto_error=False)
 
-async def get_current_user(
+async def get_current_claims(
     credentials: HTTPAuthorizationCredentials = Depends(security)
-) -> str:
-    """Get current authenticated user"""
+) -> dict:
+    """Claims of the caller's access token"""
     token = credentials.credentials
-    token_data = verify_token(token)
-    return token_data["email"]
+    with span("jwt"):
+        return verify_token(token)
+
+async def get_current_user(claims: dict = Depends(get_current_claims)) -> str:
+    """Get current authenticated user"""
+    return claims["email"]
+
+async def get_stream_token_claims(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security),
+    stream_token: Optional[str] = Query(None)
+) -> dict:
+    """Claims from the Authorization header, or from the stream_token query
+    parameter (EventSource cannot set headers). Access tokens are never
+    taken from the query string; get a stream token from POST
+    /api/tasks/stream/token instead."""
+    with span("jwt"):
+        if credentials:
+            return verify_token(credentials.credentials)
+        if stream_token:
+            return verify_stream_token(stream_token)
+    raise HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Not authenticated",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
 
 async def get_user_by_email(email: str) -> User:
     """Get user from database by email"""
-    db = await get_database()
-    user_doc = await db.users.find_one({"email": email})
+    user_doc = await get_storage().users.find_by_email(email)
     if not user_doc:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
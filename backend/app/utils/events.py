@@ -0,0 +1,221 @@
+"""In-process pub/sub of task changes for the /api/tasks/stream endpoint.
+
+TaskController publishes an event after every write. Each open stream is a
+Subscription holding a bounded queue of encoded server-sent event frames.
+Publishing never waits: when a subscriber's queue is full its backlog is
+dropped for a single "resync" event, so a slow client holds at most
+TASK_STREAM_QUEUE_SIZE frames and never delays writers or other clients.
+One heartbeat task pings every idle stream, so an idle connection costs a
+suspended coroutine and no timer of its own.
+
+The bus only sees writes made by this process. With several workers on a
+MongoDB replica set, set TASK_STREAM_CHANGE_STREAMS=true: events then come
+from a change stream, which sees every worker's writes, instead of from the
+local publishers.
+"""
+from typing import AsyncIterator, Dict, Optional, Set
+import asyncio
+import logging
+import os
+import time
+from fastapi import HTTPException, status
+from app.utils.serialization import dumps, task_document_to_dict
+
+logger = logging.getLogger(__name__)
+
+# Frames buffered per connection before its backlog is replaced by "resync"
+TASK_STREAM_QUEUE_SIZE = int(os.getenv("TASK_STREAM_QUEUE_SIZE", 100))
+# Seconds between comments sent on idle streams to keep proxies from closing them
+TASK_STREAM_HEARTBEAT_SECONDS = float(os.getenv("TASK_STREAM_HEARTBEAT_SECONDS", 15))
+# Open streams allowed per process and per user
+TASK_STREAM_MAX_CONNECTIONS = int(os.getenv("TASK_STREAM_MAX_CONNECTIONS", 5000))
+TASK_STREAM_MAX_PER_USER = int(os.getenv("TASK_STREAM_MAX_PER_USER", 10))
+# Follow the storage engine's change feed (MongoDB replica sets only)
+TASK_STREAM_CHANGE_STREAMS = os.getenv("TASK_STREAM_CHANGE_STREAMS", "false").lower() == "true"
+# Seconds before reopening a change stream that failed
+CHANGE_STREAM_RETRY_SECONDS = 5
+# Milliseconds EventSource waits before reconnecting
+RECONNECT_MS = 3000
+
+HEARTBEAT_FRAME = b": ping\n\n"
+OPEN_FRAME = f"retry: {RECONNECT_MS}\n: connected\n\n".encode()
+RESYNC_FRAME = b"event: resync\ndata: {}\n\n"
+EXPIRED_FRAME = b"event: expired\ndata: {}\n\n"
+
+
+def encode_event(event_type: str, document: Optional[dict] = None, version: Optional[int] = None) -> bytes:
+    """One server-sent event frame; the version, when known, is the event id"""
+    if event_type == "deleted":
+        data = {"id": str(document["_id"])}
+    elif document is not None:
+        data = {"task": task_document_to_dict(document)}
+    else:
+        data = {}
+    header = b""
+    if version is not None:
+        data["version"] = version
+        header = f"id: {version}\n".encode()
+    return header + f"event: {event_type}\ndata: ".encode() + dumps(data) + b"\n\n"
+
+
+class Subscription:
+    """One open stream: a bounded queue of frames for one user"""
+    __slots__ = ("user_email", "queue", "resyncs")
+
+    def __init__(self, user_email: str, size: int):
+        self.user_email = user_email
+        self.queue: asyncio.Queue = asyncio.Queue(size)
+        self.resyncs = 0
+
+    def offer(self, frame: bytes):
+        try:
+            self.queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            # The client is not keeping up; drop what it has not read and let
+            # it catch up through /changes instead
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC_FRAME)
+            self.resyncs += 1
+
+
+class TaskEventBus:
+
+    def __init__(self, queue_size: int, max_connections: int, max_per_user: int, heartbeat_seconds: float):
+        self.queue_size = queue_size
+        self.max_connections = max_connections
+        self.max_per_user = max_per_user
+        self.heartbeat_seconds = heartbeat_seconds
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+        self.connections = 0
+        self.published = 0
+        self.resyncs = 0
+        self.rejected = 0
+        # True while a change stream delivers the events
+        self.feed_active = False
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        self._feed_task: Optional[asyncio.Task] = None
+
+    def admit(self, user_email: str):
+        """Raise 503 if another stream would exceed the connection limits"""
+        if self.connections >= self.max_connections or len(self._subscribers.get(user_email, ())) >= self.max_per_user:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many open task streams",
+                headers={"Retry-After": str(RECONNECT_MS // 1000)},
+            )
+
+    def subscribe(self, user_email: str) -> Subscription:
+        subscription = Subscription(user_email, self.queue_size)
+        self._subscribers.setdefault(user_email, set()).add(subscription)
+        self.connections += 1
+        if self._heartbeat_task is None or self._heartbeat_task.done():
+            self._heartbeat_task = asyncio.create_task(self._heartbeat())
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscribers = self._subscribers.get(subscription.user_email)
+        if subscribers is None or subscription not in subscribers:
+            return
+        subscribers.discard(subscription)
+        if not subscribers:
+            del self._subscribers[subscription.user_email]
+        self.connections -= 1
+        self.resyncs += subscription.resyncs
+
+    def _deliver(self, user_email: str, frame: bytes):
+        for subscription in self._subscribers.get(user_email, ()):
+            subscription.offer(frame)
+        self.published += 1
+
+    def publish(self, user_email: str, event_type: str, version: int, document: Optional[dict] = None):
+        """Push a write made by this process to the user's open streams"""
+        if self.feed_active or user_email not in self._subscribers:
+            # Nobody listening here, or the change stream will deliver it
+            return
+        self._deliver(user_email, encode_event(event_type, document, version))
+
+    def resync_all(self):
+        """Tell every stream it may have missed events"""
+        for subscribers in self._subscribers.values():
+            for subscription in subscribers:
+                subscription.offer(RESYNC_FRAME)
+
+    async def stream(self, user_email: str, expires_at: Optional[float] = None, resync: bool = False) -> AsyncIterator[bytes]:
+        """Frames for one connection, until the client leaves or its token expires"""
+        subscription = self.subscribe(user_email)
+        try:
+            yield OPEN_FRAME
+            if resync:
+                yield RESYNC_FRAME
+            while True:
+                frame = await subscription.queue.get()
+                # Heartbeats make sure this is checked on idle streams too
+                if expires_at is not None and time.time() >= expires_at:
+                    yield EXPIRED_FRAME
+                    return
+                yield frame
+        finally:
+            self.unsubscribe(subscription)
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(self.heartbeat_seconds)
+            for subscribers in list(self._subscribers.values()):
+                for subscription in subscribers:
+                    if subscription.queue.empty():
+                        subscription.offer(HEARTBEAT_FRAME)
+
+    def _feed_opened(self):
+        self.feed_active = True
+        logger.info("Streaming task events from the change stream")
+
+    async def _follow(self, storage):
+        """Republish the storage engine's change feed until cancelled"""
+        while True:
+            try:
+                async for user_email, event_type, document, version in storage.watch_tasks(self._feed_opened):
+                    if user_email in self._subscribers:
+                        self._deliver(user_email, encode_event(event_type, document, version))
+            except NotImplementedError as e:
+                logger.warning(f"No change feed on {storage.name} storage ({e}); streaming this process's writes only")
+                return
+            except Exception as e:
+                logger.error(f"Task change stream failed: {e}")
+            finally:
+                if self.feed_active:
+                    # Writes from here on are published locally until the stream
+                    # reopens; anything in between is only visible through /changes
+                    self.feed_active = False
+                    self.resync_all()
+            await asyncio.sleep(CHANGE_STREAM_RETRY_SECONDS)
+
+    def start(self, storage):
+        """Start following the change feed, if configured"""
+        if TASK_STREAM_CHANGE_STREAMS and (self._feed_task is None or self._feed_task.done()):
+            self._feed_task = asyncio.create_task(self._follow(storage))
+
+    async def close(self):
+        for task in (self._feed_task, self._heartbeat_task):
+            if task is not None:
+                task.cancel()
+        self._feed_task = None
+        self._heartbeat_task = None
+        self.feed_active = False
+
+    def stats(self) -> dict:
+        return {
+            "connections": self.connections,
+            "users": len(self._subscribers),
+            "published": self.published,
+            "resyncs": self.resyncs + sum(
+                subscription.resyncs for subscribers in self._subscribers.values() for subscription in subscribers
+            ),
+            "rejected": self.rejected,
+            "change_stream": self.feed_active,
+        }
+
+task_events = TaskEventBus(
+    TASK_STREAM_QUEUE_SIZE, TASK_STREAM_MAX_CONNECTIONS, TASK_STREAM_MAX_PER_USER, TASK_STREAM_HEARTBEAT_SECONDS
+)
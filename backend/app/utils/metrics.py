@@ -0,0 +1,295 @@
+"""Prometheus metrics kept in process and rendered in the text format.
+
+Request latency is recorded by MetricsMiddleware, MongoDB commands by
+CommandStats in app.utils.database and password hashing by the hashing
+pool. Values that other components already count (cache hits, pool sizes)
+are copied in by collect_runtime_metrics() when /metrics is scraped.
+"""
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Tuple
+import hmac
+import os
+import threading
+import time
+
+# Set to "false" to skip the middleware, command listener and /metrics
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+# /metrics requires "Authorization: Bearer <METRICS_TOKEN>". Without a token
+# it is closed, unless METRICS_PUBLIC is set (defaults to on with DEBUG=true)
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+METRICS_PUBLIC = os.getenv("METRICS_PUBLIC", os.getenv("DEBUG", "False")).lower() == "true"
+
+# Starlette appends "; charset=utf-8" to text media types
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PASSWORD_HASH_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """A metric family with fixed label names.
+
+    Updates come from the event loop and from driver and hashing threads,
+    so every change takes the family's lock.
+    """
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, labels: Tuple[str, ...] = ()):
+        with self._lock:
+            self._values[labels] = value
+
+    def inc(self, amount: float = 1, labels: Tuple[str, ...] = ()):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+            for labels, value in values
+        ]
+
+
+class Counter(Metric):
+    type = "counter"
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def dec(self, amount: float = 1, labels: Tuple[str, ...] = ()):
+        self.inc(-amount, labels)
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+        self._histograms: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, labels: Tuple[str, ...] = ()):
+        # Bucket bounds are inclusive ("le"), hence bisect_left
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            histogram = self._histograms.get(labels)
+            if histogram is None:
+                histogram = self._histograms[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            histogram[0][index] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            histograms = [(labels, list(counts), total, count) for labels, (counts, total, count) in self._histograms.items()]
+        lines = []
+        for labels, counts, total, count in histograms:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Metric families plus collectors run before each render"""
+
+    def __init__(self):
+        self.metrics: List[Metric] = []
+        self.collectors: List[Callable[[], None]] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        for collector in self.collectors:
+            collector()
+        lines = []
+        for metric in self.metrics:
+            samples = metric.samples()
+            if not samples:
+                continue
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+registry = MetricsRegistry()
+
+http_requests_in_flight = registry.register(Gauge(
+    "http_requests_in_flight", "HTTP requests currently being served"))
+http_request_duration = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template and status",
+    ("method", "route", "status")))
+db_command_duration = registry.register(Histogram(
+    "mongodb_command_duration_seconds", "MongoDB command round trips by collection and command",
+    ("collection", "command")))
+db_command_failures = registry.register(Counter(
+    "mongodb_command_failures_total", "MongoDB commands that returned an error",
+    ("collection", "command")))
+db_pool_connections = registry.register(Gauge(
+    "mongodb_pool_connections", "MongoDB pool connections by state", ("state",)))
+password_hash_duration = registry.register(Histogram(
+    "password_hash_duration_seconds", "Time spent in bcrypt by operation", ("operation",),
+    buckets=PASSWORD_HASH_BUCKETS))
+password_hash_queue_wait = registry.register(Histogram(
+    "password_hash_queue_wait_seconds", "Time bcrypt jobs waited for a hashing worker",
+    buckets=LATENCY_BUCKETS))
+password_hash_rejected = registry.register(Counter(
+    "password_hash_rejected_total", "Hashing jobs rejected because the pool was saturated"))
+password_hash_rounds = registry.register(Gauge(
+    "password_hash_rounds", "bcrypt cost (log2 rounds) given to new hashes"))
+password_hash_calibrated_cost = registry.register(Gauge(
+    "password_hash_calibrated_cost_seconds", "Time one hash at the chosen cost took during calibration"))
+password_verifications = registry.register(Counter(
+    "password_verifications_total", "Successful logins by the bcrypt cost of the stored hash", ("rounds",)))
+password_rehashed = registry.register(Counter(
+    "password_rehashed_total", "Stored hashes replaced at login because their cost was outside the policy"))
+cache_hits = registry.register(Counter("cache_hits_total", "Cache hits", ("cache",)))
+cache_misses = registry.register(Counter("cache_misses_total", "Cache misses", ("cache",)))
+cache_hit_ratio = registry.register(Gauge("cache_hit_ratio", "Cache hits / lookups since start", ("cache",)))
+cache_entries = registry.register(Gauge("cache_entries", "Entries currently cached", ("cache",)))
+task_stream_connections = registry.register(Gauge(
+    "task_stream_connections", "Open /api/tasks/stream connections"))
+task_stream_resyncs = registry.register(Counter(
+    "task_stream_resyncs_total", "Stream backlogs dropped because the client fell behind"))
+task_stream_rejected = registry.register(Counter(
+    "task_stream_rejected_total", "Streams refused by the connection limits"))
+auth_admission_in_flight = registry.register(Gauge(
+    "auth_admission_in_flight", "Login and register requests being served"))
+auth_admission_admitted = registry.register(Counter(
+    "auth_admission_admitted_total", "Login and register requests admitted"))
+auth_admission_rejected = registry.register(Counter(
+    "auth_admission_rejected_total", "Login and register requests shed with 429, by limit", ("limit",)))
+task_stats_repaired = registry.register(Counter(
+    "task_stats_repaired_total", "Per-user task counters repaired by reconciliation"))
+task_stats_reconcile_failures = registry.register(Counter(
+    "task_stats_reconcile_failures_total", "Task counter reconciliation runs that failed"))
+
+def collect_runtime_metrics():
+    """Copy counters kept by other components into the registry"""
+    # Imported here: those modules import this one to record observations
+    from app.storage.engine import get_storage
+    from app.utils import auth
+    from app.utils.admission import auth_admission
+    from app.utils.cache import get_task_cache
+    from app.utils.events import task_events
+    from app.utils.reconcile import stats_reconciler
+    from app.utils.user_directory import user_directory
+
+    caches = (
+        ("task_list", get_task_cache().stats()),
+        ("token", auth.token_cache.stats()),
+        ("user_directory", user_directory.stats()),
+    )
+    for cache, stats in caches:
+        if "hits" not in stats:
+            continue
+        cache_hits.set(stats["hits"], (cache,))
+        cache_misses.set(stats["misses"], (cache,))
+        cache_hit_ratio.set(stats["hit_ratio"], (cache,))
+        cache_entries.set(stats.get("entries", stats.get("size", 0)), (cache,))
+
+    password_hash_rejected.set(auth.password_hash_pool.stats()["rejected"])
+
+    policy = auth.password_policy
+    password_hash_rounds.set(policy.rounds)
+    if policy.cost_seconds is not None:
+        password_hash_calibrated_cost.set(policy.cost_seconds)
+    password_rehashed.set(policy.rehashed)
+    for rounds, count in list(policy.verified_by_rounds.items()):
+        password_verifications.set(count, (str(rounds),))
+
+    admission = auth_admission.stats()
+    auth_admission_in_flight.set(admission["in_flight"])
+    auth_admission_admitted.set(admission["admitted"])
+    for limit, rejected in admission["rejected"].items():
+        auth_admission_rejected.set(rejected, (limit,))
+
+    stream = task_events.stats()
+    task_stream_connections.set(stream["connections"])
+    task_stream_resyncs.set(stream["resyncs"])
+    task_stream_rejected.set(stream["rejected"])
+
+    reconcile = stats_reconciler.stats()
+    task_stats_repaired.set(reconcile["repaired"])
+    task_stats_reconcile_failures.set(reconcile["failures"])
+
+    pool = get_storage().stats().get("pool")
+    if pool:
+        for state in ("in_use", "waiting", "open"):
+            db_pool_connections.set(pool[state], (state,))
+
+registry.collectors.append(collect_runtime_metrics)
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency per route template and status.
+
+    Routes are labelled with their template (/api/tasks/{task_id}) so label
+    cardinality stays bounded; requests that match no route share one label.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        http_requests_in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            http_requests_in_flight.dec()
+            route = scope.get("route")
+            template = getattr(route, "path", None) or "unmatched"
+            http_request_duration.observe(
+                time.perf_counter() - started, (scope["method"], template, str(status_code))
+            )
+
+def authorized(authorization: Optional[str]) -> bool:
+    """Check the Authorization header against METRICS_TOKEN; with no token
+    configured only public (development) deployments are open"""
+    if not METRICS_TOKEN:
+        return METRICS_PUBLIC
+    return hmac.compare_digest(authorization or "", f"Bearer {METRICS_TOKEN}")
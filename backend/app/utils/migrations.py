@@ -0,0 +1,321 @@
+"""Index bootstrap and versioned migrations.
+
+Indexes are declared in INDEXES and reconciled on every startup: missing
+ones are created, existing ones are left alone. Data migrations are listed
+in MIGRATIONS and applied once each; applied versions are recorded in the
+``schema_migrations`` collection.
+
+Run as a module for the command line interface:
+
+    python -m app.utils.migrations plan     # show what would change
+    python -m app.utils.migrations apply    # create indexes, run migrations
+    python -m app.utils.migrations audit    # report queries without an index
+"""
+import argparse
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError, OperationFailure
+from app.storage.base import TOMBSTONE_RETENTION
+from app.utils.search import search_terms
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_COLLECTION = "schema_migrations"
+
+@dataclass(frozen=True)
+class IndexSpec:
+    keys: Tuple[Tuple[str, int], ...]
+    name: str
+    unique: bool = False
+    # TTL index: documents expire this long after the indexed date. Existing
+    # indexes are not modified, so changing it later needs a collMod.
+    expire_after_seconds: Optional[int] = None
+
+    def options(self) -> dict:
+        options = {"name": self.name}
+        if self.unique:
+            options["unique"] = True
+        if self.expire_after_seconds is not None:
+            options["expireAfterSeconds"] = self.expire_after_seconds
+        return options
+
+@dataclass(frozen=True)
+class QueryShape:
+    """A query issued by a controller, described for index auditing"""
+    collection: str
+    description: str
+    equality: Tuple[str, ...] = ()
+    range: Tuple[str, ...] = ()
+    sort: Tuple[Tuple[str, int], ...] = ()
+
+@dataclass
+class Migration:
+    version: int
+    description: str
+    apply: Callable[[object], Awaitable[None]] = field(repr=False)
+
+# Required indexes, by collection. Lookups by _id use the default _id index.
+INDEXES: Dict[str, List[IndexSpec]] = {
+    "users": [
+        # register, login, refresh and profile all look users up by email
+        IndexSpec(keys=(("email", 1),), name="email_unique", unique=True),
+    ],
+    "tasks": [
+        # Listing and keyset pagination, newest first
+        IndexSpec(keys=(("user_email", 1), ("created_at", -1), ("_id", -1)), name="user_created_desc"),
+        # Delta sync, and listing by last update in either direction
+        IndexSpec(keys=(("user_email", 1), ("modified_at", 1), ("_id", 1)), name="user_modified"),
+        # Listing filtered on completed, newest first
+        IndexSpec(keys=(("user_email", 1), ("completed", 1), ("created_at", -1), ("_id", -1)),
+                  name="user_completed_created_desc"),
+        # Listing sorted by text
+        IndexSpec(keys=(("user_email", 1), ("text", 1), ("_id", 1)), name="user_text"),
+        # Search: multikey, one entry per word of the text
+        IndexSpec(keys=(("user_email", 1), ("search_terms", 1)), name="user_search_terms"),
+    ],
+    "task_tombstones": [
+        IndexSpec(keys=(("user_email", 1), ("deleted_at", 1), ("_id", 1)), name="user_deleted"),
+        # Compaction: MongoDB drops tombstones once the retention has passed
+        IndexSpec(keys=(("deleted_at", 1),), name="deleted_ttl",
+                  expire_after_seconds=int(TOMBSTONE_RETENTION.total_seconds())),
+    ],
+}
+
+# Queries issued by the controllers, checked by `audit`
+QUERY_SHAPES: List[QueryShape] = [
+    QueryShape("users", "AuthController: find user by email", equality=("email",)),
+    QueryShape("tasks", "TaskController.get_user_tasks: first page",
+               equality=("user_email",), sort=(("created_at", -1), ("_id", -1))),
+    QueryShape("tasks", "TaskController.get_user_tasks: after cursor",
+               equality=("user_email",), range=("created_at",), sort=(("created_at", -1), ("_id", -1))),
+    QueryShape("tasks", "TaskController.get_user_tasks: completed filter",
+               equality=("user_email", "completed"), range=("created_at",), sort=(("created_at", -1), ("_id", -1))),
+    QueryShape("tasks", "TaskController.get_user_tasks: sorted by last update",
+               equality=("user_email",), range=("modified_at",), sort=(("modified_at", -1), ("_id", -1))),
+    QueryShape("tasks", "TaskController.get_user_tasks: sorted by text",
+               equality=("user_email",), range=("text",), sort=(("text", 1), ("_id", 1))),
+    QueryShape("tasks", "TaskController.search_tasks: word or prefix per query term",
+               equality=("user_email",), range=("search_terms",)),
+    QueryShape("tasks", "TaskController: get/update/delete/toggle by id",
+               equality=("_id", "user_email")),
+    QueryShape("task_versions", "TaskController: task list version (ETag)", equality=("_id",)),
+    QueryShape("tasks", "TaskController.get_changes: tasks written since token",
+               equality=("user_email",), range=("modified_at",), sort=(("modified_at", 1), ("_id", 1))),
+    QueryShape("task_tombstones", "TaskController.get_changes: deletions since token",
+               equality=("user_email",), range=("deleted_at",), sort=(("deleted_at", 1), ("_id", 1))),
+    QueryShape("tasks", "clear_completed: completed task ids", equality=("user_email", "completed")),
+    QueryShape("task_versions", "TaskController.get_stats: per-user counters", equality=("_id",)),
+    QueryShape("tasks", "reconcile_stats: recount one user", equality=("user_email", "completed")),
+]
+
+async def _backfill_modified_at(db):
+    # Tasks written before delta sync: last write is updated_at, else created_at
+    await db.tasks.update_many(
+        {"modified_at": {"$exists": False}},
+        [{"$set": {"modified_at": {"$ifNull": ["$updated_at", "$created_at"]}}}]
+    )
+
+# Documents updated per bulk write when backfilling
+BACKFILL_BATCH_SIZE = 1000
+
+async def _backfill_search_terms(db):
+    # Tokenized in Python, so the same way as new writes
+    batch = []
+    cursor = db.tasks.find({"search_terms": {"$exists": False}}, {"text": 1}).batch_size(BACKFILL_BATCH_SIZE)
+    async for task in cursor:
+        batch.append(UpdateOne({"_id": task["_id"]}, {"$set": {"search_terms": search_terms(task["text"])}}))
+        if len(batch) >= BACKFILL_BATCH_SIZE:
+            await db.tasks.bulk_write(batch, ordered=False)
+            batch = []
+    if batch:
+        await db.tasks.bulk_write(batch, ordered=False)
+
+# Per-user counts of all and of completed tasks, as stored in task_versions
+STATS_PIPELINE = [{"$group": {
+    "_id": "$user_email",
+    "total": {"$sum": 1},
+    "completed": {"$sum": {"$cond": ["$completed", 1, 0]}},
+}}]
+
+async def _build_task_stats(db):
+    # Counters for tasks written before they were maintained; $merge replaces
+    # whole documents, so rerunning it is harmless
+    await db.tasks.aggregate([
+        *STATS_PIPELINE,
+        {"$merge": {"into": "task_stats", "whenMatched": "replace", "whenNotMatched": "insert"}},
+    ], allowDiskUse=True).to_list(length=None)
+
+async def _move_task_stats(db):
+    # The counters now live in each user's task_versions document, so one
+    # command updates them with the version. Recounted rather than copied;
+    # "merge" keeps the version and rerunning it is harmless
+    await db.tasks.aggregate([
+        *STATS_PIPELINE,
+        {"$merge": {"into": "task_versions", "whenMatched": "merge", "whenNotMatched": "insert"}},
+    ], allowDiskUse=True).to_list(length=None)
+    await db.task_stats.drop()
+
+# Versioned data migrations, applied in order. Append only.
+MIGRATIONS: List[Migration] = [
+    Migration(1, "Backfill tasks.modified_at for delta sync", _backfill_modified_at),
+    Migration(2, "Backfill tasks.search_terms for search", _backfill_search_terms),
+    Migration(3, "Build task_stats counters", _build_task_stats),
+    Migration(4, "Move task counters into task_versions", _move_task_stats),
+]
+
+def _index_serves(index_keys: Tuple[Tuple[str, int], ...], shape: QueryShape) -> Tuple[bool, bool]:
+    """Return (usable, sort_covered) for an index and a query shape.
+
+    An index is usable when its leading field is constrained by the query.
+    The sort is covered when the equality fields form a prefix of the index
+    and the sort keys follow in order, in the same or fully reversed direction.
+    """
+    constrained = set(shape.equality) | set(shape.range)
+    if not index_keys or index_keys[0][0] not in constrained:
+        return False, False
+    if not shape.sort:
+        return True, True
+    position = 0
+    equality = set(shape.equality)
+    while position < len(index_keys) and index_keys[position][0] in equality:
+        position += 1
+    tail = index_keys[position:position + len(shape.sort)]
+    if [name for name, _ in tail] != [name for name, _ in shape.sort]:
+        return True, False
+    same = all(direction == wanted for (_, direction), (_, wanted) in zip(tail, shape.sort))
+    reversed_ = all(direction == -wanted for (_, direction), (_, wanted) in zip(tail, shape.sort))
+    return True, same or reversed_
+
+def audit_queries(indexes: Dict[str, List[IndexSpec]] = None) -> List[dict]:
+    """Check every declared query shape against the declared indexes"""
+    indexes = INDEXES if indexes is None else indexes
+    report = []
+    for shape in QUERY_SHAPES:
+        candidates = [(("_id", 1),)] + [spec.keys for spec in indexes.get(shape.collection, [])]
+        results = [_index_serves(keys, shape) for keys in candidates]
+        usable = any(usable for usable, _ in results)
+        sort_covered = any(usable and covered for usable, covered in results)
+        if not usable:
+            plan = "COLLSCAN"
+        elif not sort_covered:
+            plan = "IXSCAN + in-memory SORT"
+        else:
+            plan = "IXSCAN"
+        report.append({"collection": shape.collection, "query": shape.description, "plan": plan})
+    return report
+
+async def _applied_versions(db) -> set:
+    docs = await db[MIGRATIONS_COLLECTION].find({}, {"_id": 1}).to_list(length=None)
+    return {doc["_id"] for doc in docs}
+
+async def plan(db) -> dict:
+    """Indexes and migrations that `apply` would create or run"""
+    missing_indexes = []
+    for collection, specs in INDEXES.items():
+        existing = await db[collection].index_information()
+        missing_indexes.extend(
+            {"collection": collection, "name": spec.name, "keys": list(spec.keys), "unique": spec.unique}
+            for spec in specs
+            if spec.name not in existing
+        )
+    applied = await _applied_versions(db)
+    pending = [
+        {"version": migration.version, "description": migration.description}
+        for migration in MIGRATIONS
+        if migration.version not in applied
+    ]
+    return {"indexes": missing_indexes, "migrations": pending}
+
+async def run_migrations(db) -> dict:
+    """Create missing indexes and apply pending migrations (idempotent).
+
+    Safe to run from several workers at once: index creation is idempotent
+    and each migration is recorded with its version as _id, so a concurrent
+    runner that loses the race just skips the record.
+    """
+    pending = await plan(db)
+    for index in pending["indexes"]:
+        spec = next(s for s in INDEXES[index["collection"]] if s.name == index["name"])
+        try:
+            await db[index["collection"]].create_index(list(spec.keys), **spec.options())
+            logger.info(f"Created index {index['collection']}.{spec.name}")
+        except OperationFailure as e:
+            # e.g. duplicate emails blocking the unique index; keep serving
+            logger.error(f"Could not create index {index['collection']}.{spec.name}: {e}")
+
+    pending_versions = {m["version"] for m in pending["migrations"]}
+    applied = []
+    for migration in MIGRATIONS:
+        if migration.version not in pending_versions:
+            continue
+        logger.info(f"Applying migration {migration.version}: {migration.description}")
+        await migration.apply(db)
+        try:
+            await db[MIGRATIONS_COLLECTION].insert_one({
+                "_id": migration.version,
+                "description": migration.description,
+                "applied_at": datetime.utcnow()
+            })
+        except DuplicateKeyError:
+            pass
+        applied.append(migration.version)
+    return {"indexes": [index["name"] for index in pending["indexes"]], "migrations": applied}
+
+def _print_plan(result: dict):
+    if not result["indexes"] and not result["migrations"]:
+        print("Up to date.")
+        return
+    for index in result["indexes"]:
+        unique = " (unique)" if index["unique"] else ""
+        print(f"create index {index['collection']}.{index['name']} {index['keys']}{unique}")
+    for migration in result["migrations"]:
+        print(f"apply migration {migration['version']}: {migration['description']}")
+
+async def _main(command: str, explain: Optional[bool] = False):
+    from app.utils.database import connect_to_mongo, close_mongo_connection, get_database
+
+    if command == "audit" and not explain:
+        for row in audit_queries():
+            print(f"{row['plan']:<26} {row['collection']:<8} {row['query']}")
+        return
+
+    await connect_to_mongo()
+    try:
+        db = await get_database()
+        if command == "plan":
+            _print_plan(await plan(db))
+        elif command == "apply":
+            result = await run_migrations(db)
+            print(f"Created indexes: {result['indexes'] or 'none'}")
+            print(f"Applied migrations: {result['migrations'] or 'none'}")
+        elif command == "audit":
+            # Compare the offline audit with the live query planner
+            for row, shape in zip(audit_queries(), QUERY_SHAPES):
+                query = {name: None for name in shape.equality + shape.range}
+                cursor = db[shape.collection].find(query)
+                if shape.sort:
+                    cursor = cursor.sort(list(shape.sort))
+                explanation = await cursor.explain()
+                winning = explanation["queryPlanner"]["winningPlan"]
+                print(f"{row['plan']:<26} live={_plan_stages(winning):<24} {row['collection']:<8} {row['query']}")
+    finally:
+        await close_mongo_connection()
+
+def _plan_stages(plan_node: dict) -> str:
+    stages = []
+    while plan_node:
+        stages.append(plan_node.get("stage", "?"))
+        plan_node = plan_node.get("inputStage")
+    return ">".join(reversed(stages))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Index and migration management")
+    parser.add_argument("command", choices=["plan", "apply", "audit"])
+    parser.add_argument("--explain", action="store_true",
+                        help="audit: also ask the live database for its query plans")
+    args = parser.parse_args()
+    asyncio.run(_main(args.command, args.explain))
@@ -0,0 +1,62 @@
+import base64
+import json
+from datetime import datetime, timedelta
+from typing import Tuple, Union
+from bson import ObjectId
+from fastapi import HTTPException, status
+
+# Page size used when a cursor is passed without an explicit limit
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+_EPOCH = datetime(1970, 1, 1)
+
+def _to_millis(value: datetime) -> int:
+    # MongoDB stores dates with millisecond precision
+    return (value.replace(tzinfo=None) - _EPOCH) // timedelta(milliseconds=1)
+
+def _encode(position: dict) -> str:
+    payload = json.dumps(position, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def _decode(cursor: str) -> dict:
+    padded = cursor + "=" * (-len(cursor) % 4)
+    return json.loads(base64.urlsafe_b64decode(padded.encode()))
+
+def _invalid(name: str) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail=f"Invalid {name}"
+    )
+
+def encode_cursor(value: Union[datetime, str], task_id: ObjectId) -> str:
+    """Encode the keyset position (sort value and id) of the last task on a page"""
+    position = {"t": value} if isinstance(value, str) else {"c": _to_millis(value)}
+    position["i"] = str(task_id)
+    return _encode(position)
+
+def decode_cursor(cursor: str, name: str = "cursor", value_type: type = datetime) -> Tuple[Union[datetime, str], ObjectId]:
+    """Decode a cursor produced by encode_cursor whose sort value is of
+    value_type (datetime or str); name is used in the error"""
+    try:
+        payload = _decode(cursor)
+        if value_type is str:
+            value = payload["t"]
+            if not isinstance(value, str):
+                raise ValueError("text position expected")
+        else:
+            value = _EPOCH + timedelta(milliseconds=int(payload["c"]))
+        return value, ObjectId(payload["i"])
+    except Exception:
+        raise _invalid(name)
+
+def encode_search_cursor(score: int, created_at: datetime, task_id: ObjectId) -> str:
+    """Encode the rank position (score, created_at, id) of the last search result on a page"""
+    return _encode({"s": score, "c": _to_millis(created_at), "i": str(task_id)})
+
+def decode_search_cursor(cursor: str) -> Tuple[int, datetime, ObjectId]:
+    try:
+        payload = _decode(cursor)
+        return int(payload["s"]), _EPOCH + timedelta(milliseconds=int(payload["c"])), ObjectId(payload["i"])
+    except Exception:
+        raise _invalid("cursor")
@@ -0,0 +1,221 @@
+"""On-demand per-request profiling.
+
+A request is profiled when it carries ``X-Profile: <PROFILE_TOKEN>`` or is
+picked at PROFILE_SAMPLE_RATE. A profiled request collects a RequestTrace:
+time spent in named spans (JWT verification, get_database, mapping
+documents to response dicts or models, serialization) and every database command with its filter
+shape and the number of documents returned. Header-triggered requests get
+the trace back in a Server-Timing header, plus a sampled stack profile in
+folded format (flamegraph.pl / speedscope) when PROFILE_FLAMEGRAPH_DIR is
+set; sampled requests are logged instead.
+
+Unprofiled requests pay for one context variable lookup per span.
+"""
+from collections import Counter
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Dict, List, Optional
+import hmac
+import logging
+import os
+import random
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Requests with "X-Profile: <PROFILE_TOKEN>" are profiled; unset disables the header
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN")
+# Fraction of all requests profiled and logged, e.g. 0.001
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", 0))
+# Directory for folded stack profiles of header-triggered requests
+PROFILE_FLAMEGRAPH_DIR = os.getenv("PROFILE_FLAMEGRAPH_DIR")
+# The sampler needs the GIL, so while the loop is busy it effectively runs
+# once per interpreter switch interval (5 ms) at best
+PROFILE_SAMPLE_INTERVAL_SECONDS = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", 5)) / 1000
+
+# Database commands listed individually in Server-Timing; the rest are only summed
+MAX_TIMED_COMMANDS = 20
+
+_current_trace: ContextVar[Optional["RequestTrace"]] = ContextVar("request_trace", default=None)
+
+
+def filter_shape(value):
+    """Replace the values in a query filter with their type names"""
+    if isinstance(value, dict):
+        return {key: filter_shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [filter_shape(item) for item in value[:3]]
+    return type(value).__name__
+
+
+class RequestTrace:
+    """Span durations and database commands recorded for one request"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans: Dict[str, float] = {}
+        self.counts: Counter = Counter()
+        self.commands: List[dict] = []
+
+    def add_span(self, name: str, seconds: float):
+        self.spans[name] = self.spans.get(name, 0.0) + seconds
+        self.counts[name] += 1
+
+    def add_command(self, command: str, collection: str, shape, documents: Optional[int], seconds: float):
+        # Called from driver threads; list.append is atomic
+        self.commands.append({
+            "command": command,
+            "collection": collection,
+            "filter": shape,
+            "documents": documents,
+            "ms": round(seconds * 1000, 3),
+        })
+
+    def server_timing(self, total_seconds: float) -> str:
+        entries = [
+            f'{name};dur={seconds * 1000:.3f};desc="{self.counts[name]} call(s)"'
+            for name, seconds in self.spans.items()
+        ]
+        for index, command in enumerate(self.commands[:MAX_TIMED_COMMANDS]):
+            description = f"{command['command']} {command['collection']} {command['filter']}"
+            if command["documents"] is not None:
+                description += f" -> {command['documents']} docs"
+            description = description.replace("\\", "").replace('"', "'")
+            entries.append(f'db{index};dur={command["ms"]:.3f};desc="{description}"')
+        entries.append(f"total;dur={total_seconds * 1000:.3f}")
+        return ", ".join(entries)
+
+
+class _Span:
+    __slots__ = ("trace", "name", "started")
+
+    def __init__(self, trace: RequestTrace, name: str):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.trace.add_span(self.name, time.perf_counter() - self.started)
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+_NOOP_SPAN = _NoopSpan()
+
+def current_trace() -> Optional[RequestTrace]:
+    return _current_trace.get()
+
+def span(name: str):
+    """Context manager timing a block into the current request's trace, if any"""
+    trace = _current_trace.get()
+    if trace is None:
+        return _NOOP_SPAN
+    return _Span(trace, name)
+
+
+class StackSampler:
+    """Samples one thread's stack at a fixed interval into folded stacks"""
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def write(self, path: str):
+        with open(path, "w") as f:
+            for stack, count in self.stacks.items():
+                f.write(f"{stack} {count}\n")
+
+
+def _requested(headers) -> bool:
+    if not PROFILE_TOKEN:
+        return False
+    for name, value in headers:
+        if name == b"x-profile":
+            return hmac.compare_digest(value, PROFILE_TOKEN.encode())
+    return False
+
+
+class ProfilingMiddleware:
+    """ASGI middleware that decides per request whether to profile it.
+
+    The stack sampler watches the event loop thread, so concurrent requests
+    on the same worker show up in each other's flamegraphs.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        requested = _requested(scope["headers"])
+        if not requested and not (PROFILE_SAMPLE_RATE and random.random() < PROFILE_SAMPLE_RATE):
+            await self.app(scope, receive, send)
+            return
+
+        trace = RequestTrace()
+        token = _current_trace.set(trace)
+        sampler = None
+        profile_path = None
+        if requested and PROFILE_FLAMEGRAPH_DIR:
+            sampler = StackSampler(threading.get_ident(), PROFILE_SAMPLE_INTERVAL_SECONDS)
+            sampler.start()
+            name = f"{datetime.utcnow():%Y%m%dT%H%M%S%f}-{scope['method']}-{scope['path'].strip('/').replace('/', '_')}"
+            profile_path = os.path.join(PROFILE_FLAMEGRAPH_DIR, f"{name}.folded")
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                timing = trace.server_timing(time.perf_counter() - trace.started)
+                if requested:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", timing.encode("latin-1", "replace")))
+                    if profile_path:
+                        headers.append((b"x-profile-flamegraph", os.path.basename(profile_path).encode()))
+                    message = {**message, "headers": headers}
+                else:
+                    logger.info(f"Sampled profile {scope['method']} {scope['path']}: {timing}")
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current_trace.reset(token)
+            if sampler is not None:
+                sampler.stop()
+                os.makedirs(PROFILE_FLAMEGRAPH_DIR, exist_ok=True)
+                sampler.write(profile_path)
@@ -0,0 +1,90 @@
+"""Periodic repair of the per-user task counters behind /api/tasks/stats.
+
+Every write adjusts the counters as it goes, so they only drift when a
+write fails halfway (the task changed, the counter update did not) or races
+with a bulk operation. The job recounts every user's tasks in one
+aggregation every TASK_STATS_RECONCILE_SECONDS and repairs the counters
+that differ. Run it once from the command line with:
+
+    python -m app.utils.reconcile
+"""
+from typing import Optional
+import asyncio
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# Seconds between reconciliation runs; 0 disables the background job
+TASK_STATS_RECONCILE_SECONDS = float(os.getenv("TASK_STATS_RECONCILE_SECONDS", 3600))
+
+
+class StatsReconciler:
+
+    def __init__(self, interval_seconds: float):
+        self.interval_seconds = interval_seconds
+        self.runs = 0
+        self.repaired = 0
+        self.failures = 0
+        self.last_run_at: Optional[float] = None
+        self.last_duration: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def run_once(self, storage) -> int:
+        """Reconcile all counters now; returns the number of users repaired"""
+        started = time.perf_counter()
+        repaired = await storage.tasks.reconcile_stats()
+        self.last_duration = time.perf_counter() - started
+        self.last_run_at = time.time()
+        self.runs += 1
+        self.repaired += repaired
+        if repaired:
+            logger.warning(f"Repaired task counters of {repaired} user(s)")
+        return repaired
+
+    async def _loop(self, storage):
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+            try:
+                await self.run_once(storage)
+            except Exception as e:
+                self.failures += 1
+                logger.error(f"Task counter reconciliation failed: {e}")
+
+    def start(self, storage):
+        if self.interval_seconds > 0 and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._loop(storage))
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+        self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "interval_seconds": self.interval_seconds,
+            "runs": self.runs,
+            "repaired": self.repaired,
+            "failures": self.failures,
+            "last_run_at": self.last_run_at,
+            "last_duration_seconds": self.last_duration,
+        }
+
+stats_reconciler = StatsReconciler(TASK_STATS_RECONCILE_SECONDS)
+
+
+async def _main():
+    from app.storage.engine import get_storage
+
+    storage = get_storage()
+    await storage.connect()
+    try:
+        await storage.migrate()
+        repaired = await stats_reconciler.run_once(storage)
+        print(f"Repaired counters of {repaired} user(s) in {stats_reconciler.last_duration:.3f}s")
+    finally:
+        await storage.close()
+
+if __name__ == "__main__":
+    asyncio.run(_main())
@@ -0,0 +1,37 @@
+"""Tokenizing and ranking for task search.
+
+Task text is split into lowercase words, the search terms each storage
+engine indexes per user. A query matches the tasks that contain, for every
+query word, a term equal to it or starting with it. Matches are ranked by
+how many query words they contain as whole words, then newest first.
+"""
+from typing import Collection, List
+import os
+import re
+
+_WORD = re.compile(r"\w+")
+# Longer words are indexed (and matched) by their first characters only
+MAX_TERM_LENGTH = 64
+MAX_QUERY_TERMS = 8
+# Sorts after any continuation of a term, so [term, term + PREFIX_END)
+# is the range of terms starting with it (in code point and UTF-8 order)
+PREFIX_END = "\U0010ffff"
+
+# Matches ranked per search; a query matching more tasks ranks this many
+# of them, so latency depends on this and not on the user's task count
+SEARCH_MAX_CANDIDATES = int(os.getenv("SEARCH_MAX_CANDIDATES", 1000))
+
+def search_terms(text: str) -> List[str]:
+    """Distinct, sorted search terms of a text"""
+    return sorted({word[:MAX_TERM_LENGTH] for word in _WORD.findall(text.casefold())})
+
+def query_terms(query: str) -> List[str]:
+    """Terms of a search query; each must match a word of the task or its start"""
+    return search_terms(query)[:MAX_QUERY_TERMS]
+
+def matches_prefix(task_terms: Collection[str], term: str) -> bool:
+    return any(candidate.startswith(term) for candidate in task_terms)
+
+def score(task_terms: Collection[str], terms: Collection[str]) -> int:
+    """Query terms found as whole words; the rest only matched a prefix"""
+    return sum(1 for term in terms if term in task_terms)
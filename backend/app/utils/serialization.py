@@ -0,0 +1,95 @@
+from datetime import datetime
+from typing import Any, Collection, Iterable, List, Optional
+import json
+import os
+from fastapi.responses import Response
+from app.models.task import TaskResponse
+from app.utils.profiling import span
+
+try:
+    import orjson
+except ImportError:  # optional speedup; fall back to the standard library
+    orjson = None
+
+# "fast" turns task documents straight into JSON bytes; "model" keeps the
+# original path of building TaskResponse objects that FastAPI validates and
+# serializes again through response_model. Both produce identical JSON.
+SERIALIZATION_MODE = os.getenv("SERIALIZATION_MODE", "fast")
+
+# Response field -> document field. Checked against TaskResponse at import so
+# the fast path cannot drift from the documented schema.
+TASK_FIELD_MAP = (
+    ("id", "_id"),
+    ("text", "text"),
+    ("completed", "completed"),
+    ("created_at", "created_at"),
+    ("updated_at", "updated_at"),
+)
+if {name for name, _ in TASK_FIELD_MAP} != set(TaskResponse.model_fields):
+    raise RuntimeError("TASK_FIELD_MAP is out of sync with TaskResponse")
+
+def task_document_to_dict(task: dict) -> dict:
+    """Map a task document to the TaskResponse shape without building a model"""
+    return {
+        "id": str(task["_id"]),
+        "text": task["text"],
+        "completed": task["completed"],
+        "created_at": task["created_at"],
+        "updated_at": task.get("updated_at"),
+    }
+
+def project_task(task: dict, fields: Collection[str]) -> dict:
+    """The given TaskResponse fields of a task document, which may itself
+    have been projected"""
+    return {
+        name: str(task["_id"]) if name == "id" else task.get(document_field)
+        for name, document_field in TASK_FIELD_MAP if name in fields
+    }
+
+def _default(value: Any):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dumps(content: Any) -> bytes:
+    """Serialize to compact JSON bytes, with orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, default=_default, separators=(",", ":"), ensure_ascii=False).encode()
+
+def dump_tasks(tasks: Iterable[dict]) -> bytes:
+    """Serialize task documents as a JSON array of TaskResponse objects"""
+    return dumps([task_document_to_dict(task) for task in tasks])
+
+class FastJSONResponse(Response):
+    """JSON response rendered with dumps(); returned directly, so FastAPI
+    skips response_model validation while the OpenAPI schema is unchanged"""
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return dumps(content)
+
+def task_response(task: dict, status_code: int = 200):
+    """Route return value for one task document in the configured mode"""
+    if SERIALIZATION_MODE == "fast":
+        with span("serialize"):
+            return FastJSONResponse(task_document_to_dict(task), status_code=status_code)
+    with span("model"):
+        return TaskResponse(**task_document_to_dict(task))
+
+def task_list_json(tasks: List[dict], fields: Optional[Collection[str]] = None) -> bytes:
+    """Serialized task list in the configured mode, or of only the given
+    fields (partial objects are not TaskResponse models in either mode)"""
+    # Only the model mode builds models; the others map documents to dicts
+    building_models = fields is None and SERIALIZATION_MODE != "fast"
+    with span("model" if building_models else "project"):
+        if fields is not None:
+            content = [project_task(task, fields) for task in tasks]
+        elif SERIALIZATION_MODE == "fast":
+            content = [task_document_to_dict(task) for task in tasks]
+        else:
+            content = [TaskResponse(**task_document_to_dict(task)).model_dump(mode="json") for task in tasks]
+    with span("serialize"):
+        return dumps(content)
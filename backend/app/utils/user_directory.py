@@ -0,0 +1,111 @@
+"""In-process directory of users: email -> {_id, email, created_at}.
+
+Token refresh and the profile route only need to know that a user exists
+and its id and creation date, so they read it from here instead of the
+users collection. Entries hold no password hash. Misses load the user with
+UserRepository.find_summary; emails that do not exist are cached too, for
+a shorter time, so refreshes for a deleted account do not reach storage
+either. Register stores the new user; anything that deletes a user must
+call invalidate().
+
+Each worker has its own directory, so a user deleted on another worker or
+directly in the database is seen here only once the entry expires.
+"""
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+import asyncio
+import os
+import time
+from app.storage.engine import get_storage
+
+# Users remembered; 0 disables the directory
+USER_DIRECTORY_SIZE = int(os.getenv("USER_DIRECTORY_SIZE", 10000))
+# Seconds an entry is trusted, for existing and for unknown emails
+USER_DIRECTORY_TTL_SECONDS = float(os.getenv("USER_DIRECTORY_TTL_SECONDS", 300))
+USER_DIRECTORY_NEGATIVE_TTL_SECONDS = float(os.getenv("USER_DIRECTORY_NEGATIVE_TTL_SECONDS", 30))
+
+
+class UserDirectory:
+    """Bounded LRU of user summaries with per-entry expiry"""
+
+    def __init__(self, max_size: int, ttl_seconds: float, negative_ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        # email -> (summary or None for "no such user", expires_at)
+        self._entries: "OrderedDict[str, Tuple[Optional[dict], float]]" = OrderedDict()
+        # Loads in progress, so concurrent misses for one email share a query
+        self._loading: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+
+    def _store(self, email: str, user: Optional[dict]):
+        ttl = self.ttl_seconds if user is not None else self.negative_ttl_seconds
+        self._entries[email] = (user, time.monotonic() + ttl)
+        self._entries.move_to_end(email)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    async def _load(self, email: str) -> Optional[dict]:
+        user = await get_storage().users.find_summary(email)
+        if user is not None:
+            user = {"_id": user["_id"], "email": user["email"], "created_at": user["created_at"]}
+        # Skip the store if the entry was replaced or invalidated meanwhile
+        if self._loading.get(email) is asyncio.current_task():
+            self._store(email, user)
+        return user
+
+    async def get(self, email: str) -> Optional[dict]:
+        """The user's summary, or None if no user has this email"""
+        if self.max_size <= 0:
+            return await get_storage().users.find_summary(email)
+        entry = self._entries.get(email)
+        if entry is not None and entry[1] > time.monotonic():
+            self._entries.move_to_end(email)
+            if entry[0] is None:
+                self.negative_hits += 1
+                return None
+            self.hits += 1
+            return dict(entry[0])
+        self.misses += 1
+        loading = self._loading.get(email)
+        if loading is not None:
+            user = await asyncio.shield(loading)
+            return dict(user) if user is not None else None
+        loading = self._loading[email] = asyncio.ensure_future(self._load(email))
+        try:
+            user = await asyncio.shield(loading)
+        finally:
+            if self._loading.get(email) is loading:
+                del self._loading[email]
+        return dict(user) if user is not None else None
+
+    def put(self, user: dict):
+        """Record a user just created (or read in full elsewhere)"""
+        if self.max_size <= 0:
+            return
+        self._loading.pop(user["email"], None)
+        self._store(user["email"], {"_id": user["_id"], "email": user["email"], "created_at": user["created_at"]})
+
+    def invalidate(self, email: str):
+        """Forget a user, e.g. after deleting it"""
+        self._entries.pop(email, None)
+        self._loading.pop(email, None)
+
+    def clear(self):
+        self._entries.clear()
+        self._loading.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.negative_hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits + self.negative_hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "hit_ratio": (self.hits + self.negative_hits) / lookups if lookups else 0.0,
+        }
+
+user_directory = UserDirectory(USER_DIRECTORY_SIZE, USER_DIRECTORY_TTL_SECONDS, USER_DIRECTORY_NEGATIVE_TTL_SECONDS)
@@ -0,0 +1,359 @@
+"""HTTP load test for the auth and task routes.
+
+Starts ``main:app`` under uvicorn against a local storage engine (memory by
+default, so no MongoDB is needed), seeds users and tasks through the API,
+then drives a weighted mix of requests from concurrent clients and reports
+throughput and p50/p95/p99 latency per route.
+
+Usage (from the backend directory):
+
+    python -m benchmarks.load_test --mix default --duration 30 --output results.json
+    python -m benchmarks.load_test --baseline benchmarks/baseline.json
+    python -m benchmarks.load_test --baseline benchmarks/baseline.json --update-baseline
+
+With --baseline the run is compared against a stored result and the exit
+status is 1 when any route's p95 latency or throughput regressed by more
+than --tolerance. Use --url to load an already running server instead.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# Relative weights of each operation, per mix
+MIXES: Dict[str, Dict[str, int]] = {
+    "default": {"list": 40, "create": 15, "toggle": 15, "get": 8, "delete": 10,
+                "update": 5, "refresh": 4, "profile": 2, "login": 1},
+    "read": {"list": 70, "get": 20, "profile": 10},
+    "write": {"create": 30, "toggle": 25, "update": 20, "delete": 25},
+    "auth": {"login": 20, "refresh": 50, "profile": 20, "verify": 10},
+}
+
+PASSWORD = "load-test-password"
+
+
+class Session:
+    """A seeded user with its tokens and the ids of its tasks"""
+
+    def __init__(self, email: str, tokens: dict, task_ids: List[str]):
+        self.email = email
+        self.access_token = tokens["access_token"]
+        self.refresh_token = tokens["refresh_token"]
+        self.task_ids = task_ids
+        # Deletes only take tasks created during the run, so the seeded
+        # list size stays the same from start to finish
+        self.created_ids: List[str] = []
+
+    @property
+    def headers(self) -> dict:
+        return {"Authorization": f"Bearer {self.access_token}"}
+
+
+class Recorder:
+    """Latency samples and error counts per route"""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.recording = False
+
+    async def request(self, client: httpx.AsyncClient, route: str, method: str, url: str, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+            failed = response.status_code >= 400
+        except httpx.HTTPError:
+            response, failed = None, True
+        if self.recording:
+            self.samples.setdefault(route, []).append((time.perf_counter() - started) * 1000)
+            if failed:
+                self.errors[route] = self.errors.get(route, 0) + 1
+        return None if failed else response
+
+
+def _percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def start_server(engine: str, workers: int, data_dir: str):
+    """Run main:app under uvicorn and return (process, base_url)"""
+    port = _free_port()
+    env = dict(os.environ)
+    env.update({
+        "STORAGE_ENGINE": engine,
+        "SQLITE_PATH": os.path.join(data_dir, "load_test.db"),
+        "SECRET_KEY": env.get("SECRET_KEY", "load-test-secret"),
+        "DEBUG": "False",
+        # Every client connects from 127.0.0.1 and logs in as a few users
+        "AUTH_RATE_LIMIT_ENABLED": env.get("AUTH_RATE_LIMIT_ENABLED", "false"),
+    })
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning", "--no-access-log"],
+        cwd=BACKEND_DIR, env=env,
+    )
+    return process, f"http://127.0.0.1:{port}"
+
+async def wait_until_ready(base_url: str, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get("/health")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"Server at {base_url} did not become ready within {timeout}s")
+
+async def seed(client: httpx.AsyncClient, users: int, tasks_per_user: int) -> List[Session]:
+    """Register users and create their tasks through the bulk endpoint"""
+    run_id = f"{os.getpid()}-{int(time.time())}"
+
+    async def seed_user(index: int) -> Session:
+        email = f"load-{run_id}-{index}@example.com"
+        response = await client.post("/api/auth/register", json={"email": email, "password": PASSWORD})
+        response.raise_for_status()
+        session = Session(email, response.json(), [])
+        for offset in range(0, tasks_per_user, 1000):
+            operations = [
+                {"op": "create", "text": f"Seeded task {i}", "completed": i % 3 == 0}
+                for i in range(offset, min(offset + 1000, tasks_per_user))
+            ]
+            response = await client.post("/api/tasks/bulk", json={"operations": operations},
+                                         headers=session.headers)
+            response.raise_for_status()
+            session.task_ids.extend(result["id"] for result in response.json()["results"])
+        return session
+
+    return list(await asyncio.gather(*(seed_user(i) for i in range(users))))
+
+async def run_operation(op: str, client: httpx.AsyncClient, session: Session, recorder: Recorder,
+                        rng: random.Random):
+    headers = session.headers
+    if op == "delete" and not session.created_ids:
+        op = "create"
+    if op == "login":
+        await recorder.request(client, "POST /api/auth/login", "POST", "/api/auth/login",
+                               json={"email": session.email, "password": PASSWORD})
+    elif op == "refresh":
+        response = await recorder.request(client, "POST /api/auth/refresh", "POST", "/api/auth/refresh",
+                                          json={"refresh_token": session.refresh_token})
+        if response is not None:
+            session.access_token = response.json()["access_token"]
+    elif op == "profile":
+        await recorder.request(client, "GET /api/auth/profile", "GET", "/api/auth/profile", headers=headers)
+    elif op == "verify":
+        await recorder.request(client, "POST /api/auth/verify-token", "POST", "/api/auth/verify-token",
+                               headers=headers)
+    elif op == "list":
+        await recorder.request(client, "GET /api/tasks/", "GET", "/api/tasks/", headers=headers)
+    elif op == "create":
+        response = await recorder.request(client, "POST /api/tasks/", "POST", "/api/tasks/",
+                                          json={"text": "Load test task"}, headers=headers)
+        if response is not None:
+            session.created_ids.append(response.json()["id"])
+    elif op == "delete":
+        task_id = session.created_ids.pop()
+        await recorder.request(client, "DELETE /api/tasks/{task_id}", "DELETE", f"/api/tasks/{task_id}",
+                               headers=headers)
+    else:
+        task_ids = session.created_ids or session.task_ids
+        if not task_ids:
+            return
+        task_id = rng.choice(task_ids)
+        if op == "get":
+            await recorder.request(client, "GET /api/tasks/{task_id}", "GET", f"/api/tasks/{task_id}",
+                                   headers=headers)
+        elif op == "toggle":
+            await recorder.request(client, "PATCH /api/tasks/{task_id}/toggle", "PATCH",
+                                   f"/api/tasks/{task_id}/toggle", headers=headers)
+        elif op == "update":
+            await recorder.request(client, "PUT /api/tasks/{task_id}", "PUT", f"/api/tasks/{task_id}",
+                                   json={"text": "Updated by load test"}, headers=headers)
+        else:
+            raise ValueError(f"Unknown operation '{op}'")
+
+async def drive(client: httpx.AsyncClient, sessions: List[Session], mix: Dict[str, int],
+                concurrency: int, warmup: float, duration: float, seed: int) -> Recorder:
+    """Run concurrent clients for warmup + duration seconds; only the latter is recorded"""
+    recorder = Recorder()
+    operations, weights = list(mix), list(mix.values())
+    stop_at = time.monotonic() + warmup + duration
+
+    async def client_loop(worker: int):
+        rng = random.Random(seed + worker)
+        # Each session is owned by one client, so a task is never toggled
+        # by one client while another deletes it
+        owned = sessions[worker::concurrency]
+        while time.monotonic() < stop_at:
+            session = rng.choice(owned)
+            await run_operation(rng.choices(operations, weights)[0], client, session, recorder, rng)
+
+    async def start_recording():
+        await asyncio.sleep(warmup)
+        recorder.recording = True
+
+    await asyncio.gather(start_recording(), *(client_loop(i) for i in range(concurrency)))
+    return recorder
+
+def summarize(recorder: Recorder, duration: float) -> dict:
+    routes = {}
+    for route, samples in sorted(recorder.samples.items()):
+        routes[route] = {
+            "requests": len(samples),
+            "errors": recorder.errors.get(route, 0),
+            "throughput": round(len(samples) / duration, 2),
+            "mean_ms": round(statistics.fmean(samples), 3),
+            "p50_ms": round(_percentile(samples, 0.50), 3),
+            "p95_ms": round(_percentile(samples, 0.95), 3),
+            "p99_ms": round(_percentile(samples, 0.99), 3),
+        }
+    total = sum(route["requests"] for route in routes.values())
+    return {
+        "routes": routes,
+        "total": {
+            "requests": total,
+            "errors": sum(recorder.errors.values()),
+            "throughput": round(total / duration, 2),
+        },
+    }
+
+def compare(results: dict, baseline: dict, tolerance: float) -> List[str]:
+    """Routes whose p95 latency or throughput regressed beyond the tolerance"""
+    regressions = []
+    for route, current in results["routes"].items():
+        previous = baseline.get("routes", {}).get(route)
+        if previous is None:
+            continue
+        if current["p95_ms"] > previous["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{route}: p95 {previous['p95_ms']:.2f} ms -> {current['p95_ms']:.2f} ms")
+        if current["throughput"] < previous["throughput"] * (1 - tolerance):
+            regressions.append(
+                f"{route}: throughput {previous['throughput']:.1f} -> {current['throughput']:.1f} req/s"
+            )
+        if current["errors"] > previous["errors"]:
+            regressions.append(f"{route}: errors {previous['errors']} -> {current['errors']}")
+    return regressions
+
+def print_report(results: dict, baseline: Optional[dict]):
+    previous_routes = (baseline or {}).get("routes", {})
+    print(f"{'route':<36} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}  {'p95 vs baseline':>15}")
+    for route, row in results["routes"].items():
+        change = ""
+        previous = previous_routes.get(route)
+        if previous and previous["p95_ms"]:
+            change = f"{(row['p95_ms'] / previous['p95_ms'] - 1) * 100:+.1f}%"
+        print(
+            f"{route:<36} {row['throughput']:>9.1f} {row['p50_ms']:>9.2f} {row['p95_ms']:>9.2f}"
+            f" {row['p99_ms']:>9.2f} {row['errors']:>7}  {change:>15}"
+        )
+    total = results["total"]
+    print(f"total: {total['requests']} requests, {total['throughput']:.1f} req/s, {total['errors']} errors")
+
+async def run(args) -> dict:
+    process = None
+    with tempfile.TemporaryDirectory() as data_dir:
+        base_url = args.url
+        if base_url is None:
+            process, base_url = start_server(args.engine, args.workers, data_dir)
+        try:
+            await wait_until_ready(base_url)
+            limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+            async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+                started = time.perf_counter()
+                sessions = await seed(client, args.users, args.tasks)
+                print(f"Seeded {args.users} users x {args.tasks} tasks in {time.perf_counter() - started:.1f}s")
+                recorder = await drive(client, sessions, MIXES[args.mix], args.concurrency,
+                                       args.warmup, args.duration, args.seed)
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait(timeout=10)
+
+    results = summarize(recorder, args.duration)
+    results["config"] = {
+        "mix": args.mix,
+        "engine": args.engine if args.url is None else "external",
+        "users": args.users,
+        "tasks_per_user": args.tasks,
+        "concurrency": args.concurrency,
+        "duration": args.duration,
+        "workers": args.workers,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+    }
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mix", choices=sorted(MIXES), default="default")
+    parser.add_argument("--engine", choices=["memory", "sqlite", "mongo"], default="memory",
+                        help="storage engine for the started server (mongo uses the MONGODB_* settings)")
+    parser.add_argument("--url", help="load an already running server instead of starting one")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--tasks", type=int, default=200, help="tasks seeded per user")
+    parser.add_argument("--concurrency", type=int, default=16, help="concurrent client connections")
+    parser.add_argument("--warmup", type=float, default=3, help="seconds of unrecorded load first")
+    parser.add_argument("--duration", type=float, default=20, help="seconds of recorded load")
+    parser.add_argument("--seed", type=int, default=1, help="seed for the per-client operation choice")
+    parser.add_argument("--output", help="write results as JSON to this path")
+    parser.add_argument("--baseline", help="compare against results stored at this path")
+    parser.add_argument("--update-baseline", action="store_true", help="store this run as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed relative regression before failing (default 0.2 = 20%%)")
+    args = parser.parse_args()
+    if args.update_baseline and not args.baseline:
+        parser.error("--update-baseline requires --baseline")
+    if args.users < args.concurrency:
+        parser.error("--users must be at least --concurrency so each client owns its sessions")
+    if args.engine == "memory" and args.workers > 1 and args.url is None:
+        parser.error("the memory engine is per process; use --engine sqlite with several workers")
+
+    results = asyncio.run(run(args))
+
+    baseline = None
+    if args.baseline and os.path.exists(args.baseline) and not args.update_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_report(results, baseline)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+    elif baseline is not None:
+        if baseline.get("config", {}).get("mix") != args.mix:
+            print(f"Warning: baseline was recorded with mix '{baseline.get('config', {}).get('mix')}'")
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print("Regressions against baseline:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("No regressions against baseline.")
+
+if __name__ == "__main__":
+    main()
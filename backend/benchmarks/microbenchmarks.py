@@ -0,0 +1,210 @@
+"""Microbenchmarks for the per-request building blocks.
+
+Each benchmark is warmed up, then timed over several rounds; the median
+time per call is what gets compared. With --baseline, the exit status is 1
+when any benchmark's median is slower than the stored one by more than its
+tolerance (--tolerance, or the benchmark's own, looser value for noisy ones).
+
+Usage (from the backend directory):
+
+    python -m benchmarks.microbenchmarks
+    python -m benchmarks.microbenchmarks --baseline benchmarks/micro_baseline.json --update-baseline
+    python -m benchmarks.microbenchmarks --baseline benchmarks/micro_baseline.json
+    python -m benchmarks.microbenchmarks --filter token
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional
+from bson import ObjectId
+from app.models.task import TaskResponse
+from app.utils import auth
+from app.utils.serialization import task_document_to_dict
+
+@dataclass
+class Benchmark:
+    name: str
+    # Returns the function to time; called once, outside the timing
+    setup: Callable[[argparse.Namespace], Callable[[], object]]
+    # Calls per round; slow functions use fewer
+    number: int = 1000
+    # Overrides --tolerance for benchmarks with noisy timings
+    tolerance: Optional[float] = None
+
+def _make_documents(count: int) -> List[dict]:
+    start = datetime(2024, 1, 1)
+    return [
+        {
+            "_id": ObjectId(),
+            "text": f"Task number {i} with a reasonably long description",
+            "completed": i % 3 == 0,
+            "user_email": "bench@example.com",
+            "created_at": start + timedelta(seconds=i),
+            "updated_at": start + timedelta(days=1, seconds=i) if i % 2 else None,
+        }
+        for i in range(count)
+    ]
+
+def _verify_token_uncached(args):
+    auth.token_cache = auth.TokenCache(0)
+    token = auth.create_access_token({"sub": "bench@example.com"})
+    return lambda: auth.verify_token(token)
+
+def _verify_token_cached(args):
+    auth.token_cache = auth.TokenCache(auth.TOKEN_CACHE_SIZE or 1)
+    token = auth.create_access_token({"sub": "bench@example.com"})
+    auth.verify_token(token)
+    return lambda: auth.verify_token(token)
+
+def _create_access_token(args):
+    return lambda: auth.create_access_token({"sub": "bench@example.com"})
+
+def _create_refresh_token(args):
+    return lambda: auth.create_refresh_token({"sub": "bench@example.com"})
+
+def _get_password_hash(args):
+    return lambda: auth.get_password_hash("benchmark-password")
+
+def _verify_password(args):
+    hashed = auth.get_password_hash("benchmark-password")
+    return lambda: auth.verify_password("benchmark-password", hashed)
+
+def _task_response_models(args):
+    documents = _make_documents(args.documents)
+    return lambda: [TaskResponse(**task_document_to_dict(task)) for task in documents]
+
+def _task_document_dicts(args):
+    documents = _make_documents(args.documents)
+    return lambda: [task_document_to_dict(task) for task in documents]
+
+def _object_id_parse(args):
+    task_id = str(ObjectId())
+    return lambda: ObjectId(task_id) if ObjectId.is_valid(task_id) else None
+
+def _object_id_reject(args):
+    return lambda: ObjectId.is_valid("not-an-object-id")
+
+BENCHMARKS: List[Benchmark] = [
+    Benchmark("verify_token (uncached)", _verify_token_uncached, number=2000),
+    Benchmark("verify_token (cached)", _verify_token_cached, number=20000),
+    Benchmark("create_access_token", _create_access_token, number=2000),
+    Benchmark("create_refresh_token", _create_refresh_token, number=2000),
+    Benchmark("get_password_hash", _get_password_hash, number=2, tolerance=0.5),
+    Benchmark("verify_password", _verify_password, number=2, tolerance=0.5),
+    Benchmark("TaskResponse x documents", _task_response_models, number=20),
+    Benchmark("task_document_to_dict x documents", _task_document_dicts, number=50),
+    Benchmark("ObjectId.is_valid + ObjectId()", _object_id_parse, number=20000),
+    Benchmark("ObjectId.is_valid (invalid)", _object_id_reject, number=20000),
+]
+
+def _round(func: Callable, number: int) -> float:
+    started = time.perf_counter()
+    for _ in range(number):
+        func()
+    return (time.perf_counter() - started) / number
+
+def run_benchmark(benchmark: Benchmark, args) -> dict:
+    """Warm up, then time `rounds` rounds; times are microseconds per call"""
+    func = benchmark.setup(args)
+    deadline = time.perf_counter() + args.warmup
+    while time.perf_counter() < deadline:
+        _round(func, benchmark.number)
+    samples = [_round(func, benchmark.number) * 1e6 for _ in range(args.rounds)]
+    return {
+        "calls_per_round": benchmark.number,
+        "rounds": args.rounds,
+        "min_us": round(min(samples), 3),
+        "median_us": round(statistics.median(samples), 3),
+        "mean_us": round(statistics.fmean(samples), 3),
+        "stdev_us": round(statistics.stdev(samples), 3) if len(samples) > 1 else 0.0,
+    }
+
+def compare(results: dict, baseline: dict, tolerance: float) -> List[str]:
+    """Benchmarks whose median regressed beyond their tolerance"""
+    tolerances = {b.name: b.tolerance for b in BENCHMARKS if b.tolerance is not None}
+    regressions = []
+    for name, current in results["benchmarks"].items():
+        previous = baseline.get("benchmarks", {}).get(name)
+        if previous is None:
+            continue
+        allowed = tolerances.get(name, tolerance)
+        if current["median_us"] > previous["median_us"] * (1 + allowed):
+            regressions.append(
+                f"{name}: median {previous['median_us']:.2f} us -> {current['median_us']:.2f} us"
+                f" (allowed +{allowed:.0%})"
+            )
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--filter", help="only run benchmarks whose name contains this text")
+    parser.add_argument("--documents", type=int, default=100, help="documents per task-list benchmark")
+    parser.add_argument("--rounds", type=int, default=15)
+    parser.add_argument("--warmup", type=float, default=0.5, help="seconds of warmup per benchmark")
+    parser.add_argument("--output", help="write results as JSON to this path")
+    parser.add_argument("--baseline", help="compare against results stored at this path")
+    parser.add_argument("--update-baseline", action="store_true", help="store this run as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed relative slowdown of the median (default 0.25 = 25%%)")
+    args = parser.parse_args()
+    if args.update_baseline and not args.baseline:
+        parser.error("--update-baseline requires --baseline")
+
+    baseline = None
+    if args.baseline and os.path.exists(args.baseline) and not args.update_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    previous = (baseline or {}).get("benchmarks", {})
+
+    results = {
+        "benchmarks": {},
+        "config": {
+            "documents": args.documents,
+            "bcrypt_rounds": auth.pwd_context.handler().default_rounds,
+            "jwt_algorithm": auth.ALGORITHM,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+    }
+    original_cache = auth.token_cache
+    print(f"{'benchmark':<36} {'median us':>12} {'min us':>12} {'stdev us':>10}  {'vs baseline':>11}")
+    try:
+        for benchmark in BENCHMARKS:
+            if args.filter and args.filter.lower() not in benchmark.name.lower():
+                continue
+            row = run_benchmark(benchmark, args)
+            results["benchmarks"][benchmark.name] = row
+            change = ""
+            if benchmark.name in previous and previous[benchmark.name]["median_us"]:
+                change = f"{(row['median_us'] / previous[benchmark.name]['median_us'] - 1) * 100:+.1f}%"
+            print(f"{benchmark.name:<36} {row['median_us']:>12.2f} {row['min_us']:>12.2f}"
+                  f" {row['stdev_us']:>10.2f}  {change:>11}")
+    finally:
+        auth.token_cache = original_cache
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+    elif baseline is not None:
+        if baseline.get("config", {}).get("documents") != args.documents:
+            print(f"Warning: baseline was recorded with --documents {baseline.get('config', {}).get('documents')}")
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print("Regressions against baseline:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("No regressions against baseline.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Compare task list serialization: model path vs. the fast path.
+
+The model path is what GET /api/tasks did before SERIALIZATION_MODE=fast:
+build a TaskResponse per document, let FastAPI validate and serialize the
+list through response_model, then render it with JSONResponse.
+
+Usage (from the backend directory):
+
+    python -m benchmarks.serialization_benchmark --sizes 10 1000 100000
+"""
+import argparse
+import asyncio
+import json
+import time
+from datetime import datetime, timedelta
+from typing import List
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from app.models.task import TaskResponse
+from app.utils import serialization
+
+_response_field = create_response_field(name="Response_get_tasks", type_=List[TaskResponse])
+_loop = asyncio.new_event_loop()
+
+def make_documents(count: int) -> List[dict]:
+    start = datetime(2024, 1, 1)
+    return [
+        {
+            "_id": ObjectId(),
+            "text": f"Task number {i} with a reasonably long description",
+            "completed": i % 3 == 0,
+            "user_email": "bench@example.com",
+            "created_at": start + timedelta(seconds=i, microseconds=i * 7),
+            "updated_at": start + timedelta(days=1, seconds=i) if i % 2 else None,
+        }
+        for i in range(count)
+    ]
+
+def model_path(documents: List[dict]) -> bytes:
+    tasks = [
+        TaskResponse(
+            id=str(task["_id"]),
+            text=task["text"],
+            completed=task["completed"],
+            created_at=task["created_at"],
+            updated_at=task.get("updated_at")
+        )
+        for task in documents
+    ]
+    content = _loop.run_until_complete(
+        serialize_response(field=_response_field, response_content=tasks, is_coroutine=True)
+    )
+    return JSONResponse(content).body
+
+def fast_path(documents: List[dict]) -> bytes:
+    return serialization.FastJSONResponse(serialization.dump_tasks(documents)).body
+
+def best_time(func, documents, rounds: int) -> float:
+    func(documents)  # warm up
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        func(documents)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+def run(sizes: List[int], rounds: int):
+    backend = "orjson" if serialization.orjson is not None else "json (orjson not installed)"
+    print(f"fast path encoder: {backend}")
+    print(f"{'tasks':>8} {'model items/s':>15} {'fast items/s':>15} {'speedup':>8}")
+    for size in sizes:
+        documents = make_documents(size)
+        # Both paths must produce the same JSON document
+        assert json.loads(model_path(documents)) == json.loads(fast_path(documents))
+        size_rounds = max(1, rounds if size < 10000 else rounds // 5)
+        model = best_time(model_path, documents, size_rounds)
+        fast = best_time(fast_path, documents, size_rounds)
+        print(f"{size:>8} {size / model:>15.0f} {size / fast:>15.0f} {model / fast:>7.1f}x")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1000, 100000])
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+    run(args.sizes, args.rounds)
@@ -0,0 +1,81 @@
+"""Compare storage engine latency for the task operations the API uses.
+
+Usage (from the backend directory):
+
+    python -m benchmarks.storage_benchmark --engines memory sqlite --tasks 10000
+
+The mongo engine uses the regular MONGODB_* settings and writes to the
+configured database, so only include it when pointing at a scratch database.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+from app.storage.base import utcnow
+from app.storage.engine import create_engine
+import app.storage.sqlite as sqlite_engine
+
+def _percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+async def _timed(samples, coroutine):
+    started = time.perf_counter()
+    result = await coroutine
+    samples.append((time.perf_counter() - started) * 1000)
+    return result
+
+async def bench_engine(name: str, task_count: int, operations: int):
+    engine = create_engine(name)
+    await engine.connect()
+    await engine.migrate()
+    user = f"bench-{os.getpid()}@example.com"
+    try:
+        started = time.perf_counter()
+        for offset in range(0, task_count, 1000):
+            await engine.tasks.insert_many([
+                {"text": f"task {i}", "completed": False, "user_email": user, "created_at": utcnow(), "updated_at": None}
+                for i in range(offset, min(offset + 1000, task_count))
+            ])
+        seed_seconds = time.perf_counter() - started
+
+        timings = {"insert": [], "list_page": [], "get": [], "toggle": [], "delete": []}
+        for _ in range(operations):
+            task = await _timed(timings["insert"], engine.tasks.insert(
+                {"text": "new", "completed": False, "user_email": user, "created_at": utcnow(), "updated_at": None}
+            ))
+            await _timed(timings["list_page"], engine.tasks.list_page(user, 50))
+            await _timed(timings["get"], engine.tasks.get(user, task["_id"]))
+            await _timed(timings["toggle"], engine.tasks.toggle(user, task["_id"], utcnow()))
+            await _timed(timings["delete"], engine.tasks.delete(user, task["_id"]))
+
+        print(f"{name}: seeded {task_count} tasks in {seed_seconds:.2f}s")
+        for operation, samples in timings.items():
+            print(
+                f"  {operation:<10} p50 {statistics.median(samples):7.3f} ms"
+                f"  p95 {_percentile(samples, 0.95):7.3f} ms  p99 {_percentile(samples, 0.99):7.3f} ms"
+            )
+    finally:
+        page = await engine.tasks.list_page(user, 1000)
+        while page:
+            for task in page:
+                await engine.tasks.delete(user, task["_id"])
+            page = await engine.tasks.list_page(user, 1000)
+        await engine.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--engines", nargs="+", default=["memory", "sqlite"], choices=["memory", "sqlite", "mongo"])
+    parser.add_argument("--tasks", type=int, default=10000, help="tasks seeded for the benchmark user")
+    parser.add_argument("--operations", type=int, default=500)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        # Keep benchmark data out of the real SQLite database
+        sqlite_engine.SQLITE_PATH = os.path.join(directory, "bench.db")
+        for name in args.engines:
+            asyncio.run(bench_engine(name, args.tasks, args.operations))
+
+if __name__ == "__main__":
+    main()
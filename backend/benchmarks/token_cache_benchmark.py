@@ -0,0 +1,51 @@
+"""Compare get_current_user with and without the verified-token cache.
+
+Usage (from the backend directory):
+
+    python -m benchmarks.token_cache_benchmark --requests 50000 --users 200
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from fastapi.security import HTTPAuthorizationCredentials
+from app.utils import auth
+from app.utils.dependencies import get_current_user
+
+async def _resolve_all(credentials, batch_size):
+    started = time.perf_counter()
+    for offset in range(0, len(credentials), batch_size):
+        await asyncio.gather(*(get_current_user(c) for c in credentials[offset:offset + batch_size]))
+    return time.perf_counter() - started
+
+def run(requests: int, users: int, batch_size: int, rounds: int):
+    tokens = [auth.create_access_token({"sub": f"user{i}@example.com"}) for i in range(users)]
+    # Requests reuse a small set of live tokens, as browsers do
+    credentials = [
+        HTTPAuthorizationCredentials(scheme="Bearer", credentials=random.choice(tokens))
+        for _ in range(requests)
+    ]
+    results = {}
+    for label, cache_size in (("uncached", 0), ("cached", max(users, 1))):
+        auth.token_cache = auth.TokenCache(cache_size)
+        timings = [asyncio.run(_resolve_all(credentials, batch_size)) for _ in range(rounds)]
+        best = min(timings)
+        results[label] = best
+        print(
+            f"{label:>9}: {requests / best:>10.0f} req/s  "
+            f"{best / requests * 1e6:>7.2f} us/req  "
+            f"(median {statistics.median(timings):.3f}s over {rounds} rounds)"
+        )
+        if cache_size:
+            print(f"{'':>9}  cache stats: {auth.token_cache.stats()}")
+    print(f"speedup: {results['uncached'] / results['cached']:.1f}x")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--users", type=int, default=100, help="distinct tokens in circulation")
+    parser.add_argument("--batch-size", type=int, default=100, help="concurrent resolutions per batch")
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+    run(args.requests, args.users, args.batch_size, args.rounds)
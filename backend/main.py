@@ -1,7 +1,9 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Header, HTTPException, status
+from fastapi.responses import Response
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 from dotenv import load_dotenv
+from typing import Optional
 import os
 import sys
 from pathlib import Path
@@ -12,7 +14,15 @@ if str(backend_dir) not in sys.path:
     sys.path.insert(0, str(backend_dir))
 
 from app.routes import auth, tasks
-from app.utils.database import connect_to_mongo, close_mongo_connection, get_database
+from app.storage.engine import get_storage
+from app.utils.admission import auth_admission
+from app.utils.auth import configure_password_hashing, password_hash_pool, password_policy
+from app.utils.cache import get_task_cache
+from app.utils.events import task_events
+from app.utils import metrics
+from app.utils.profiling import ProfilingMiddleware
+from app.utils.reconcile import stats_reconciler
+from app.utils.user_directory import user_directory
 
 # Load environment variables
 load_dotenv()
@@ -20,17 +30,28 @@ load_dotenv()
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
+    storage = get_storage()
     try:
-        await connect_to_mongo()
+        await storage.connect()
+        await storage.migrate()
     except Exception as e:
-        print(f"Warning: Could not connect to MongoDB during startup: {e}")
+        print(f"Warning: Could not connect to {storage.name} storage during startup: {e}")
         # Don't fail the startup, let individual requests handle connection
+    try:
+        await configure_password_hashing()
+    except Exception as e:
+        print(f"Warning: bcrypt cost calibration failed, keeping {password_policy.rounds} rounds: {e}")
+    task_events.start(storage)
+    stats_reconciler.start(storage)
     yield
     # Shutdown
+    await task_events.close()
+    await stats_reconciler.close()
+    password_hash_pool.shutdown()
     try:
-        await close_mongo_connection()
+        await storage.close()
     except Exception as e:
-        print(f"Warning: Error during MongoDB disconnection: {e}")
+        print(f"Warning: Error during {storage.name} storage disconnection: {e}")
 
 app = FastAPI(
     title="Todo App API",
@@ -65,8 +86,15 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "X-Search-Truncated", "Retry-After"],
 )
 
+app.add_middleware(ProfilingMiddleware)
+
+# Added last so it is outermost and times the whole middleware stack
+if metrics.METRICS_ENABLED:
+    app.add_middleware(metrics.MetricsMiddleware)
+
 # Include routers
 app.include_router(auth.router, prefix="/api/auth", tags=["authentication"])
 app.include_router(tasks.router, prefix="/api/tasks", tags=["tasks"])
@@ -76,17 +104,37 @@ async def root():
     return {"message": "Todo App API is running"}
 
 @app.get("/health")
-async def health_check():
+async def health_check(authorization: Optional[str] = Header(None)):
+    """Liveness and database status. Component statistics are included only
+    for callers presenting the metrics token, as for /metrics."""
     try:
-        db = await get_database()
-        if db is not None:
-            # Test database connection
-            await db.command('ping')
-            return {"status": "healthy", "database": "connected"}
-        else:
-            return {"status": "unhealthy", "database": "disconnected"}
+        storage = get_storage()
+        # Test database connection
+        await storage.ping()
     except Exception as e:
-        return {"status": "unhealthy", "database": "error", "error": str(e)}
+        if metrics.authorized(authorization):
+            return {"status": "unhealthy", "database": "error", "error": str(e)}
+        return {"status": "unhealthy", "database": "error"}
+    health = {"status": "healthy", "database": "connected"}
+    if metrics.authorized(authorization):
+        health.update({
+            "storage": storage.stats(),
+            "password_hashing": {**password_hash_pool.stats(), "policy": password_policy.stats()},
+            "auth_admission": auth_admission.stats(),
+            "task_cache": get_task_cache().stats(),
+            "user_directory": user_directory.stats(),
+            "task_stream": task_events.stats(),
+            "task_stats_reconcile": stats_reconciler.stats()
+        })
+    return health
+
+if metrics.METRICS_ENABLED:
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics_endpoint(authorization: Optional[str] = Header(None)):
+        """Prometheus metrics in the text exposition format"""
+        if not metrics.authorized(authorization):
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid metrics token")
+        return Response(metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
 
 if __name__ == "__main__":
     import uvicorn
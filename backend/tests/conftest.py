@@ -0,0 +1,66 @@
+"""Shared fixtures: the app on a fresh storage engine per test, in memory
+and on SQLite (MongoDB needs a server, so it is not covered here).
+
+Settings are fixed before the app is imported, since modules read them at
+import time: cheap bcrypt, no auth rate limits (every request comes from
+the same client) and no background jobs.
+"""
+import os
+
+os.environ.setdefault("STORAGE_ENGINE", "memory")
+os.environ.setdefault("PASSWORD_HASH_ROUNDS", "4")
+os.environ.setdefault("PASSWORD_HASH_MIN_ROUNDS", "4")
+os.environ.setdefault("PASSWORD_HASH_CALIBRATE", "false")
+os.environ.setdefault("AUTH_RATE_LIMIT_ENABLED", "false")
+os.environ.setdefault("TASK_STATS_RECONCILE_SECONDS", "0")
+
+import uuid
+import pytest
+from fastapi.testclient import TestClient
+from app.storage.engine import create_engine, set_storage
+from app.storage.sqlite import SQLiteStorageEngine
+from app.utils.cache import TASK_CACHE_MAX_BYTES, TASK_CACHE_TTL_SECONDS, MemoryCacheBackend, configure_task_cache
+from app.utils.user_directory import user_directory
+from main import app
+
+PASSWORD = "test-password"
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def storage(request, tmp_path):
+    """A fresh engine; every test using it runs once per engine"""
+    if request.param == "sqlite":
+        engine = SQLiteStorageEngine(str(tmp_path / "tasks.db"))
+    else:
+        engine = create_engine(request.param)
+    set_storage(engine)
+    configure_task_cache(MemoryCacheBackend(TASK_CACHE_MAX_BYTES, TASK_CACHE_TTL_SECONDS))
+    user_directory.clear()
+    return engine
+
+@pytest.fixture
+def client(storage):
+    with TestClient(app) as test_client:
+        yield test_client
+
+@pytest.fixture
+def user_email():
+    return f"user-{uuid.uuid4().hex[:12]}@example.com"
+
+@pytest.fixture
+def auth_headers(client, user_email):
+    response = client.post("/api/auth/register", json={"email": user_email, "password": PASSWORD})
+    assert response.status_code == 201
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+@pytest.fixture
+def create_tasks(client, auth_headers):
+    """Create tasks in order through the API and return their ids"""
+    def create(texts):
+        ids = []
+        for text in texts:
+            response = client.post("/api/tasks/", json={"text": text}, headers=auth_headers)
+            assert response.status_code == 201
+            ids.append(response.json()["id"])
+        return ids
+    return create
@@ -0,0 +1,30 @@
+def test_bulk_applies_each_operation(client, auth_headers, create_tasks):
+    toggle_id, delete_id = create_tasks(["toggle me", "delete me"])
+
+    response = client.post("/api/tasks/bulk", json={"operations": [
+        {"op": "create", "text": "created"},
+        {"op": "toggle", "id": toggle_id},
+        {"op": "delete", "id": delete_id},
+        {"op": "update", "id": "0" * 24, "text": "missing"},
+    ]}, headers=auth_headers)
+
+    body = response.json()
+    assert [result["status"] for result in body["results"]] == ["ok", "ok", "ok", "not_found"]
+    assert (body["created"], body["updated"], body["deleted"]) == (1, 1, 1)
+    tasks = {task["text"]: task for task in client.get("/api/tasks/", headers=auth_headers).json()}
+    assert set(tasks) == {"created", "toggle me"}
+    assert tasks["toggle me"]["completed"] is True
+
+
+def test_bulk_without_writes_keeps_the_etag(client, auth_headers, create_tasks):
+    create_tasks(["unchanged"])
+    etag = client.get("/api/tasks/", headers=auth_headers).headers["ETag"]
+
+    response = client.post("/api/tasks/bulk", json={"operations": [
+        {"op": "update", "id": "not-an-id", "text": "x"},
+        {"op": "create"},
+    ], "ordered": False}, headers=auth_headers)
+
+    assert [result["status"] for result in response.json()["results"]] == ["invalid", "invalid"]
+    again = client.get("/api/tasks/", headers={**auth_headers, "If-None-Match": etag})
+    assert again.status_code == 304
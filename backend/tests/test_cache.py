@@ -0,0 +1,34 @@
+import asyncio
+from app.utils.cache import MemoryCacheBackend
+
+
+def test_writes_during_a_read_discard_its_result():
+    async def run():
+        cache = MemoryCacheBackend(1024, 60)
+        generation = await cache.generation("a@example.com")
+        await cache.invalidate("a@example.com")
+        await cache.set("a@example.com", "list", b"stale", generation)
+        # Another user's write does not discard it
+        generation = await cache.generation("a@example.com")
+        await cache.invalidate("b@example.com")
+        await cache.set("a@example.com", "list", b"fresh", generation)
+        return await cache.get("a@example.com", "list")
+
+    assert asyncio.run(run()) == b"fresh"
+
+
+def test_invalidation_log_is_bounded():
+    async def run():
+        cache = MemoryCacheBackend(1024, 60, log_size=3)
+        old = await cache.generation("user-0@example.com")
+        for i in range(10):
+            await cache.invalidate(f"user-{i}@example.com")
+        # user-0's invalidation was forgotten, so a read from before it is refused
+        await cache.set("user-0@example.com", "list", b"stale", old)
+        current = await cache.generation("user-0@example.com")
+        await cache.set("user-0@example.com", "list", b"fresh", current)
+        return cache, await cache.get("user-0@example.com", "list")
+
+    cache, value = asyncio.run(run())
+    assert cache.stats()["invalidation_log"] == 3
+    assert value == b"fresh"
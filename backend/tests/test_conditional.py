@@ -0,0 +1,41 @@
+import asyncio
+from bson import ObjectId
+from app.storage.base import utcnow
+
+
+def test_etag_and_not_modified(client, auth_headers, create_tasks):
+    [task_id] = create_tasks(["cached"])
+    first = client.get("/api/tasks/", headers=auth_headers)
+    etag = first.headers["ETag"]
+
+    assert client.get("/api/tasks/", headers={**auth_headers, "If-None-Match": etag}).status_code == 304
+    single = client.get(f"/api/tasks/{task_id}", headers=auth_headers)
+    assert client.get(
+        f"/api/tasks/{task_id}", headers={**auth_headers, "If-None-Match": single.headers["ETag"]}
+    ).status_code == 304
+
+    client.patch(f"/api/tasks/{task_id}/toggle", headers=auth_headers)
+    changed = client.get("/api/tasks/", headers={**auth_headers, "If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+    assert changed.json()[0]["completed"] is True
+
+
+def test_write_from_another_worker_is_not_served_from_cache(client, storage, auth_headers, create_tasks, user_email):
+    [task_id] = create_tasks(["shared"])
+    stale = client.get("/api/tasks/", headers=auth_headers)
+
+    # Another worker writes: storage and the version change, this process's
+    # cache is never invalidated
+    async def write_elsewhere():
+        task = await storage.tasks.toggle(user_email, ObjectId(task_id), utcnow())
+        await storage.tasks.bump_version(user_email)
+        return task
+    asyncio.run(write_elsewhere())
+
+    fresh = client.get("/api/tasks/", headers=auth_headers)
+    assert fresh.headers["ETag"] != stale.headers["ETag"]
+    assert fresh.json()[0]["completed"] is True
+    assert client.get(
+        "/api/tasks/", headers={**auth_headers, "If-None-Match": fresh.headers["ETag"]}
+    ).status_code == 304
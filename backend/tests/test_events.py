@@ -0,0 +1,92 @@
+from datetime import datetime
+import asyncio
+from bson import ObjectId
+from app.storage.mongo import _versioned_events
+from app.utils.events import TaskEventBus
+
+EMAIL = "user@example.com"
+
+
+def _task_change(operation, task_id, updated_fields=None, coll="tasks"):
+    change = {
+        "ns": {"coll": coll},
+        "operationType": operation,
+        "documentKey": {"_id": task_id},
+        "fullDocument": {"_id": task_id, "user_email": EMAIL, "text": "task", "completed": True},
+    }
+    if updated_fields is not None:
+        change["updateDescription"] = {"updatedFields": updated_fields}
+    return change
+
+def _bump(version):
+    return {
+        "ns": {"coll": "task_versions"},
+        "operationType": "update",
+        "documentKey": {"_id": EMAIL},
+        "updateDescription": {"updatedFields": {"version": version}},
+    }
+
+async def _aiter(items):
+    for item in items:
+        yield item
+
+async def _collect(changes):
+    return [event async for event in _versioned_events(_aiter(changes))]
+
+
+def test_change_stream_events_carry_the_version():
+    created, toggled, edited, deleted = ObjectId(), ObjectId(), ObjectId(), ObjectId()
+    events = asyncio.run(_collect([
+        _task_change("insert", created), _bump(1),
+        _task_change("update", toggled, {"completed": True, "updated_at": 0, "modified_at": 0}), _bump(2),
+        _task_change("update", edited, {"text": "new", "updated_at": 0, "modified_at": 0}), _bump(3),
+        _task_change("insert", deleted, coll="task_tombstones"), _bump(4),
+    ]))
+    assert [(event_type, document["_id"], version) for _, event_type, document, version in events] == [
+        ("created", created, 1), ("toggled", toggled, 2), ("updated", edited, 3), ("deleted", deleted, 4),
+    ]
+
+
+def test_counter_repairs_are_not_events():
+    repair = {**_bump(0), "updateDescription": {"updatedFields": {"total": 3, "completed": 1}}}
+    assert asyncio.run(_collect([repair])) == []
+
+
+def test_changes_sharing_a_bump_become_one_invalidate():
+    events = asyncio.run(_collect([
+        _task_change("insert", ObjectId()), _task_change("insert", ObjectId()), _bump(7), _bump(8),
+    ]))
+    assert events == [(EMAIL, "invalidate", None, 7), (EMAIL, "invalidate", None, 8)]
+
+
+class FeedStorage:
+    name = "fake"
+
+    def __init__(self, events):
+        self.events = events
+
+    async def watch_tasks(self, ready):
+        ready()
+        for event in self.events:
+            yield event
+        await asyncio.Event().wait()
+
+
+def test_follow_sends_the_version_as_event_id():
+    async def scenario():
+        bus = TaskEventBus(10, 10, 10, 60)
+        subscription = bus.subscribe(EMAIL)
+        task_id = ObjectId()
+        now = datetime(2024, 1, 1)
+        document = {"_id": task_id, "user_email": EMAIL, "text": "t", "completed": True, "created_at": now, "updated_at": now}
+        storage = FeedStorage([(EMAIL, "toggled", document, 5)])
+        follower = asyncio.create_task(bus._follow(storage))
+        try:
+            return await asyncio.wait_for(subscription.queue.get(), 1)
+        finally:
+            follower.cancel()
+            await bus.close()
+
+    frame = asyncio.run(scenario())
+    assert frame.startswith(b"id: 5\nevent: toggled\n")
+    assert b'"version":5' in frame
@@ -0,0 +1,76 @@
+import csv
+import gzip
+import io
+import json
+
+
+def _import(client, headers, filename, content: bytes, **params):
+    response = client.post(
+        "/api/tasks/import", params=params, files={"file": (filename, content)}, headers=headers
+    )
+    assert response.status_code == 200
+    return response.json()
+
+
+def _texts(client, headers):
+    return sorted(task["text"] for task in client.get("/api/tasks/", headers=headers).json())
+
+
+def test_import_ndjson(client, auth_headers):
+    content = b'{"text": "first"}\n\n{"text": "second", "completed": true}\nnot json\n{"text": ""}\n'
+
+    result = _import(client, auth_headers, "tasks.ndjson", content)
+
+    assert (result["imported"], result["failed"]) == (2, 2)
+    assert [error["line"] for error in result["errors"]] == [4, 5]
+    assert _texts(client, auth_headers) == ["first", "second"]
+
+
+def test_import_csv(client, auth_headers):
+    # With a byte order mark and a quoted field spanning two lines
+    content = '﻿text,completed\nplain,false\n"two\nlines",true\n'.encode()
+
+    result = _import(client, auth_headers, "tasks.csv", content)
+
+    assert (result["imported"], result["failed"]) == (2, 0)
+    tasks = {task["text"]: task["completed"] for task in client.get("/api/tasks/", headers=auth_headers).json()}
+    assert tasks == {"plain": False, "two\nlines": True}
+
+
+def test_import_gzip(client, auth_headers):
+    result = _import(client, auth_headers, "tasks.ndjson.gz", gzip.compress(b'{"text": "zipped"}\n'))
+
+    assert result["imported"] == 1
+
+
+def test_import_spooled_to_disk_in_batches(client, auth_headers):
+    # Larger than the 1 MB an upload is held in memory, in several batches
+    count = 6000
+    padding = "x" * 200
+    content = "".join(json.dumps({"text": f"task {i} {padding}"}) + "\n" for i in range(count)).encode()
+    assert len(content) > 1024 * 1024
+
+    result = _import(client, auth_headers, "tasks.ndjson", content, batch_size=1000)
+
+    assert (result["imported"], result["failed"]) == (count, 0)
+    assert client.get("/api/tasks/stats", headers=auth_headers).json()["total"] == count
+
+
+def test_export_round_trips_through_import(client, auth_headers, create_tasks, user_email):
+    create_tasks(["alpha", "beta, with comma", 'gamma "quoted"'])
+
+    ndjson = client.get("/api/tasks/export", headers=auth_headers)
+    exported_csv = client.get("/api/tasks/export", params={"format": "csv"}, headers=auth_headers)
+    compressed = client.get("/api/tasks/export", params={"gzip": "true"}, headers=auth_headers)
+
+    rows = [json.loads(line) for line in ndjson.text.splitlines()]
+    assert sorted(row["text"] for row in rows) == ["alpha", "beta, with comma", 'gamma "quoted"']
+    assert [row["text"] for row in csv.DictReader(io.StringIO(exported_csv.text))] == [row["text"] for row in rows]
+    assert gzip.decompress(compressed.content) == ndjson.content
+
+    # Import both exports into a second account
+    other = client.post("/api/auth/register", json={"email": "other-" + user_email, "password": "test-password"})
+    other_headers = {"Authorization": f"Bearer {other.json()['access_token']}"}
+    assert _import(client, other_headers, "tasks.ndjson", ndjson.content)["imported"] == 3
+    assert _import(client, other_headers, "tasks.csv", exported_csv.content)["imported"] == 3
+    assert _texts(client, other_headers) == sorted(2 * [row["text"] for row in rows])
@@ -0,0 +1,30 @@
+from app.utils import metrics
+
+
+def test_metrics_require_the_token(client, monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_TOKEN", "secret")
+
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
+    response = client.get("/metrics", headers={"Authorization": "Bearer secret"})
+    assert response.status_code == 200
+    assert "http_requests_in_flight" in response.text
+
+
+def test_metrics_closed_without_a_token(client, monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_TOKEN", None)
+    monkeypatch.setattr(metrics, "METRICS_PUBLIC", False)
+
+    assert client.get("/metrics").status_code == 401
+
+    monkeypatch.setattr(metrics, "METRICS_PUBLIC", True)
+    assert client.get("/metrics").status_code == 200
+
+
+def test_health_details_require_the_token(client, monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_TOKEN", "secret")
+
+    assert client.get("/health").json() == {"status": "healthy", "database": "connected"}
+    detailed = client.get("/health", headers={"Authorization": "Bearer secret"}).json()
+    assert detailed["status"] == "healthy"
+    assert {"storage", "password_hashing", "task_cache"} <= detailed.keys()
@@ -0,0 +1,48 @@
+def _pages(client, headers, limit, **params):
+    """Follow X-Next-Cursor to the end; returns the task texts of each page"""
+    pages, cursor = [], None
+    while True:
+        query = {"limit": limit, **params}
+        if cursor:
+            query["cursor"] = cursor
+        response = client.get("/api/tasks/", params=query, headers=headers)
+        assert response.status_code == 200
+        pages.append([task["text"] for task in response.json()])
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            return pages
+
+
+def test_pages_cover_every_task_once_newest_first(client, auth_headers, create_tasks):
+    texts = [f"task {i:02d}" for i in range(7)]
+    create_tasks(texts)
+
+    pages = _pages(client, auth_headers, 3)
+
+    assert [len(page) for page in pages] == [3, 3, 1]
+    assert [text for page in pages for text in page] == list(reversed(texts))
+
+
+def test_pages_follow_sort_order(client, auth_headers, create_tasks):
+    create_tasks(["b", "d", "a", "c", "e"])
+
+    pages = _pages(client, auth_headers, 2, sort="text", order="asc")
+
+    assert [text for page in pages for text in page] == ["a", "b", "c", "d", "e"]
+
+
+def test_writes_between_pages_do_not_shift_the_cursor(client, auth_headers, create_tasks):
+    create_tasks([f"task {i}" for i in range(4)])
+    first = client.get("/api/tasks/", params={"limit": 2}, headers=auth_headers)
+    create_tasks(["newer"])
+
+    second = client.get(
+        "/api/tasks/", params={"limit": 2, "cursor": first.headers["X-Next-Cursor"]}, headers=auth_headers
+    )
+
+    assert [task["text"] for task in second.json()] == ["task 1", "task 0"]
+
+
+def test_invalid_cursor_is_rejected(client, auth_headers):
+    response = client.get("/api/tasks/", params={"limit": 2, "cursor": "not-a-cursor"}, headers=auth_headers)
+    assert response.status_code == 400
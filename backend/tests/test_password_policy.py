@@ -0,0 +1,67 @@
+import pytest
+from app.utils import auth
+from app.utils.auth import hash_rounds, password_policy
+from tests.conftest import PASSWORD
+
+
+@pytest.fixture
+def policy_rounds():
+    """Set the policy's cost for one test"""
+    rounds, source = password_policy.rounds, password_policy.source
+    yield lambda value: password_policy.set_rounds(value, "configured")
+    password_policy.set_rounds(rounds, source)
+
+def _login(client, email):
+    return client.post("/api/auth/login", json={"email": email, "password": PASSWORD})
+
+def _stored_rounds(client, storage, email):
+    return hash_rounds(client.portal.call(storage.users.find_by_email, email)["password"])
+
+
+def test_login_rehashes_to_the_policy_cost(client, storage, auth_headers, user_email, policy_rounds):
+    assert _stored_rounds(client, storage, user_email) == 4
+
+    policy_rounds(5)
+    assert _login(client, user_email).status_code == 200
+    assert _stored_rounds(client, storage, user_email) == 5
+
+    # One round above the policy is within the slack and kept
+    policy_rounds(4)
+    assert _login(client, user_email).status_code == 200
+    assert _stored_rounds(client, storage, user_email) == 5
+
+
+def test_lowering_the_policy_rehashes_stronger_hashes(client, storage, auth_headers, user_email, policy_rounds):
+    policy_rounds(12)
+    assert _login(client, user_email).status_code == 200
+    assert _stored_rounds(client, storage, user_email) == 12
+
+    policy_rounds(4)
+    assert _login(client, user_email).status_code == 200
+    assert _stored_rounds(client, storage, user_email) == 4
+
+
+def test_keep_stronger_never_lowers_the_cost(client, storage, auth_headers, user_email, policy_rounds, monkeypatch):
+    monkeypatch.setattr(auth, "PASSWORD_HASH_KEEP_STRONGER", True)
+    auth._password_context.cache_clear()
+    try:
+        policy_rounds(7)
+        assert _login(client, user_email).status_code == 200
+        policy_rounds(4)
+        assert _login(client, user_email).status_code == 200
+        assert _stored_rounds(client, storage, user_email) == 7
+    finally:
+        monkeypatch.undo()
+        auth._password_context.cache_clear()
+
+
+def test_login_survives_a_failed_rehash(client, storage, auth_headers, user_email, policy_rounds, monkeypatch):
+    async def fail(*args):
+        raise RuntimeError("primary stepped down")
+
+    monkeypatch.setattr(storage.users, "update_password", fail)
+    policy_rounds(5)
+    response = _login(client, user_email)
+    assert response.status_code == 200
+    assert response.json()["access_token"]
+    assert _stored_rounds(client, storage, user_email) == 4
@@ -0,0 +1,37 @@
+import asyncio
+from datetime import datetime, timedelta
+from jose import jwt
+from app.utils import auth
+from app.utils.dependencies import get_stream_token_claims
+
+
+def _stream_token(client, headers):
+    response = client.post("/api/tasks/stream/token", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["expires_in"] == auth.STREAM_TOKEN_EXPIRE_SECONDS
+    return response.json()["stream_token"]
+
+
+def test_stream_token_opens_the_stream_until_the_session_ends(client, auth_headers, user_email):
+    access_claims = auth.verify_token(auth_headers["Authorization"].split()[1])
+    claims = asyncio.run(get_stream_token_claims(None, _stream_token(client, auth_headers)))
+    assert claims == {"email": user_email, "exp": access_claims["exp"]}
+
+
+def test_access_token_is_not_accepted_in_the_url(client, auth_headers):
+    token = auth_headers["Authorization"].split()[1]
+    assert client.get("/api/tasks/stream", params={"access_token": token}).status_code == 401
+    assert client.get("/api/tasks/stream", params={"stream_token": token}).status_code == 401
+
+
+def test_stream_token_grants_nothing_else(client, auth_headers):
+    token = _stream_token(client, auth_headers)
+    assert client.get("/api/tasks/", headers={"Authorization": f"Bearer {token}"}).status_code == 401
+
+
+def test_expired_stream_token(client, user_email):
+    token = jwt.encode(
+        {"sub": user_email, "type": "stream", "exp": datetime.utcnow() - timedelta(seconds=1)},
+        auth.SECRET_KEY, algorithm=auth.ALGORITHM
+    )
+    assert client.get("/api/tasks/stream", params={"stream_token": token}).status_code == 401
@@ -0,0 +1,52 @@
+def _sync(client, headers, since=None):
+    params = {"since": since} if since else {}
+    response = client.get("/api/tasks/changes", params=params, headers=headers)
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_full_then_delta_sync(client, auth_headers, create_tasks):
+    keep_id, toggle_id, delete_id = create_tasks(["keep", "toggle", "delete"])
+    full = _sync(client, auth_headers)
+    assert sorted(task["text"] for task in full["changes"]) == ["delete", "keep", "toggle"]
+    assert full["deleted"] == []
+
+    client.patch(f"/api/tasks/{toggle_id}/toggle", headers=auth_headers)
+    client.delete(f"/api/tasks/{delete_id}", headers=auth_headers)
+    delta = _sync(client, auth_headers, full["sync_token"])
+
+    # Entries may repeat within the overlap window, so compare as upserts
+    changed = {task["id"]: task for task in delta["changes"]}
+    assert changed[toggle_id]["completed"] is True
+    assert delete_id not in changed
+    assert [tombstone["id"] for tombstone in delta["deleted"]] == [delete_id]
+
+
+def test_clear_completed_and_bulk_deletes_leave_tombstones(client, auth_headers, create_tasks):
+    done_id, open_id, bulk_id = create_tasks(["done", "open", "bulk"])
+    token = _sync(client, auth_headers)["sync_token"]
+    client.patch(f"/api/tasks/{done_id}/toggle", headers=auth_headers)
+
+    assert client.delete("/api/tasks/completed", headers=auth_headers).json()["deleted_count"] == 1
+    client.post("/api/tasks/bulk", json={"operations": [{"op": "delete", "id": bulk_id}]}, headers=auth_headers)
+
+    delta = _sync(client, auth_headers, token)
+    assert sorted(tombstone["id"] for tombstone in delta["deleted"]) == sorted([done_id, bulk_id])
+    assert [task["text"] for task in client.get("/api/tasks/", headers=auth_headers).json()] == ["open"]
+
+
+def test_paged_sync_reaches_every_change(client, auth_headers, create_tasks):
+    ids = create_tasks([f"task {i}" for i in range(5)])
+    seen, token = set(), None
+    while True:
+        page = client.get("/api/tasks/changes", params={"limit": 2, **({"since": token} if token else {})},
+                          headers=auth_headers).json()
+        seen.update(task["id"] for task in page["changes"])
+        token = page["sync_token"]
+        if not page["has_more"]:
+            break
+    assert seen == set(ids)
+
+
+def test_invalid_sync_token(client, auth_headers):
+    assert client.get("/api/tasks/changes", params={"since": "bogus"}, headers=auth_headers).status_code == 400
@@ -0,0 +1,123 @@
+from datetime import datetime
+import asyncio
+from bson import ObjectId
+from app.controllers.task_controller import TaskController
+from app.models.task import TaskCreate
+from app.storage import mongo
+
+TOGGLES = 25
+
+
+class CountingTasks:
+    """Wraps a task repository, counting calls and yielding to the event
+    loop before each one so concurrent toggles interleave"""
+
+    def __init__(self, tasks):
+        self._tasks = tasks
+        self.calls = []
+
+    def __getattr__(self, name):
+        method = getattr(self._tasks, name)
+        if not asyncio.iscoroutinefunction(method):
+            return method
+
+        async def counted(*args, **kwargs):
+            self.calls.append(name)
+            await asyncio.sleep(0)
+            return await method(*args, **kwargs)
+        return counted
+
+
+def test_concurrent_toggles_are_not_lost(storage, user_email):
+    """Runs on every engine the storage fixture provides; MongoDB's update
+    is covered by test_mongo_toggle_negates_on_the_server"""
+    async def run():
+        task = await TaskController.create_task(TaskCreate(text="flip me"), user_email)
+        storage.tasks = counting = CountingTasks(storage.tasks)
+        results = await asyncio.gather(*(
+            TaskController.toggle_task(str(task["_id"]), user_email) for _ in range(TOGGLES)
+        ))
+        calls = list(counting.calls)
+        return task, await storage.tasks.get(user_email, task["_id"]), results, calls
+
+    task, final, results, calls = asyncio.run(run())
+
+    # Every toggle negated the stored value, so an odd count ends completed
+    assert final["completed"] is (TOGGLES % 2 == 1)
+    assert sorted(result["completed"] for result in results) == sorted(
+        [True] * ((TOGGLES + 1) // 2) + [False] * (TOGGLES // 2)
+    )
+    # One task round trip per toggle, with no read before the write; the
+    # list version behind the ETags is bumped once per toggle as well
+    assert [name for name in calls if name != "bump_version"] == ["toggle"] * TOGGLES
+    assert calls.count("bump_version") == TOGGLES
+
+
+def test_toggle_route(client, auth_headers, create_tasks):
+    [task_id] = create_tasks(["route toggle"])
+    assert client.patch(f"/api/tasks/{task_id}/toggle", headers=auth_headers).json()["completed"] is True
+    assert client.patch(f"/api/tasks/{task_id}/toggle", headers=auth_headers).json()["completed"] is False
+    assert client.patch("/api/tasks/not-an-id/toggle", headers=auth_headers).status_code == 400
+    missing = "0" * 24
+    assert client.patch(f"/api/tasks/{missing}/toggle", headers=auth_headers).status_code == 404
+
+
+def _evaluate(expression, document):
+    """The aggregation expressions _toggle_pipeline uses: $not, field paths, literals"""
+    if isinstance(expression, dict) and "$not" in expression:
+        return not _evaluate(expression["$not"], document)
+    if isinstance(expression, str) and expression.startswith("$"):
+        return document.get(expression[1:])
+    return expression
+
+class FakeTasks:
+    """A tasks collection that applies each update atomically, as the server
+    does, but yields to the event loop around every command so concurrent
+    callers interleave between their own commands"""
+
+    def __init__(self, document):
+        self.document = document
+        self.commands = []
+
+    async def find_one(self, *args, **kwargs):
+        self.commands.append("find_one")
+        await asyncio.sleep(0)
+        return dict(self.document)
+
+    async def find_one_and_update(self, task_filter, update, projection=None, return_document=None):
+        self.commands.append("find_one_and_update")
+        await asyncio.sleep(0)
+        stages = update if isinstance(update, list) else [update]
+        for stage in stages:
+            before = dict(self.document)
+            for field, expression in stage["$set"].items():
+                self.document[field] = _evaluate(expression, before)
+        return dict(self.document)
+
+class FakeDatabase:
+    def __init__(self, tasks):
+        self.tasks = tasks
+
+
+def test_mongo_toggle_negates_on_the_server(monkeypatch):
+    task_id = ObjectId()
+    tasks = FakeTasks({"_id": task_id, "user_email": "user@example.com", "text": "flip me", "completed": False})
+
+    async def get_database():
+        return FakeDatabase(tasks)
+    monkeypatch.setattr(mongo, "get_database", get_database)
+    repository = mongo.MongoTaskRepository()
+
+    async def run():
+        return await asyncio.gather(*(
+            repository.toggle("user@example.com", task_id, datetime(2024, 1, 1)) for _ in range(TOGGLES)
+        ))
+
+    results = asyncio.run(run())
+    # The new value is computed from the stored one inside the update
+    assert tasks.commands == ["find_one_and_update"] * TOGGLES
+    assert isinstance(mongo._toggle_pipeline(datetime(2024, 1, 1)), list)
+    assert tasks.document["completed"] is (TOGGLES % 2 == 1)
+    assert sorted(result["completed"] for result in results) == sorted(
+        [True] * ((TOGGLES + 1) // 2) + [False] * (TOGGLES // 2)
+    )
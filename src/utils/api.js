@@ -172,8 +172,13 @@ export const authAPI = {
 
 // Tasks API calls
 export const tasksAPI = {
-  getTasks: async () => {
-    return await apiRequest('/tasks/');
+  // params: completed, created_after/_before, updated_after/_before,
+  // sort, order, fields (comma-separated), limit and cursor
+  getTasks: async (params = {}) => {
+    const query = new URLSearchParams(
+      Object.entries(params).filter(([, value]) => value !== undefined && value !== null)
+    ).toString();
+    return await apiRequest(`/tasks/${query ? `?${query}` : ''}`);
   },
   
   createTask: async (text) => {
@@ -201,6 +206,82 @@ export const tasksAPI = {
       method: 'PATCH',
     });
   },
+  
+  // Apply many create/update/toggle/delete operations in one request
+  bulkTasks: async (operations, ordered = true) => {
+    return await apiRequest('/tasks/bulk', {
+      method: 'POST',
+      body: JSON.stringify({ operations, ordered }),
+    });
+  },
+  
+  clearCompleted: async () => {
+    return await apiRequest('/tasks/completed', {
+      method: 'DELETE',
+    });
+  },
+  
+  // Tasks matching every word of q (whole words or prefixes), best first
+  searchTasks: async (q, limit = 20) => {
+    return await apiRequest(`/tasks/search?q=${encodeURIComponent(q)}&limit=${limit}`);
+  },
+  
+  // Total, completed and pending task counts
+  getStats: async () => {
+    return await apiRequest('/tasks/stats');
+  },
+  
+  // Tasks changed and ids deleted since a sync token (omit it for a full sync)
+  getChanges: async (since) => {
+    const query = since ? `?since=${encodeURIComponent(since)}` : '';
+    return await apiRequest(`/tasks/changes${query}`);
+  },
+  
+  // Follow writes to the user's tasks over server-sent events; returns a
+  // function that closes the stream. EventSource cannot send headers, so the
+  // URL carries a short-lived stream token (never the access token); every
+  // (re)connect gets a fresh one, and on "expired" the access token is
+  // refreshed by the token request.
+  subscribe: (onEvent) => {
+    let source = null;
+    let closed = false;
+    const events = ['created', 'updated', 'toggled', 'deleted', 'invalidate', 'resync'];
+    
+    const reconnect = () => {
+      source.close();
+      if (!closed) {
+        // Writes made while reconnecting are only visible through /changes
+        onEvent('resync', {});
+        setTimeout(open, 3000);
+      }
+    };
+    
+    const open = async () => {
+      let token;
+      try {
+        ({ stream_token: token } = await apiRequest('/tasks/stream/token', { method: 'POST' }));
+      } catch (error) {
+        return;
+      }
+      if (closed) return;
+      source = new EventSource(`${API_BASE_URL}/tasks/stream?stream_token=${encodeURIComponent(token)}`);
+      events.forEach((type) => {
+        source.addEventListener(type, (event) => onEvent(type, JSON.parse(event.data)));
+      });
+      source.addEventListener('expired', reconnect);
+      source.addEventListener('error', () => {
+        // EventSource retries with the same URL, whose token may have
+        // expired; once it gives up, start over with a new token
+        if (source.readyState === EventSource.CLOSED) reconnect();
+      });
+    };
+    
+    open();
+    return () => {
+      closed = true;
+      if (source) source.close();
+    };
+  },
 };
 
 // Check if user is authenticated
@@ -7,7 +7,8 @@ export const getTasks = async () => {
     const currentUser = getCurrentUser();
     if (!currentUser) return [];
     
-    const tasks = await tasksAPI.getTasks();
+    // Only what TodoApp displays; filtering stays client-side for the counts
+    const tasks = await tasksAPI.getTasks({ fields: 'id,text,completed,created_at' });
     return tasks || [];
   } catch (error) {
     console.error('Error loading tasks:', error);